@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2023, Margaret Broeren, Yuzhe Gu, Mark Pitt
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+"""
+# Compare polling with the callback mode against the local stand-in server
+#
+# The same jobs are submitted twice to a fresh FakeRevAiServer: once waited on
+# by polling only, once with a CallbackReceiver. For each mode it prints the
+# number of status requests and the end-to-end latency (submission to
+# transcript) of the jobs.
+#   python benchmark/callback_benchmark.py --jobs 50 --turnaround 3 --jitter 2
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from rev_ai import apiclient
+from str_poller import JobPoller, CallbackReceiver
+from fake_revai_server import FakeRevAiServer
+
+
+# Write a short silent WAV file to submit
+def _make_audiofile(folder, seconds=2.01):
+    audiofile = os.path.join(folder, 'silence.wav')
+    with wave.open(audiofile, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(16000)
+        wav.writeframes(b'\0\0' * int(16000 * seconds))
+    return audiofile
+
+
+# Submit and wait on every job, return the stats of the server and the latencies
+def _run(mode, args, audiofile):
+    server = FakeRevAiServer(turnaround=args.turnaround, jitter=args.jitter, latency=args.latency, seed=args.seed)
+    client_api = apiclient.RevAiAPIClient('fake-token', server.url)
+    poller = JobPoller(client_api)
+    receiver = CallbackReceiver(poller, timeout=args.callback_timeout) if mode == 'callback' else None
+
+    def transcribe(_):
+        start = time.monotonic()
+        job = client_api.submit_job_local_file(filename=audiofile, callback_url=receiver.url if receiver else None)
+        poller.wait(job, 2.01, receiver.timeout if receiver else None)
+        client_api.get_transcript_json(job.id)
+        return time.monotonic() - start
+
+    try:
+        with ThreadPoolExecutor(args.concurrency) as executor:
+            latencies = list(executor.map(transcribe, range(args.jobs)))
+    finally:
+        if receiver:
+            receiver.close()
+        poller.close()
+        server.close()
+    return server.stats(), latencies
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure poll traffic and latency with and without callbacks')
+    parser.add_argument('--jobs', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=16, help='jobs submitted and waited on at the same time')
+    parser.add_argument('--turnaround', type=float, default=3.0, help='seconds until a job is finished')
+    parser.add_argument('--jitter', type=float, default=2.0, help='random extra turnaround in seconds')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds every request takes')
+    parser.add_argument('--callback-timeout', type=float, default=120.0, help='seconds before a job is polled anyway')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        audiofile = _make_audiofile(folder)
+        print(f'{"mode":<10}{"status requests":>17}{"mean latency":>14}{"p95 latency":>13}')
+        for mode in ['poll', 'callback']:
+            stats, latencies = _run(mode, args, audiofile)
+            p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+            print(f'{mode:<10}{stats["details"] + stats["list"]:>17}{statistics.mean(latencies):>13.2f}s{p95:>12.2f}s')
@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2023, Margaret Broeren, Yuzhe Gu, Mark Pitt
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+"""
+# Local stand-in for the Rev AI asynchronous speech-to-text API
+#
+# Implements the endpoints used by STR: submit a local file, job details,
+# list of jobs and the transcript json. Jobs finish after a configurable
+# turnaround and, when a callback_url was given, the server posts the job to
+# it like Rev AI does. Nothing is transcribed: the transcript is made of
+# placeholder words spread over the duration of the audio.
+#
+# Point STR to it with api_url in the [API.token] section of the config file:
+#   python benchmark/fake_revai_server.py --port 8900
+#   api_url = http://127.0.0.1:8900
+
+import argparse
+import datetime
+import email.parser
+import email.policy
+import heapq
+import io
+import itertools
+import json
+import random
+import threading
+import time
+import urllib.request
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+_API_PREFIX = '/speechtotext/v1/'
+
+_WORDS = ['sailboat', 'salty', 'sawmill', 'the', 'a', 'um', 'doctor', 'hello', 'yes', 'no']
+
+
+# Duration of the uploaded audio in seconds. Only WAV headers are read,
+# other formats are estimated from their size.
+def _audio_duration(media):
+    try:
+        with wave.open(io.BytesIO(media)) as wav:
+            return wav.getnframes() / wav.getframerate()
+    except (wave.Error, EOFError):
+        return max(1.0, len(media) / 16000)
+
+
+# Placeholder transcript: two words per second, a new speaker every 10 seconds
+def _make_transcript(duration, seed):
+    rng = random.Random(seed)
+    monologues = []
+    word_count = max(1, int(duration * 2))
+    elements = None
+    for i in range(word_count):
+        ts = i * 0.5
+        if i % 20 == 0:
+            elements = []
+            monologues.append({'speaker': (i // 20) % 2, 'elements': elements})
+        elif elements:
+            elements.append({'type': 'punct', 'value': ' '})
+        elements.append({'type': 'text', 'value': rng.choice(_WORDS), 'ts': ts, 'end_ts': ts + 0.4,
+                         'confidence': round(rng.uniform(0.5, 1.0), 2)})
+        if i % 20 == 19 or i == word_count - 1:
+            elements.append({'type': 'punct', 'value': '.'})
+    return {'monologues': monologues}
+
+
+class FakeRevAiServer:
+
+    # Parameters:
+    #   host, port - address to listen on. Port 0 picks a free port.
+    #   turnaround - seconds from submission until a job is finished
+    #   turnaround_per_second - additional seconds of turnaround per second of audio
+    #   jitter - random extra turnaround, up to this many seconds
+    #   latency - seconds every request takes before it is answered
+    #   failure_rate - share of jobs (0 to 1) that end as FAILED
+    #   seed - seed for the random numbers, so runs can be compared
+    #   error_rate - share of requests (0 to 1) answered with HTTP 503, like an overloaded API
+    def __init__(self, host='127.0.0.1', port=0, turnaround=1.0, turnaround_per_second=0.0, jitter=0.0,
+                 latency=0.0, failure_rate=0.0, seed=0, error_rate=0.0):
+        self.turnaround = turnaround
+        self.turnaround_per_second = turnaround_per_second
+        self.jitter = jitter
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.error_rate = error_rate
+
+        # number of requests received, by endpoint, and requests answered with an error
+        self.requests = {'submit': 0, 'details': 0, 'list': 0, 'transcript': 0}
+        self.errors = 0
+        self.callbacks_sent = 0
+        # bytes of audio received
+        self.bytes_received = 0
+
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._jobs = {}
+        self._order = []
+        self._lock = threading.Lock()
+        self._due = []
+        self._due_condition = threading.Condition(self._lock)
+        self._closed = False
+
+        server = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server._handle(self, 'GET')
+
+            def do_POST(self):
+                server._handle(self, 'POST')
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self.url = f'http://{host}:{self._server.server_address[1]}'
+
+        self._threads = [threading.Thread(target=self._server.serve_forever, daemon=True),
+                         threading.Thread(target=self._finish_jobs, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._due_condition.notify()
+        self._server.shutdown()
+        self._server.server_close()
+
+    # Request counts, callbacks and bytes received so far
+    def stats(self):
+        with self._lock:
+            return dict(self.requests, errors=self.errors, callbacks=self.callbacks_sent, bytes_received=self.bytes_received)
+
+    def _handle(self, request, method):
+        if self.latency:
+            time.sleep(self.latency)
+        url = urlsplit(request.path)
+        if not url.path.startswith(_API_PREFIX):
+            return self._reply(request, 404, {'title': 'not found'})
+        if self.error_rate:
+            with self._lock:
+                error = self._random.random() < self.error_rate
+                self.errors += 1 if error else 0
+            if error:
+                # the upload is read first, so the client gets the answer instead of a broken connection
+                request.rfile.read(int(request.headers.get('Content-Length', 0)))
+                return self._reply(request, 503, {'title': 'simulated error of the stand-in server'})
+        path = url.path[len(_API_PREFIX):].strip('/').split('/')
+
+        if method == 'POST' and path == ['jobs']:
+            return self._submit(request)
+        if method == 'GET' and path == ['jobs']:
+            query = parse_qs(url.query)
+            return self._list(request, int(query.get('limit', ['100'])[0]), query.get('starting_after', [None])[0])
+        if method == 'GET' and len(path) == 2 and path[0] == 'jobs':
+            return self._details(request, path[1])
+        if method == 'GET' and len(path) == 3 and path[0] == 'jobs' and path[2] == 'transcript':
+            return self._transcript(request, path[1])
+        return self._reply(request, 404, {'title': 'not found'})
+
+    def _reply(self, request, status, body):
+        data = json.dumps(body).encode('utf-8')
+        request.send_response(status)
+        request.send_header('Content-Type', 'application/json')
+        request.send_header('Content-Length', str(len(data)))
+        request.end_headers()
+        request.wfile.write(data)
+
+    # POST jobs: multipart form with 'media' (the audio) and 'options' (json)
+    def _submit(self, request):
+        body = request.rfile.read(int(request.headers.get('Content-Length', 0)))
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            b'Content-Type: ' + request.headers['Content-Type'].encode('latin-1') + b'\r\n\r\n' + body)
+        options = {}
+        media = b''
+        filename = None
+        for part in message.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            if name == 'options':
+                options = json.loads(part.get_payload(decode=True))
+            elif name == 'media':
+                media = part.get_payload(decode=True)
+                filename = part.get_filename()
+
+        duration = _audio_duration(media)
+        with self._lock:
+            self.requests['submit'] += 1
+            self.bytes_received += len(media)
+            job_id = f'fake{next(self._ids):08d}'
+            turnaround = self.turnaround + self.turnaround_per_second * duration + self._random.uniform(0, self.jitter)
+            failed = self._random.random() < self.failure_rate
+            job = {'id': job_id,
+                   'created_on': datetime.datetime.utcnow().isoformat() + 'Z',
+                   'status': 'in_progress',
+                   'name': filename,
+                   'type': 'async',
+                   'duration_seconds': duration,
+                   'language': options.get('language', 'en')}
+            if options.get('callback_url'):
+                job['callback_url'] = options['callback_url']
+            self._jobs[job_id] = {'job': job, 'failed': failed}
+            self._order.append(job_id)
+            heapq.heappush(self._due, (time.monotonic() + turnaround, job_id))
+            self._due_condition.notify()
+        self._reply(request, 200, job)
+
+    def _details(self, request, job_id):
+        with self._lock:
+            self.requests['details'] += 1
+            record = self._jobs.get(job_id)
+            job = dict(record['job']) if record else None
+        if job is None:
+            return self._reply(request, 404, {'title': 'could not find job'})
+        self._reply(request, 200, job)
+
+    # GET jobs: most recent first, paged with starting_after
+    def _list(self, request, limit, starting_after):
+        with self._lock:
+            self.requests['list'] += 1
+            ids = self._order[::-1]
+            if starting_after in self._jobs:
+                ids = ids[ids.index(starting_after) + 1:]
+            jobs = [dict(self._jobs[job_id]['job']) for job_id in ids[:min(limit, 1000)]]
+        self._reply(request, 200, jobs)
+
+    def _transcript(self, request, job_id):
+        with self._lock:
+            self.requests['transcript'] += 1
+            record = self._jobs.get(job_id)
+            job = dict(record['job']) if record else None
+        if job is None or job['status'] != 'transcribed':
+            return self._reply(request, 404 if job is None else 409, {'title': 'transcript not available'})
+        self._reply(request, 200, _make_transcript(job['duration_seconds'], job_id))
+
+    # Finish jobs when their turnaround is over and send the callbacks
+    def _finish_jobs(self):
+        while True:
+            with self._lock:
+                while not self._closed and (not self._due or self._due[0][0] > time.monotonic()):
+                    self._due_condition.wait(None if not self._due else self._due[0][0] - time.monotonic())
+                if self._closed:
+                    return
+                _, job_id = heapq.heappop(self._due)
+                record = self._jobs[job_id]
+                job = record['job']
+                job['completed_on'] = datetime.datetime.utcnow().isoformat() + 'Z'
+                if record['failed']:
+                    job['status'] = 'failed'
+                    job['failure'] = 'internal_processing'
+                    job['failure_detail'] = 'Simulated failure of the stand-in server'
+                else:
+                    job['status'] = 'transcribed'
+                job = dict(job)
+            if job.get('callback_url'):
+                threading.Thread(target=self._send_callback, args=(job,), daemon=True).start()
+
+    def _send_callback(self, job):
+        data = json.dumps({'job': job}).encode('utf-8')
+        callback = urllib.request.Request(job['callback_url'], data=data, headers={'Content-Type': 'application/json'})
+        try:
+            urllib.request.urlopen(callback, timeout=10).close()
+        except OSError:
+            return
+        with self._lock:
+            self.callbacks_sent += 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in for the Rev AI speech-to-text API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--turnaround', type=float, default=1.0, help='seconds until a job is finished')
+    parser.add_argument('--turnaround-per-second', type=float, default=0.0, help='extra seconds per second of audio')
+    parser.add_argument('--jitter', type=float, default=0.0, help='random extra turnaround in seconds')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds every request takes')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='share of jobs that fail (0 to 1)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with HTTP 503 (0 to 1)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    fake_server = FakeRevAiServer(args.host, args.port, args.turnaround, args.turnaround_per_second, args.jitter,
+                                  args.latency, args.failure_rate, args.seed, args.error_rate)
+    print(f'Fake Rev AI API listening on {fake_server.url}. Press Ctrl+C to stop.')
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        print(fake_server.stats())
+        fake_server.close()
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2023, Margaret Broeren, Yuzhe Gu, Mark Pitt
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+"""
+# Time whole transcription runs against the local stand-in server
+#
+# A synthetic corpus (see make_corpus.py) is transcribed by main() of
+# str_nogui.py in every scenario: the files individually or concatenated, in
+# CHAT or unformatted output. Every run gets a fresh FakeRevAiServer with the
+# same seed, so the jobs take the same time from run to run, and the cache and
+# journal are disabled, so nothing is reused between runs. For each scenario it
+# prints the median and fastest wall time, the throughput, the API requests and
+# the p95 time of the stages from the run metrics.
+#
+# The results can be saved and compared with those of an earlier version:
+#   python benchmark/main_benchmark.py --files 40 --repeat 3 --results before.json
+#   python benchmark/main_benchmark.py --files 40 --repeat 3 --compare before.json
+
+import argparse
+import configparser
+import contextlib
+import glob
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import str_nogui
+from str_discover import discover_audiofiles
+from str_probe import open_probe
+from fake_revai_server import FakeRevAiServer
+from make_corpus import make_corpus
+
+SCENARIOS = ['individual-CHAT', 'individual-unformatted', 'concatenated-CHAT', 'concatenated-unformatted']
+
+
+# Write the config file of a scenario in the working folder
+def _write_config(work_folder, scenario, input_folder, output_folder, api_url):
+    mode, output_format = scenario.split('-')
+    config = configparser.ConfigParser()
+    config['API.token'] = {'token': 'fake-token', 'save_check': '1', 'api_url': api_url}
+    config['folders'] = {'input_folder': input_folder, 'output_folder': output_folder}
+    config['output_format'] = {'format': output_format}
+    config['concatenation'] = {'concatenate_input': str(mode == 'concatenated'), 'csv_file': 'True'}
+    config['transcribe.config'] = {'diarization': 'True', 'punctuation': 'True', 'remove_disfluencies': 'False',
+                                   'speaker_channels_count': 'None', 'language': 'en', 'delete_after_seconds': 'None'}
+    # nothing is reused between runs, and every run is timed stage by stage
+    config['cache'] = {'enabled': 'False'}
+    config['journal'] = {'enabled': 'False'}
+    config['probe'] = {'cache': 'False'}
+    config['metrics'] = {'enabled': 'True'}
+    with open(os.path.join(work_folder, 'transcription_config.ini'), 'w') as cf:
+        config.write(cf)
+
+
+# Transcribe the corpus once in a scenario
+# Return:
+#   dict of the wall time, the requests received by the server and the stage summary of the run metrics
+def _run(scenario, corpus_folder, args, run_number):
+    server = FakeRevAiServer(turnaround=args.turnaround, turnaround_per_second=args.turnaround_per_second,
+                             jitter=args.jitter, latency=args.latency, failure_rate=args.failure_rate,
+                             seed=args.seed, error_rate=args.error_rate)
+    previous_folder = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_folder:
+        output_folder = os.path.join(work_folder, 'output')
+        os.mkdir(output_folder)
+        _write_config(work_folder, scenario, corpus_folder, output_folder, server.url)
+        # main() reads the config file and makes its temp folder in the working folder
+        os.chdir(work_folder)
+        try:
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                start = time.perf_counter()
+                str_nogui.main(None)
+                seconds = time.perf_counter() - start
+        finally:
+            os.chdir(previous_folder)
+            server.close()
+
+        stages = {}
+        for metrics_file in glob.glob(os.path.join(output_folder, 'metrics_*.jsonl')):
+            with open(metrics_file, encoding='utf-8') as f:
+                for line in f:
+                    record = json.loads(line)
+                    if 'summary' in record:
+                        stages = record['summary']
+    print(f'  {scenario} run {run_number}: {seconds:.2f}s')
+    return {'seconds': seconds, 'requests': server.stats(), 'stages': stages}
+
+
+# Summarize the runs of a scenario
+def _scenario_result(runs, audio_files, audio_seconds):
+    times = [run['seconds'] for run in runs]
+    median = statistics.median(times)
+    # the requests and stages of the run closest to the median
+    middle = min(runs, key=lambda run: abs(run['seconds'] - median))
+    return {'runs': [round(seconds, 3) for seconds in times],
+            'median_seconds': round(median, 3),
+            'min_seconds': round(min(times), 3),
+            'files_per_minute': round(60 * audio_files / median, 2),
+            'audio_minutes_per_minute': round(audio_seconds / median, 2),
+            'requests': middle['requests'],
+            'stage_p95': {stage_name: stage['p95'] for stage_name, stage in middle['stages'].items()}}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time transcription runs of a synthetic corpus against the stand-in server')
+    parser.add_argument('--corpus', help='folder of audio files to transcribe instead of a synthetic corpus')
+    parser.add_argument('--files', type=int, default=40, help='files of the synthetic corpus')
+    parser.add_argument('--formats', default='wav', help='comma separated formats of the synthetic corpus, e.g. wav,ogg,flac')
+    parser.add_argument('--duration', default='uniform:5:60', help='duration distribution of the synthetic corpus, see make_corpus.py')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma separated scenarios to run')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per scenario, the median is compared')
+    parser.add_argument('--turnaround', type=float, default=2.0, help='seconds until a job is finished')
+    parser.add_argument('--turnaround-per-second', type=float, default=0.0, help='extra seconds per second of audio')
+    parser.add_argument('--jitter', type=float, default=1.0, help='random extra turnaround in seconds')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds every request takes')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='share of jobs that fail (0 to 1)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with HTTP 503 (0 to 1)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--results', help='save the results to this json file')
+    parser.add_argument('--compare', help='json file of earlier results to compare with')
+    args = parser.parse_args()
+
+    scenarios = args.scenarios.split(',')
+    for scenario in scenarios:
+        if scenario not in SCENARIOS:
+            parser.error(f'unknown scenario {scenario}, choose from {",".join(SCENARIOS)}')
+
+    with tempfile.TemporaryDirectory() as corpus_temp_folder:
+        if args.corpus:
+            corpus_folder = os.path.abspath(args.corpus)
+            probe_config = configparser.ConfigParser()
+            probe_config['probe'] = {'cache': 'False'}
+            audio_probe = open_probe(probe_config)
+            corpus = [(audiofile, audio_probe.probe(audiofile)['duration']) for audiofile in discover_audiofiles(corpus_folder + '/')]
+        else:
+            corpus_folder = os.path.join(corpus_temp_folder, 'corpus')
+            corpus = make_corpus(corpus_folder, args.files, args.formats.split(','), args.duration, seed=args.seed)
+        audio_seconds = sum(seconds for _, seconds in corpus)
+        print(f'{len(corpus)} audio files, {audio_seconds / 60:.1f} minutes of audio')
+
+        results = {}
+        for scenario in scenarios:
+            runs = [_run(scenario, corpus_folder, args, i + 1) for i in range(args.repeat)]
+            results[scenario] = _scenario_result(runs, len(corpus), audio_seconds)
+
+    settings = {name: value for name, value in vars(args).items() if name not in ('results', 'compare', 'scenarios', 'repeat')}
+    earlier = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            earlier = json.load(f)
+        if earlier['settings'] != settings:
+            print(f'\nWarning: {args.compare} was made with other settings, the times may not be comparable.')
+
+    print(f'\n{"scenario":<26}{"median":>9}{"fastest":>9}{"files/min":>11}{"requests":>10}{"upload p95":>12}{"render p95":>12}'
+          + (f'{"change":>9}' if earlier else ''))
+    for scenario, result in results.items():
+        requests = sum(count for name, count in result['requests'].items() if name in ('submit', 'details', 'list', 'transcript'))
+        line = (f'{scenario:<26}{result["median_seconds"]:>8.2f}s{result["min_seconds"]:>8.2f}s{result["files_per_minute"]:>11.1f}'
+                f'{requests:>10}{result["stage_p95"].get("upload", 0):>11.2f}s{result["stage_p95"].get("render", 0):>11.2f}s')
+        if earlier and scenario in earlier['scenarios']:
+            before = earlier['scenarios'][scenario]['median_seconds']
+            line += f'{100 * (result["median_seconds"] - before) / before:>+8.1f}%'
+        print(line)
+
+    if args.results:
+        with open(args.results, 'w', encoding='utf-8') as f:
+            json.dump({'settings': settings,
+                       'python': platform.python_version(),
+                       'platform': platform.platform(),
+                       'cpu_count': os.cpu_count(),
+                       'scenarios': results}, f, indent=2)
+        print(f'\nResults saved in {args.results}')
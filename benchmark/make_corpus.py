@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2023, Margaret Broeren, Yuzhe Gu, Mark Pitt
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+"""
+# Make a folder of synthetic audio files to benchmark STR with
+#
+# The files are made of tone bursts that change pitch every syllable, with
+# short pauses between words and longer ones between sentences, so they decode,
+# trim and compress like speech without being speech. Their durations follow a
+# chosen distribution and their formats are mixed as asked. The same seed makes
+# the same corpus, so benchmark runs can be compared.
+#   python benchmark/make_corpus.py corpus --files 200 --formats wav,ogg,flac --duration lognormal:45:0.8
+#
+# Duration distributions, in seconds:
+#   fixed:SECONDS
+#   uniform:MIN:MAX
+#   lognormal:MEDIAN:SIGMA
+
+import argparse
+import array
+import math
+import os
+import random
+import sys
+import wave
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pydub import AudioSegment
+
+# shortest file made, whatever the distribution
+_MIN_SECONDS = 0.5
+
+
+# Parse a duration distribution, e.g. "uniform:5:120"
+# Return:
+#   function that takes a random.Random and returns a duration in seconds
+def parse_duration(text):
+    kind, *values = text.split(':')
+    try:
+        values = [float(value) for value in values]
+    except ValueError:
+        raise ValueError(f'duration values should be numbers: {text}')
+    if kind == 'fixed' and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == 'uniform' and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == 'lognormal' and len(values) == 2:
+        return lambda rng: values[0] * math.exp(rng.gauss(0, values[1]))
+    raise ValueError(f'unknown duration distribution: {text}. Use fixed:S, uniform:MIN:MAX or lognormal:MEDIAN:SIGMA')
+
+
+# 16-bit PCM bytes of the building blocks of the audio: syllables at several pitches and silence
+def _blocks(sample_rate):
+    syllable_samples = int(0.2 * sample_rate)
+    syllables = []
+    for pitch in (110, 140, 180, 220, 260):
+        samples = array.array('h', (int(6000 * math.sin(math.pi * i / syllable_samples)
+                                        * (math.sin(2 * math.pi * pitch * i / sample_rate)
+                                           + 0.4 * math.sin(4 * math.pi * pitch * i / sample_rate)))
+                                    for i in range(syllable_samples)))
+        if sys.byteorder == 'big':
+            samples.byteswap()
+        syllables.append(samples.tobytes())
+    return syllables, b'\0\0' * int(0.05 * sample_rate)
+
+
+# PCM bytes of a synthetic utterance of about the given duration
+def _make_pcm(seconds, rng, blocks, sample_rate):
+    syllables, silence = blocks
+    wanted = int(seconds * sample_rate) * 2
+    pieces = []
+    length = 0
+    while length < wanted:
+        # a word of 1 to 3 syllables, then a pause; a longer pause ends a sentence
+        word = [rng.choice(syllables) for _ in range(rng.randint(1, 3))]
+        word.append(silence * (rng.randint(1, 3) if rng.random() > 0.15 else rng.randint(8, 20)))
+        pieces += word
+        length += sum(len(piece) for piece in word)
+    return b''.join(pieces)[:wanted]
+
+
+# Make a corpus of synthetic audio files
+# Parameters:
+#   folder - the folder the files are written to. It is created if needed.
+#   files - number of files
+#   formats - list of the formats to mix, e.g. ['wav', 'ogg', 'flac']
+#   duration - duration distribution, see parse_duration
+#   sample_rate, channels - of the audio
+#   subfolders - number of sub folders the files are spread over. 0 puts them all in folder.
+#   seed - seed for the random numbers
+# Return:
+#   list of (file, duration in seconds)
+def make_corpus(folder, files, formats=('wav',), duration='uniform:5:60', sample_rate=16000, channels=1, subfolders=0, seed=0):
+    rng = random.Random(seed)
+    draw_duration = parse_duration(duration)
+    blocks = _blocks(sample_rate)
+    corpus = []
+    for i in range(files):
+        seconds = max(_MIN_SECONDS, draw_duration(rng))
+        audio_format = formats[i % len(formats)]
+        file_folder = os.path.join(folder, f'part{i % subfolders + 1}') if subfolders else folder
+        os.makedirs(file_folder, exist_ok=True)
+        audiofile = os.path.join(file_folder, f'speaker{i + 1:05d}.{audio_format}')
+
+        pcm = _make_pcm(seconds, rng, blocks, sample_rate)
+        if channels > 1:
+            # the same audio on every channel
+            frames = array.array('h', pcm)
+            pcm = array.array('h', (sample for sample in frames for _ in range(channels))).tobytes()
+        if audio_format == 'wav':
+            with wave.open(audiofile, 'wb') as wav:
+                wav.setnchannels(channels)
+                wav.setsampwidth(2)
+                wav.setframerate(sample_rate)
+                wav.writeframes(pcm)
+        else:
+            AudioSegment(data=pcm, sample_width=2, frame_rate=sample_rate, channels=channels).export(audiofile, format=audio_format)
+        corpus.append((audiofile, round(len(pcm) / (2 * channels * sample_rate), 3)))
+    return corpus
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Make a folder of synthetic audio files')
+    parser.add_argument('folder', help='folder the files are written to')
+    parser.add_argument('--files', type=int, default=100)
+    parser.add_argument('--formats', default='wav', help='comma separated formats to mix, e.g. wav,ogg,flac')
+    parser.add_argument('--duration', default='uniform:5:60', help='duration distribution in seconds, e.g. lognormal:45:0.8')
+    parser.add_argument('--sample-rate', type=int, default=16000)
+    parser.add_argument('--channels', type=int, default=1)
+    parser.add_argument('--subfolders', type=int, default=0, help='spread the files over this many sub folders')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.folder, args.files, args.formats.split(','), args.duration, args.sample_rate,
+                         args.channels, args.subfolders, args.seed)
+    total_seconds = sum(seconds for _, seconds in corpus)
+    total_size = sum(os.path.getsize(audiofile) for audiofile, _ in corpus)
+    print(f'{len(corpus)} files in {args.folder}, {total_seconds / 60:.1f} minutes of audio, {total_size / 1048576:.1f} MB')
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2023, Margaret Broeren, Yuzhe Gu, Mark Pitt
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+"""
+# Measure how long it takes to save a long transcript
+#
+# A placeholder transcript of the given number of words (two speakers, a new
+# turn every 20 words, like the stand-in server makes) is saved with
+# save_transcription of str_nogui.py in every output mode: CHAT or
+# unformatted, with and without the word by word csv file. It prints the
+# time per mode and the words saved per second.
+#   python benchmark/render_benchmark.py --words 1000000 --repeat 3
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from str_nogui import save_transcription
+from str_transcript import Transcript
+from fake_revai_server import _make_transcript
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the time save_transcription takes on a long transcript')
+    parser.add_argument('--words', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=3, help='runs per mode, the fastest one is shown')
+    parser.add_argument('--no-speakers', action='store_true', help='leave out the speakers, as with speaker channels')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    transcript_json = _make_transcript(args.words / 2, 'benchmark')
+    transcript = Transcript.from_json(transcript_json, 'input/benchmark.wav', has_speakers=not args.no_speakers)
+    del transcript_json
+    print(f'{len(transcript)} words, built in {time.perf_counter() - start:.2f}s')
+
+    print(f'{"mode":<22}{"time":>9}{"words/s":>12}{"MB written":>12}')
+    with tempfile.TemporaryDirectory() as folder:
+        output_file = os.path.join(folder, 'benchmark_transcription.cha')
+        for CHAT_output in (True, False):
+            for csv_file in (False, True):
+                times = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    save_transcription(transcript, output_file, csv_file, CHAT_output)
+                    times.append(time.perf_counter() - start)
+                size = sum(os.path.getsize(os.path.join(folder, name)) for name in os.listdir(folder))
+                for name in os.listdir(folder):
+                    os.remove(os.path.join(folder, name))
+                mode = f'{"CHAT" if CHAT_output else "unformatted"}{" + csv" if csv_file else ""}'
+                print(f'{mode:<22}{min(times):>8.2f}s{len(transcript) / min(times):>12.0f}{size / 1048576:>12.1f}')
@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2023, Margaret Broeren, Yuzhe Gu, Mark Pitt
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+"""
+# Concatenation of audio files that does not hold the whole corpus in memory
+#
+# The files are written to the output one after the other, each followed by
+# 100 ms of silence, so memory use depends on the largest file and not on the
+# number of files. Three ways are tried, fastest first:
+#   - WAV files with the same channels, sample width and frame rate are
+#     copied frame by frame without being decoded.
+#   - Compressed files with the same codec and parameters (mp3, opus)
+#     are joined by ffmpeg without decoding and encoding them again.
+#   - Otherwise every file is decoded on its own, converted to a common
+#     format and written to a wave writer or an ffmpeg encoder. The files
+#     are decoded in the worker processes of a DecodePool and written in order.
+#
+# The start and end of every file in the concatenated audio are kept in an
+# offset index, so the transcript of the concatenated audio can be split back
+# into one transcript per file.
+
+import bisect
+import io
+import os
+import subprocess
+import tempfile
+import wave
+from pydub import AudioSegment
+from str_decode import DecodePool
+from str_discover import audio_extension
+from str_probe import AudioProbe
+from str_profile import apply_profile, export_profile, encoder_options
+from str_vad import trim_silence
+
+# frames copied at a time from a WAV file
+_CHUNK_FRAMES = 64 * 1024
+
+# codecs whose packets can be joined without re-encoding. Vorbis is left out:
+# every file has its own codebooks in the header, so the packets of the later
+# files cannot be decoded with the header of the first one. Raw flac is left
+# out because the joined file keeps the sample count and timestamps of the first file.
+_STREAM_COPY_ENCODERS = {'mp3': 'libmp3lame', 'opus': 'libopus'}
+
+# ffmpeg raw formats of the PCM piped to it, by sample width in bytes. 8 bit WAV samples are unsigned.
+_RAW_FORMATS = {1: 'u8', 2: 's16le', 4: 's32le'}
+
+
+# The channels, sample width and frame rate of a PCM WAV file
+# Parameters:
+#   info - the format of the file, from AudioProbe.probe
+# Return:
+#   (channels, sample width in bytes, frame rate), or None if it is not a PCM WAV file
+def wav_parameters(info):
+    if not info.get('sample_width'):
+        return None
+    return (info['channels'], info['sample_width'], info['sample_rate'])
+
+
+# Silence of the given length in the given PCM format
+def silence_frames(duration_ms, channels, sample_width, frame_rate):
+    # 8 bit WAV samples are unsigned, so silence is the middle value
+    sample = b'\x80' if sample_width == 1 else b'\0' * sample_width
+    return sample * channels * int(frame_rate * duration_ms / 1000)
+
+
+# Split audio files into groups that are concatenated and transcribed as separate jobs
+# The files are kept in their order: a group is closed when the next file would
+# make it longer or larger than the limits. A file over the limits is a group of its own.
+# Parameters:
+#   audiofiles - the audio files, in order
+#   max_seconds - longest duration of a group in seconds, 0 for no limit
+#   max_bytes - largest size of a group in bytes, 0 for no limit
+#   probe - the AudioProbe that reads the durations of the files
+# Return:
+#   list of groups, each a list of audio files
+def pack_groups(audiofiles, max_seconds=0, max_bytes=0, probe=None):
+    probe = probe or AudioProbe()
+    groups = []
+    group_seconds = group_bytes = 0
+    for audiofile in audiofiles:
+        seconds = probe.probe(audiofile)['duration'] if max_seconds else 0
+        size = os.path.getsize(audiofile) if max_bytes else 0
+        if (not groups or (max_seconds and group_seconds + seconds > max_seconds)
+                or (max_bytes and group_bytes + size > max_bytes)):
+            groups.append([])
+            group_seconds = group_bytes = 0
+        groups[-1].append(audiofile)
+        group_seconds += seconds
+        group_bytes += size
+    return groups
+
+
+# Concatenate audio files into one file with a short silence after each of them
+# Parameters:
+#   output_file - the concatenated audio file to write
+#   audiofiles - the audio files, in order
+#   file_extension - format of the output file. The audio files can be in other formats, they are then decoded.
+#   separator_ms - milliseconds of silence after every file
+#   probe - the AudioProbe that reads the formats of the files
+#   profile - the submission profile the output is converted to, see str_profile.py. None to keep the format of the files.
+#   decoder - the DecodePool the files are decoded in when they have to be decoded. None decodes them in this thread.
+#   exact_offsets - True when the durations must match the output exactly, e.g. to split its transcript by file.
+#                   Compressed files are then decoded instead of joined packet by packet.
+# Return:
+#   list of the duration in seconds of every audio file in the output, without the silence
+def concatenate_streaming(output_file, audiofiles, file_extension, separator_ms=100, probe=None, profile=None, decoder=None, exact_offsets=False):
+    probe = probe or AudioProbe()
+    decoder = decoder or DecodePool()
+    infos = [probe.probe(audiofile) for audiofile in audiofiles]
+    if profile != None:
+        return _decode_and_write(output_file, audiofiles, infos, file_extension, separator_ms, decoder, profile)
+    if file_extension == 'wav':
+        parameters = [wav_parameters(info) for info in infos]
+        if None not in parameters and len(set(parameters)) == 1:
+            return _copy_wav_frames(output_file, audiofiles, parameters[0], separator_ms)
+    elif not exact_offsets and all(audio_extension(audiofile) == file_extension for audiofile in audiofiles):
+        durations = _stream_copy(output_file, audiofiles, infos, file_extension, separator_ms)
+        if durations != None:
+            return durations
+    return _decode_and_write(output_file, audiofiles, infos, file_extension, separator_ms, decoder)
+
+
+# WAV files in the same format: copy the frames a chunk at a time
+def _copy_wav_frames(output_file, audiofiles, parameters, separator_ms):
+    channels, sample_width, frame_rate = parameters
+    silence = silence_frames(separator_ms, channels, sample_width, frame_rate)
+    durations = []
+    with wave.open(output_file, 'wb') as output:
+        output.setnchannels(channels)
+        output.setsampwidth(sample_width)
+        output.setframerate(frame_rate)
+        for audiofile in audiofiles:
+            with wave.open(audiofile, 'rb') as wav:
+                for frames in iter(lambda: wav.readframes(_CHUNK_FRAMES), b''):
+                    output.writeframesraw(frames)
+                durations.append(wav.getnframes() / frame_rate)
+            output.writeframesraw(silence)
+    return durations
+
+
+# Compressed files with the same codec and parameters: let ffmpeg join the
+# packets, with a silence clip in the same format after every file.
+# The durations are read from the headers of the files. The encoder delay and
+# padding of every file and the silence clip rounded to whole frames move the
+# files in the output a little more with every file, so they are approximate.
+# Return:
+#   the durations of the files, or None when the files cannot be joined this way
+def _stream_copy(output_file, audiofiles, infos, file_extension, separator_ms):
+    formats = set((info['codec'], info['sample_rate'], info['channels']) for info in infos)
+    if len(formats) != 1:
+        return None
+    codec, sample_rate, channels = formats.pop()
+    if codec not in _STREAM_COPY_ENCODERS or channels not in (1, 2):
+        return None
+
+    folder = os.path.dirname(os.path.abspath(output_file))
+    with tempfile.TemporaryDirectory(dir=folder) as work_folder:
+        silence_file = os.path.join(work_folder, 'silence.' + file_extension)
+        list_file = os.path.join(work_folder, 'files.txt')
+        with open(list_file, 'w', encoding='utf-8') as f:
+            for audiofile in audiofiles:
+                for path in (os.path.abspath(audiofile), silence_file):
+                    f.write("file '{}'\n".format(path.replace("'", "'\\''")))
+        try:
+            subprocess.run([AudioSegment.converter, '-y', '-v', 'error', '-f', 'lavfi',
+                            '-i', f'anullsrc=r={sample_rate}:cl={"mono" if channels == 1 else "stereo"}',
+                            '-t', str(separator_ms / 1000), '-c:a', _STREAM_COPY_ENCODERS[codec], silence_file],
+                           check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            subprocess.run([AudioSegment.converter, '-y', '-v', 'error', '-f', 'concat', '-safe', '0',
+                            '-i', list_file, '-c', 'copy', output_file],
+                           check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    return [info['duration'] for info in infos]
+
+
+# Decode the files in the worker processes and write them in a common format, in order
+def _decode_and_write(output_file, audiofiles, infos, file_extension, separator_ms, decoder, profile=None):
+    # The common format is the highest channel count and frame rate of the files,
+    # as when AudioSegments are added together. Compressed audio is decoded to 16 bit.
+    channels, sample_width, frame_rate = 1, 2, 1
+    for info in infos:
+        parameters = wav_parameters(info) or (info['channels'], 2, info['sample_rate'])
+        channels = max(channels, parameters[0])
+        sample_width = max(sample_width, parameters[1])
+        frame_rate = max(frame_rate, parameters[2])
+    # the submission profile lowers the channels, frame rate and sample width
+    if profile != None:
+        channels = profile['channels'] or channels
+        frame_rate = min(frame_rate, profile['sample_rate'])
+        sample_width = 2
+    # pydub holds 24 bit audio as 32 bit, so it is decoded to 32 bit
+    if sample_width == 3:
+        sample_width = 4
+
+    write_wav = profile['codec'] == 'wav' if profile != None else file_extension == 'wav'
+    silence = silence_frames(separator_ms, channels, sample_width, frame_rate)
+    if write_wav:
+        output = wave.open(output_file, 'wb')
+        output.setnchannels(channels)
+        output.setsampwidth(sample_width)
+        output.setframerate(frame_rate)
+        write = output.writeframesraw
+    else:
+        command = [AudioSegment.converter, '-y', '-v', 'error', '-f', _RAW_FORMATS[sample_width], '-ar', str(frame_rate),
+                   '-ac', str(channels), '-i', '-']
+        codec = infos[-1]['codec']
+        if profile != None:
+            command += encoder_options(profile)
+        elif file_extension == 'ogg':
+            # ogg files are written with the codec they were read with, as vorbis or opus
+            command += ['-f', file_extension, '-acodec', 'libvorbis' if codec == 'vorbis' else codec]
+        else:
+            command += ['-f', file_extension]
+        command.append(output_file)
+        output = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        write = output.stdin.write
+
+    durations = []
+    frame_width = channels * sample_width
+    try:
+        for raw_data in decoder.map(decode_pcm, ((audiofile, audio_extension(audiofile), info, channels, sample_width, frame_rate)
+                                                 for audiofile, info in zip(audiofiles, infos))):
+            write(raw_data)
+            write(silence)
+            durations.append(len(raw_data) // frame_width / frame_rate)
+            del raw_data
+    finally:
+        if write_wav:
+            output.close()
+        else:
+            output.stdin.close()
+            error = output.stderr.read()
+            if output.wait() != 0:
+                raise RuntimeError(f'ffmpeg could not write {output_file}: {error.decode(errors="ignore")}')
+    return durations
+
+
+# Read an audio file, with the codec the ogg files were encoded with
+# Parameters:
+#   info - the format of the file, from AudioProbe.probe
+def read_audio(audiofile, file_extension, info):
+    if file_extension == 'ogg':
+        filecodec = info['codec']
+        if filecodec == 'vorbis':
+            filecodec = ''.join(('lib', filecodec))
+        return AudioSegment.from_file(audiofile, codec=filecodec)
+    return AudioSegment.from_file(audiofile)
+
+
+# Decode an audio file to raw samples in the given format. Run in the worker processes of a DecodePool.
+# Parameters:
+#   info - the format of the file, from AudioProbe.probe
+#   channels, sample_width, frame_rate - the format of the samples
+# Return:
+#   the raw samples
+def decode_pcm(audiofile, file_extension, info, channels, sample_width, frame_rate):
+    segment = read_audio(audiofile, file_extension, info)
+    return segment.set_channels(channels).set_frame_rate(frame_rate).set_sample_width(sample_width).raw_data
+
+
+# Trim, elongate and convert one audio file. Run in the worker processes of a DecodePool.
+# Parameters:
+#   audiofile - the original audio file
+#   added_duration - seconds of silence to append, when it is positive
+#   file_extension - format of the audio file
+#   info - the format of the file, from AudioProbe.probe
+#   out_files - (file name when silence is appended, file name otherwise)
+#   max_memory - size in bytes up to which the encoded audio is given back instead of
+#                being saved, or None to always save it. Larger audio is saved, so it
+#                is never held in memory whole.
+#   profile - the submission profile the audio is converted to, or None to keep the format
+#   trim - the settings of trim_silence, or None to keep the silence. Silence
+#          is appended when the audio is shorter than added_duration asks for after trimming.
+# Return:
+#   out_file - the file name of the new audio
+#   data - the encoded audio when it is given back, otherwise None
+#   offset_map - the offset map of the trimmed audio, or None if it was not trimmed
+def prepare_audiofile(audiofile, added_duration, file_extension, info, out_files, max_memory=None, profile=None, trim=None):
+    segment = read_audio(audiofile, file_extension, info)
+
+    offset_map = None
+    if trim != None:
+        original_duration = segment.duration_seconds
+        segment, offset_map = trim_silence(segment, **trim)
+        # the trimmed audio must still be as long
+        added_duration += original_duration - segment.duration_seconds
+
+    if added_duration > 0:
+        segment += AudioSegment.silent(duration = 1000 * added_duration)
+        out_file = out_files[0]
+    else:
+        out_file = out_files[1]
+
+    if profile != None:
+        segment = apply_profile(segment, profile)
+    # the raw samples are at least as large as the encoded audio
+    to_memory = max_memory != None and len(segment.raw_data) <= max_memory
+    output = io.BytesIO() if to_memory else out_file
+    if profile != None:
+        file_handle = export_profile(segment, output, profile)
+    elif file_extension == 'ogg':
+        codec = 'libvorbis' if info['codec'] == 'vorbis' else info['codec']
+        file_handle = segment.export(output, format=file_extension, codec=codec)
+    else:
+        file_handle = segment.export(output, format=file_extension)
+
+    if to_memory:
+        return out_file, output.getvalue(), offset_map
+    file_handle.close()
+    return out_file, None, offset_map
+
+
+# Make the time-offset index of a concatenated audio file
+# Parameters:
+#   audiofiles - the audio files, in the order they were concatenated
+#   durations - their durations in seconds, as returned by concatenate_streaming
+#   separator_ms - milliseconds of silence after every file
+# Return:
+#   one dict per audio file with its start and end in seconds in the concatenated audio
+def offset_index(audiofiles, durations, separator_ms=100):
+    index = []
+    start = 0.0
+    for audiofile, duration in zip(audiofiles, durations):
+        index.append({'file': audiofile, 'start': start, 'end': start + duration})
+        start += duration + separator_ms / 1000
+    return index
+
+
+# Split the transcript of a concatenated audio file into one transcript per audio file
+# Every word goes to the file it starts in, words in the silence after a file
+# go to that file. Punctuation has no timestamps and goes with the word before it,
+# or with the word after it at the start of a monologue.
+# The timestamps are made relative to the start of each file.
+# Parameters:
+#   transcript_json - the transcript returned by Rev AI for the concatenated audio
+#   index - the offset index of the concatenated audio
+# Return:
+#   list of (audio file, transcript json) in the order of the index
+def split_transcript(transcript_json, index):
+    starts = [entry['start'] for entry in index]
+    monologues = [[] for _ in index]
+    # file of the last word of the transcript so far
+    last = 0
+    for monologue in transcript_json['monologues']:
+        current = None
+        # punctuation before the first word of the monologue, it goes to the file of that word
+        leading = []
+        for element in monologue['elements']:
+            if 'ts' in element:
+                position = max(0, bisect.bisect_right(starts, element['ts']) - 1)
+                if current == None or position != current:
+                    current = position
+                    monologues[current].append(dict(monologue, elements=leading))
+                    leading = []
+                element = dict(element, ts=round(element['ts'] - starts[current], 3),
+                               end_ts=round(element['end_ts'] - starts[current], 3))
+            elif current == None:
+                leading.append(element)
+                continue
+            monologues[current][-1]['elements'].append(element)
+        if current == None:
+            # a monologue without words goes with the word before it
+            if leading:
+                monologues[last].append(dict(monologue, elements=leading))
+        else:
+            last = current
+    return [(entry['file'], dict(transcript_json, monologues=monologues[i])) for i, entry in enumerate(index)]
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2023, Margaret Broeren, Yuzhe Gu, Mark Pitt
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+"""
+# Bulk output of a whole run in one dataset
+#
+# Next to the output files of every audio file, the words of all the
+# transcripts of a run can be saved in one dataset with typed columns, which
+# loads much faster for analysis than thousands of csv files:
+#   file (string), word (string), confidence (float, null for punctuation),
+#   speaker (integer, null without speakers), start and end (float, seconds)
+# The words of a transcript are appended a batch at a time as soon as it is
+# rendered. Parquet and Arrow buffer the words of many short transcripts and
+# write them in row groups of up to 64k words. The formats are line-delimited json (one json object per word),
+# Parquet and the Arrow IPC file format.
+#
+# Parquet and Arrow need pyarrow:
+#   pip3 install pyarrow
+
+import json
+import os
+import threading
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# format: file extension
+BULK_FORMATS = {'jsonl': 'jsonl', 'parquet': 'parquet', 'arrow': 'arrow'}
+
+COLUMNS = ['file', 'word', 'confidence', 'speaker', 'start', 'end']
+
+# words buffered before they are written as one Parquet row group or Arrow record batch
+ROWS_PER_GROUP = 64 * 1024
+
+
+# True when the bulk output format can be written. Parquet and Arrow need pyarrow.
+def bulk_available(bulk_format):
+    return bulk_format == 'jsonl' or pyarrow != None
+
+
+# Open the bulk output dataset of a run if it is enabled in the [bulk_output] section of the config file
+# Parameters:
+#   config - the config file reader
+#   output_folder - the folder the dataset is saved in
+#   run_name - the file name of the dataset, without extension
+# Return:
+#   the dataset, or None when bulk output is disabled
+def open_bulk_output(config, output_folder, run_name):
+    bulk_format = config.get('bulk_output', 'format', fallback='none').lower()
+    if bulk_format == 'none':
+        return None
+    path = os.path.join(output_folder, f'{run_name}.{BULK_FORMATS[bulk_format]}')
+    dataset_class = {'jsonl': JsonlDataset, 'parquet': ParquetDataset, 'arrow': ArrowDataset}[bulk_format]
+    return dataset_class(path)
+
+
+# Line-delimited json, one object per word
+class JsonlDataset:
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'w', encoding='utf-8', newline='\n')
+
+    # Append a batch of words
+    # Parameters:
+    #   columns - dict of column name: list of the values of the words, see COLUMNS
+    def append(self, columns):
+        dumps = json.dumps
+        lines = [dumps(dict(zip(COLUMNS, row))) + '\n' for row in zip(*(columns[name] for name in COLUMNS))]
+        with self._lock:
+            self._file.write(''.join(lines))
+
+    def close(self):
+        self._file.close()
+
+
+def _arrow_schema():
+    return pyarrow.schema([('file', pyarrow.string()),
+                           ('word', pyarrow.string()),
+                           ('confidence', pyarrow.float64()),
+                           ('speaker', pyarrow.int32()),
+                           ('start', pyarrow.float64()),
+                           ('end', pyarrow.float64())])
+
+
+# Words of the batches of many short transcripts, written ROWS_PER_GROUP at a time,
+# so a file does not end up with thousands of row groups of a few words each
+class _BufferedDataset:
+
+    # Parameters:
+    #   rows_per_group - words written at a time, the last group can be smaller
+    def __init__(self, path, rows_per_group=ROWS_PER_GROUP):
+        self.path = path
+        self.rows_per_group = rows_per_group
+        self._lock = threading.Lock()
+        self._schema = _arrow_schema()
+        self._columns = {name: [] for name in COLUMNS}
+        self._rows = 0
+
+    def append(self, columns):
+        with self._lock:
+            for name in COLUMNS:
+                self._columns[name].extend(columns[name])
+            self._rows += len(columns['word'])
+            if self._rows >= self.rows_per_group:
+                self._flush()
+
+    def _flush(self):
+        if self._rows:
+            self._write(self._columns)
+            self._columns = {name: [] for name in COLUMNS}
+            self._rows = 0
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._close()
+
+
+# Parquet file, one row group per ROWS_PER_GROUP words
+class ParquetDataset(_BufferedDataset):
+
+    def __init__(self, path, rows_per_group=ROWS_PER_GROUP):
+        super().__init__(path, rows_per_group)
+        self._writer = pyarrow.parquet.ParquetWriter(path, self._schema)
+
+    def _write(self, columns):
+        self._writer.write_table(pyarrow.Table.from_pydict(columns, schema=self._schema))
+
+    def _close(self):
+        self._writer.close()
+
+
+# Arrow IPC file, one record batch per ROWS_PER_GROUP words
+class ArrowDataset(_BufferedDataset):
+
+    def __init__(self, path, rows_per_group=ROWS_PER_GROUP):
+        super().__init__(path, rows_per_group)
+        self._sink = pyarrow.OSFile(path, 'wb')
+        self._writer = pyarrow.ipc.new_file(self._sink, self._schema)
+
+    def _write(self, columns):
+        self._writer.write_batch(pyarrow.RecordBatch.from_pydict(columns, schema=self._schema))
+
+    def _close(self):
+        self._writer.close()
+        self._sink.close()
+
+
+# Writer of str_render.py that appends the words of a transcript to a bulk output dataset
+class BulkWriter:
+
+    # Parameters:
+    #   dataset - the dataset the words are appended to. It is shared by the writers of the run and not closed.
+    #   first_speaker - number of the first speaker, as in the csv file. Rev AI numbers them from 0, CHAT from 1.
+    def __init__(self, dataset, first_speaker=0):
+        self.dataset = dataset
+        self.first_speaker = first_speaker
+
+    def begin(self, transcript):
+        pass
+
+    def write_chunk(self, chunk):
+        transcript = chunk.transcript
+        filenames = transcript.filenames
+        start, end = chunk.start, chunk.end
+        word_count = end - start
+        # NaN (no confidence or time) is saved as null
+        columns = {'file': [filenames[file_id] for file_id in transcript.file_ids[start:end]],
+                   'word': chunk.words,
+                   'confidence': [None if value != value else value for value in transcript.confidences[start:end]],
+                   'speaker': ([speaker + self.first_speaker for speaker in chunk.speakers] if chunk.speakers != None
+                               else [None] * word_count),
+                   'start': [None if value != value else value for value in transcript.starts[start:end]],
+                   'end': [None if value != value else value for value in transcript.ends[start:end]]}
+        self.dataset.append(columns)
+
+    def close(self):
+        pass
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2023, Margaret Broeren, Yuzhe Gu, Mark Pitt
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+"""
+# On-disk cache of Rev AI transcripts
+#
+# A transcript is stored under a key made from the bytes of the audio and the
+# settings it was submitted with, so the same audio transcribed with the same
+# settings is not uploaded and paid for again. Entries older than max_age_days
+# are removed, and the least recently used entries are removed when the cache
+# grows over max_size_mb.
+#
+# Show the cache statistics or empty the cache from the command line:
+#   python str_cache.py --stats
+#   python str_cache.py --clear
+
+import argparse
+import configparser
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+# Read the cache settings from the [cache] section of the config file
+# Parameters:
+#   config - the config file reader
+# Return:
+#   dict of keyword arguments for TranscriptCache
+def cache_settings(config):
+    return {'folder': config.get('cache', 'folder', fallback='transcript_cache'),
+            'max_size_mb': config.getfloat('cache', 'max_size_mb', fallback=500),
+            'max_age_days': config.getfloat('cache', 'max_age_days', fallback=30)}
+
+
+# Open the transcript cache if it is enabled in the config file
+# Return:
+#   the TranscriptCache, or None when the cache is disabled
+def open_cache(config):
+    if not config.getboolean('cache', 'enabled', fallback=False):
+        return None
+    return TranscriptCache(**cache_settings(config))
+
+
+class TranscriptCache:
+
+    # Parameters:
+    #   folder - folder that holds the cached transcripts. It is created if needed.
+    #   max_size_mb - total size of the cached transcripts before the least recently used ones are removed
+    #   max_age_days - cached transcripts older than this are removed
+    def __init__(self, folder, max_size_mb=500, max_age_days=30):
+        self.folder = folder
+        self.max_size = max_size_mb * 1024 * 1024
+        self.max_age = max_age_days * 24 * 3600
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        # key: (size in bytes, time of last use) of every cached transcript
+        self._entries = {}
+        os.makedirs(folder, exist_ok=True)
+        for entry in os.scandir(folder):
+            if entry.name.endswith('.json'):
+                info = entry.stat()
+                self._entries[entry.name[:-len('.json')]] = (info.st_size, info.st_mtime)
+        self.evict()
+
+    # Make the cache key of some audio
+    # Parameters:
+    #   audiofiles - list of the audio files that were submitted (several for concatenated input)
+    #   parameters - dict of the submission settings that change the transcript
+    # Return:
+    #   the key, a sha256 hex digest
+    @staticmethod
+    def key(audiofiles, parameters):
+        digest = hashlib.sha256()
+        for audiofile in audiofiles:
+            with open(audiofile, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+            # keep the boundary between two files in the key
+            digest.update(b'\0')
+        digest.update(json.dumps(parameters, sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.folder, key + '.json')
+
+    # Return the cached transcript json, or None if it is not cached
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                transcript_json = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self._entries.pop(key, None)
+                self.misses += 1
+            return None
+        self._used(key)
+        return transcript_json
+
+    # Return the file of the cached transcript json, to be read a block at a time, or None if it is not cached
+    def get_file(self, key):
+        with self._lock:
+            if key not in self._entries or not os.path.exists(self._path(key)):
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+        self._used(key)
+        return self._path(key)
+
+    # Count a hit and mark the entry as used now
+    def _used(self, key):
+        now = time.time()
+        with self._lock:
+            self.hits += 1
+            if key in self._entries:
+                self._entries[key] = (self._entries[key][0], now)
+        try:
+            # the modification time marks the last use, for the eviction
+            os.utime(self._path(key), (now, now))
+        except OSError:
+            pass
+
+    # A file name in the cache folder to write a transcript to before it is stored with put_file
+    def temp_file(self, key):
+        return f'{self._path(key)}.{threading.get_ident()}.tmp'
+
+    # Store a transcript json
+    def put(self, key, transcript_json):
+        temp_path = self.temp_file(key)
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(transcript_json, f)
+        self.put_file(key, temp_path)
+
+    # Store a transcript json file, e.g. one written a block at a time. The file is moved into the cache.
+    def put_file(self, key, transcript_file):
+        # replacing is atomic, so an interrupted run never leaves half a transcript behind
+        os.replace(transcript_file, self._path(key))
+        with self._lock:
+            self._entries[key] = (os.path.getsize(self._path(key)), time.time())
+        self.evict()
+
+    # Remove the entries that are too old, then the least recently used ones until the cache is small enough
+    def evict(self):
+        with self._lock:
+            now = time.time()
+            removed = set(key for key, (_, used) in self._entries.items() if now - used > self.max_age)
+            total_size = sum(size for key, (size, _) in self._entries.items() if key not in removed)
+            if total_size > self.max_size:
+                for key, (size, _) in sorted(self._entries.items(), key=lambda item: item[1][1]):
+                    if total_size <= self.max_size:
+                        break
+                    if key not in removed:
+                        removed.add(key)
+                        total_size -= size
+            for key in removed:
+                self._entries.pop(key)
+        for key in removed:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    # Remove one cached transcript, or all of them if key is None
+    def invalidate(self, key=None):
+        with self._lock:
+            keys = list(self._entries) if key is None else [key]
+            for k in keys:
+                self._entries.pop(k, None)
+        for k in keys:
+            try:
+                os.remove(self._path(k))
+            except OSError:
+                pass
+
+    # Number of hits and misses since the cache was opened, and its current size
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'entries': len(self._entries),
+                    'size_mb': sum(size for size, _ in self._entries.values()) / (1024 * 1024)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Manage the transcript cache')
+    parser.add_argument('--clear', action='store_true', help='remove every cached transcript')
+    parser.add_argument('--stats', action='store_true', help='show the number and size of the cached transcripts')
+    args = parser.parse_args()
+
+    config = configparser.ConfigParser()
+    config.read('transcription_config.ini')
+    transcript_cache = TranscriptCache(**cache_settings(config))
+
+    if args.clear:
+        transcript_cache.invalidate()
+        print(f'Transcript cache in {transcript_cache.folder} cleared.')
+    stats = transcript_cache.stats()
+    print(f'{stats["entries"]} cached transcripts, {stats["size_mb"]:.1f} MB')
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2023, Margaret Broeren, Yuzhe Gu, Mark Pitt
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+"""
+# Process pool for decoding and encoding audio
+#
+# pydub converts audio (channels, frame rate, sample width) in Python and
+# waits for ffmpeg one file at a time, so preparing a large folder uses one
+# core. The decoding and encoding of files is handed to a pool of worker
+# processes instead. Results are given back in the order the files were
+# submitted, so concatenated audio is the same with any number of workers.
+#
+# The worker processes are started with the spawn method on every platform:
+# the pipeline threads are already running, and forking a process with
+# threads can deadlock.
+
+import collections
+import itertools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+
+# Read the number of decoding processes from the [decode] section of the config file
+# Parameters:
+#   config - the config file reader
+# Return:
+#   number of worker processes. 0 in the config file means one per core.
+def decode_workers(config):
+    workers = config.getint('decode', 'workers', fallback=0)
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+# Open the decoding pool configured in the config file
+def open_decoder(config):
+    return DecodePool(decode_workers(config))
+
+
+class DecodePool:
+
+    # Parameters:
+    #   workers - number of worker processes. With 1 the audio is decoded in the calling thread.
+    def __init__(self, workers=1):
+        self.workers = max(1, workers)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    # The processes are started on first use, so a run that decodes nothing starts none
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    # Run a function in a worker process and wait for its result
+    # Parameters:
+    #   function - a function of a module, so it can be run in another process
+    #   args - its arguments. They and the result are copied between the processes.
+    def run(self, function, *args):
+        if self.workers == 1:
+            return function(*args)
+        return self._pool().submit(function, *args).result()
+
+    # Run a function on every item in the worker processes, keeping the order
+    # Only a few items more than the number of workers are decoded ahead of the
+    # one that is given back, so memory use does not grow with the number of items.
+    # Parameters:
+    #   function - a function of a module, so it can be run in another process
+    #   argument_list - iterable of the tuples of arguments of every call
+    # Return:
+    #   generator of the results, in the order of argument_list
+    def map(self, function, argument_list):
+        if self.workers == 1:
+            for args in argument_list:
+                yield function(*args)
+            return
+
+        pool = self._pool()
+        argument_list = iter(argument_list)
+        pending = collections.deque(pool.submit(function, *args) for args in itertools.islice(argument_list, 2 * self.workers))
+        try:
+            while pending:
+                result = pending.popleft().result()
+                for args in itertools.islice(argument_list, 1):
+                    pending.append(pool.submit(function, *args))
+                yield result
+        finally:
+            # the caller stopped early or a file could not be decoded
+            for future in pending:
+                future.cancel()
+
+    # Stop the worker processes
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
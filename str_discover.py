@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2023, Margaret Broeren, Yuzhe Gu, Mark Pitt
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+"""
+# Discovery of the audio files of the input folder
+#
+# The input folder and its sub folders are walked with os.scandir, one
+# folder at a time, and the audio files are given back as they are found, so
+# the first files of a tree of 100k+ files are transcribed while the rest of
+# the tree is still being read. Files in any of the supported formats can be
+# mixed. Folders and files whose name starts with a dot are skipped.
+
+import functools
+import os
+
+SUPPORTED_EXTENSIONS = ('mp3', 'wav', 'ogg', 'opus', 'flac', 'webm')
+
+# format of concatenated audio files in different formats
+MIXED_EXTENSION = 'flac'
+
+
+# The format of an audio file from its extension, in lower case. Other dots in the name are kept in the name.
+def audio_extension(audiofile):
+    return os.path.splitext(audiofile)[1][1:].lower()
+
+
+# The name of an audio file without its extension, used to name the files made from it.
+# When an audio file of another format has the same name in the same folder,
+# e.g. x.wav and x.mp3, the extension is kept (x.wav and x.mp3), so the
+# transcriptions and temp files of the two files do not replace each other.
+# The name of a file does not change during a run, even if such a file is added later.
+@functools.lru_cache(maxsize=65536)
+def audio_stem(audiofile):
+    folder, file_name = os.path.split(audiofile)
+    stem, extension = os.path.splitext(file_name)
+    for other_extension in SUPPORTED_EXTENSIONS:
+        for other_name in (f'{stem}.{other_extension}', f'{stem}.{other_extension.upper()}'):
+            if other_name != file_name and os.path.isfile(os.path.join(folder, other_name)):
+                return file_name
+    return stem
+
+
+# The format audio files are concatenated in: their format, or MIXED_EXTENSION if they are in different formats
+def concatenated_extension(audiofiles):
+    extensions = set(audio_extension(audiofile) for audiofile in audiofiles)
+    return extensions.pop() if len(extensions) == 1 else MIXED_EXTENSION
+
+
+# Find the audio files of a folder
+# Parameters:
+#   input_folder - the folder to search
+#   recursive - to also search the sub folders, at any depth
+#   extensions - the supported formats
+#   skipped_folders - sub folders that are not searched
+# Return:
+#   generator of the audio files, in the order of their names. The files of a
+#   folder come before the files of its sub folders.
+def discover_audiofiles(input_folder, recursive=True, extensions=SUPPORTED_EXTENSIONS, skipped_folders=()):
+    skipped = skipped_folder_set(skipped_folders)
+    folders = [input_folder]
+    while folders:
+        folder = folders.pop()
+        try:
+            with os.scandir(folder) as entries:
+                entries = sorted((entry for entry in entries if not entry.name.startswith('.')), key=lambda entry: entry.name)
+        except OSError as error:
+            print(f'Warning: {folder} could not be read: {error}')
+            continue
+        sub_folders = []
+        for entry in entries:
+            if entry.is_dir():
+                # links to folders are not followed, so a link cannot make a loop
+                if recursive and not entry.is_symlink() and os.path.realpath(entry.path) not in skipped:
+                    sub_folders.append(entry.path)
+            elif audio_extension(entry.name) in extensions and entry.is_file():
+                yield entry.path
+        # the first sub folder is searched next
+        folders.extend(reversed(sub_folders))
+
+
+# The folders that are never searched, like the output folder when it is in the input folder
+# Return:
+#   set of the real paths of the folders
+def skipped_folder_set(folders):
+    return {os.path.realpath(folder) for folder in folders}
+
+
+# The sub folder of the input folder an audio file is in
+# Return:
+#   the folder relative to the input folder, '' for the input folder itself
+def relative_folder(audiofile, input_folder):
+    folder = os.path.relpath(os.path.dirname(audiofile), input_folder)
+    return '' if folder == os.curdir else folder
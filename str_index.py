@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2023, Margaret Broeren, Yuzhe Gu, Mark Pitt
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+"""
+# Inverted index of the transcriptions of an output folder
+#
+# Every word of every transcription is kept in an sqlite database with the
+# audio file, speaker, position in the transcription, start time and
+# confidence it was transcribed with, indexed by word and confidence. Finding
+# every place a word was transcribed with a low confidence then takes
+# milliseconds, even over 100k transcriptions.
+#
+# When it is enabled in the [index] section of the config file, every
+# transcription is added to the index as soon as it is saved. The csv files
+# of an output folder can also be added on their own: only files that are
+# new or changed since they were indexed are read. Start times are only
+# known for transcriptions indexed while they were saved.
+#   python str_index.py --build
+#   python str_index.py doctor --max-confidence 0.6 --limit 20
+
+import argparse
+import configparser
+import csv
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS transcriptions (id INTEGER PRIMARY KEY, output TEXT UNIQUE NOT NULL, indexed_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS audiofiles (id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS vocabulary (id INTEGER PRIMARY KEY, word TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS occurrences (word_id INTEGER NOT NULL, transcription_id INTEGER NOT NULL, audiofile_id INTEGER NOT NULL,
+                                        speaker INTEGER, position INTEGER NOT NULL, start REAL, confidence REAL);
+CREATE INDEX IF NOT EXISTS occurrences_by_word ON occurrences (word_id, confidence);
+CREATE INDEX IF NOT EXISTS occurrences_by_transcription ON occurrences (transcription_id);
+'''
+
+# rows inserted at a time when csv files are indexed
+_BATCH_ROWS = 50000
+
+
+# The file of the index from the [index] section of the config file
+# Parameters:
+#   config - the config file reader
+# Return:
+#   the index file. By default it is in the output folder.
+def index_file(config):
+    return config.get('index', 'file', fallback='') or os.path.join(config['folders']['output_folder'], 'transcript_index.sqlite')
+
+
+# Open the index if it is enabled in the config file
+# Return:
+#   the TranscriptIndex, or None when the index is disabled
+def open_index(config):
+    if not config.getboolean('index', 'enabled', fallback=False):
+        return None
+    return TranscriptIndex(index_file(config))
+
+
+class TranscriptIndex:
+
+    # Parameters:
+    #   path - the sqlite file of the index. It is created if needed.
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        # a transcription is committed in several steps. With a write-ahead log they do not wait for the disk.
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(_SCHEMA)
+        # word: id and audio file: id, so they are looked up once
+        self._word_ids = dict(self._connection.execute('SELECT word, id FROM vocabulary'))
+        self._audiofile_ids = dict(self._connection.execute('SELECT path, id FROM audiofiles'))
+
+    def _id(self, table, column, ids, value):
+        if value not in ids:
+            ids[value] = self._connection.execute(f'INSERT INTO {table} ({column}) VALUES (?)', (value,)).lastrowid
+        return ids[value]
+
+    # Start (again) the transcription saved in output files. Its earlier words are removed.
+    # Parameters:
+    #   output - the output files without extension, the name the transcription is indexed under
+    # Return:
+    #   the id of the transcription, for add_words
+    def start_transcription(self, output):
+        with self._lock, self._connection:
+            row = self._connection.execute('SELECT id FROM transcriptions WHERE output = ?', (output,)).fetchone()
+            if row is None:
+                # indexed_at is set when every word is added, an unfinished transcription is indexed again
+                return self._connection.execute('INSERT INTO transcriptions (output, indexed_at) VALUES (?, 0)', (output,)).lastrowid
+            self._connection.execute('DELETE FROM occurrences WHERE transcription_id = ?', (row[0],))
+            self._connection.execute('UPDATE transcriptions SET indexed_at = 0 WHERE id = ?', (row[0],))
+            return row[0]
+
+    # Add words of a transcription
+    # Parameters:
+    #   transcription_id - from start_transcription
+    #   words - iterable of (word, audio file, speaker or None, position, start time or None, confidence)
+    def add_words(self, transcription_id, words):
+        with self._lock, self._connection:
+            word_ids = self._word_ids
+            audiofile_ids = self._audiofile_ids
+            self._connection.executemany(
+                'INSERT INTO occurrences VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(word_ids.get(word) or self._id('vocabulary', 'word', word_ids, word), transcription_id,
+                  audiofile_ids.get(audiofile) or self._id('audiofiles', 'path', audiofile_ids, audiofile),
+                  speaker, position, start, confidence)
+                 for word, audiofile, speaker, position, start, confidence in words])
+
+    # Mark a transcription as completely indexed
+    def finish_transcription(self, transcription_id):
+        with self._lock, self._connection:
+            self._connection.execute('UPDATE transcriptions SET indexed_at = ? WHERE id = ?', (time.time(), transcription_id))
+
+    # Add the csv files of an output folder and its sub folders that are new or changed since they were indexed
+    # Parameters:
+    #   folder - the output folder
+    # Return:
+    #   number of csv files added
+    def add_csv_folder(self, folder):
+        with self._lock:
+            indexed = dict(self._connection.execute('SELECT output, indexed_at FROM transcriptions'))
+        added = 0
+        for sub_folder, _, files in os.walk(folder):
+            for name in files:
+                path = os.path.join(sub_folder, name)
+                if not name.endswith('.csv') or os.path.getmtime(path) < indexed.get(path[:-len('.csv')], 0):
+                    continue
+                self.add_csv_file(path)
+                added += 1
+        return added
+
+    # Add a csv file saved by save_transcription
+    def add_csv_file(self, csv_filename):
+        transcription_id = self.start_transcription(csv_filename[:-len('.csv')])
+        with open(csv_filename, newline='', encoding='utf-8-sig') as f:
+            reader = csv.reader(f)
+            columns = next(reader, None)
+            if columns is None or columns[:3] != ['filename', 'transcription', 'confidence']:
+                # not a word by word file of STR
+                self.finish_transcription(transcription_id)
+                return
+            has_speakers = 'speaker' in columns
+            batch = []
+            for position, row in enumerate(reader):
+                # punctuation has no confidence
+                if row[2] == '/':
+                    continue
+                batch.append((row[1], row[0], int(row[3]) if has_speakers else None, position, None, float(row[2])))
+                if len(batch) >= _BATCH_ROWS:
+                    self.add_words(transcription_id, batch)
+                    batch = []
+            self.add_words(transcription_id, batch)
+        self.finish_transcription(transcription_id)
+
+    # Find where a word was transcribed
+    # Parameters:
+    #   word - the word, in lower case as in the outputs
+    #   max_confidence - only the places transcribed with a lower confidence. None for all of them.
+    #   limit - the number of places returned, None for all of them
+    # Return:
+    #   list of dicts with the audio file, output, speaker, position, start time and confidence, lowest confidence first
+    def query(self, word, max_confidence=None, limit=None):
+        sql = ('SELECT audiofiles.path, transcriptions.output, speaker, position, start, confidence FROM occurrences'
+               ' JOIN audiofiles ON audiofiles.id = audiofile_id JOIN transcriptions ON transcriptions.id = transcription_id'
+               ' WHERE word_id = ?')
+        with self._lock:
+            word_id = self._word_ids.get(word.lower())
+            if word_id is None:
+                return []
+            parameters = [word_id]
+            if max_confidence != None:
+                sql += ' AND confidence < ?'
+                parameters.append(max_confidence)
+            sql += ' ORDER BY confidence'
+            if limit != None:
+                sql += ' LIMIT ?'
+                parameters.append(limit)
+            rows = self._connection.execute(sql, parameters).fetchall()
+        return [dict(zip(('audiofile', 'output', 'speaker', 'position', 'start', 'confidence'), row)) for row in rows]
+
+    # Number of transcriptions, distinct words and words in the index
+    def stats(self):
+        with self._lock:
+            count = lambda table: self._connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            return {'transcriptions': count('transcriptions'), 'vocabulary': count('vocabulary'), 'words': count('occurrences')}
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+# Writer of str_render.py that adds the words of a transcription to the index while it is saved
+class IndexWriter:
+
+    # Parameters:
+    #   index - the TranscriptIndex. It is shared by the writers of the run and not closed.
+    #   output - the output files of the transcription without extension, the name it is indexed under
+    #   first_speaker - number of the first speaker, as in the csv file. Rev AI numbers them from 0, CHAT from 1.
+    def __init__(self, index, output, first_speaker=0):
+        self.index = index
+        self.output = output
+        self.first_speaker = first_speaker
+        self._transcription_id = None
+        # position of the first word of the chunk in the whole transcription, which can come in pieces
+        self._position = 0
+
+    def begin(self, transcript):
+        self._transcription_id = self.index.start_transcription(self.output)
+
+    def write_chunk(self, chunk):
+        transcript = chunk.transcript
+        filenames = transcript.filenames
+        file_ids = transcript.file_ids
+        speakers = chunk.speakers
+        words = []
+        for i, word in enumerate(chunk.words):
+            confidence = transcript.confidences[chunk.start + i]
+            # punctuation has no confidence
+            if confidence != confidence:
+                continue
+            start = transcript.starts[chunk.start + i]
+            words.append((word, filenames[file_ids[chunk.start + i]], speakers[i] + self.first_speaker if speakers != None else None,
+                          self._position + i, None if start != start else start, confidence))
+        self.index.add_words(self._transcription_id, words)
+        self._position += len(chunk.words)
+
+    def close(self):
+        if self._transcription_id != None:
+            self.index.finish_transcription(self._transcription_id)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Find where a word was transcribed, or build the index of the transcriptions')
+    parser.add_argument('word', nargs='?', help='the word to find')
+    parser.add_argument('--max-confidence', type=float, help='only places transcribed with a lower confidence')
+    parser.add_argument('--limit', type=int, help='number of places shown')
+    parser.add_argument('--build', action='store_true', help='add the new and changed csv files of the output folder')
+    parser.add_argument('--folder', help='output folder to index. Default: output_folder of the config file')
+    parser.add_argument('--index', help='index file. Default: from the config file')
+    args = parser.parse_args()
+
+    config = configparser.ConfigParser()
+    config.read('transcription_config.ini')
+    transcript_index = TranscriptIndex(args.index or index_file(config))
+
+    if args.build:
+        start = time.perf_counter()
+        added = transcript_index.add_csv_folder(args.folder or config['folders']['output_folder'])
+        stats = transcript_index.stats()
+        print(f'{added} csv files indexed in {time.perf_counter() - start:.1f}s. '
+              f'{stats["transcriptions"]} transcriptions, {stats["words"]} words, {stats["vocabulary"]} distinct words in {transcript_index.path}')
+    if args.word:
+        start = time.perf_counter()
+        places = transcript_index.query(args.word, args.max_confidence, args.limit)
+        elapsed = time.perf_counter() - start
+        writer = csv.writer(sys.stdout, delimiter='\t', lineterminator='\n')
+        writer.writerow(['audiofile', 'output', 'speaker', 'position', 'start', 'confidence'])
+        for place in places:
+            writer.writerow(place.values())
+        print(f'{len(places)} places found in {1000 * elapsed:.1f} ms', file=sys.stderr)
+    if not args.build and not args.word:
+        parser.print_help()
+    transcript_index.close()
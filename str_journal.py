@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2023, Margaret Broeren, Yuzhe Gu, Mark Pitt
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+"""
+# Append-only journal of a transcription run
+#
+# Every state change of every audio file (prepared, submitted with its job
+# id, transcribed, rendered, failed) is appended to a json lines file and
+# flushed to disk before the run goes on. If the run is interrupted, the next
+# run with the same settings reads the journal back: rendered files are
+# skipped and submitted jobs are waited on again instead of being uploaded
+# again. The journal is removed once every file of the run is rendered.
+
+import datetime
+import json
+import os
+import threading
+
+# states of a file, in the order they are reached
+PREPARED = 'prepared'
+SUBMITTED = 'submitted'
+TRANSCRIBED = 'transcribed'
+RENDERED = 'rendered'
+FAILED = 'failed'
+
+
+# The size and modification time of a file, to tell a file from a new one with the same name
+# Return:
+#   [size, modification time in ns], or None if the file cannot be read
+def file_identity(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class RunJournal:
+
+    # Open the journal of a run, resuming it if it was left by an interrupted run with the same settings
+    # Parameters:
+    #   path - the journal file
+    #   settings - json-compatible dict of the settings of the run. A journal
+    #              written with other settings is not resumed but started over.
+    def __init__(self, path, settings):
+        self.path = path
+        self.resumed = False
+        self._lock = threading.Lock()
+
+        # file: latest known details of the file (state, job id, ...)
+        self._files = {}
+
+        settings = json.loads(json.dumps(settings))
+        if os.path.exists(path):
+            records = self._read(path)
+            if records and records[0].get('settings') == settings:
+                self.resumed = True
+                for record in records[1:]:
+                    self._update(record)
+
+        self._journal_file = open(path, 'a' if self.resumed else 'w', encoding='utf-8')
+        if self.resumed and not self._ends_with_newline(path):
+            # the last record was cut off by a crash, the next one starts on a new line
+            self._journal_file.write('\n')
+        if not self.resumed:
+            self._write({'settings': settings, 'started': datetime.datetime.now().isoformat()})
+
+    # Read every complete record. A record cut off by a crash is ignored.
+    @staticmethod
+    def _read(path):
+        records = []
+        with open(path, encoding='utf-8') as journal_file:
+            for line in journal_file:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+        return records
+
+    @staticmethod
+    def _ends_with_newline(path):
+        with open(path, 'rb') as journal_file:
+            journal_file.seek(0, os.SEEK_END)
+            if journal_file.tell() == 0:
+                return True
+            journal_file.seek(-1, os.SEEK_END)
+            return journal_file.read(1) == b'\n'
+
+    def _write(self, record):
+        self._journal_file.write(json.dumps(record) + '\n')
+        self._journal_file.flush()
+        os.fsync(self._journal_file.fileno())
+
+    # Record a new state of a file
+    # Parameters:
+    #   source - the audio file in the input folder
+    #   state - PREPARED, SUBMITTED, TRANSCRIBED, RENDERED or FAILED
+    #   details - anything needed to resume from this state, e.g. job_id=...
+    def record(self, source, state, **details):
+        record = dict(details, file=source, state=state)
+        with self._lock:
+            self._write(record)
+            self._update(record)
+
+    # Keep the latest details of the file of a record. The details of an earlier file with the same name are dropped.
+    def _update(self, record):
+        details = self._files.get(record['file'])
+        if details == None or details.get('identity') != record.get('identity'):
+            self._files[record['file']] = details = {}
+        details.update(record)
+
+    # The latest known details of a file in the resumed run, or None
+    # Parameters:
+    #   source - the audio file in the input folder
+    #   identity - the file_identity of the file now, or None. The details of a
+    #              file with another identity, e.g. replaced by a new recording, are not given.
+    def state(self, source, identity=None):
+        with self._lock:
+            details = self._files.get(source)
+            if not details or (identity != None and details.get('identity') != identity):
+                return None
+            return dict(details)
+
+    # Close the journal. It is removed when the run is complete, so the next run starts over.
+    def close(self, complete):
+        self._journal_file.close()
+        if complete:
+            os.remove(self.path)
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2023, Margaret Broeren, Yuzhe Gu, Mark Pitt
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+"""
+# Log of the messages printed by a transcription run, as shown by the GUI
+#
+# The GUI replaces sys.stdout with a LogSink. Printing only appends the text to
+# the sink, from any thread. The GUI takes the new lines on a timer and adds
+# them to its log window in one go. Only the last max_lines lines are kept in
+# memory and in the window, while every line is written to the log file.
+
+import collections
+import datetime
+import threading
+
+# characters of text without a line break after which the text is shown as a line, so it cannot grow without end
+MAX_LINE_LENGTH = 4096
+
+
+# Read the log settings from the [log] section of the config file
+# Parameters:
+#   config - the config file reader
+# Return:
+#   dict of keyword arguments for LogSink
+def log_settings(config):
+    return {'path': config.get('log', 'file', fallback='str_log.txt') or None,
+            'max_lines': max(1, config.getint('log', 'max_lines', fallback=2000))}
+
+
+class LogSink:
+
+    # Parameters:
+    #   path - file every printed line is appended to, or None for no log file
+    #   max_lines - number of lines kept for the log window. Older lines are dropped.
+    def __init__(self, path=None, max_lines=2000):
+        self.path = path
+        self.max_lines = max_lines
+        self._lock = threading.Lock()
+        # complete lines that are not taken by the GUI yet
+        self._lines = collections.deque(maxlen=max_lines)
+        # text after the last line break, e.g. the text of a print() before its end of line
+        self._partial = ''
+        # the log file does not end with a line break
+        self._open_line = False
+        self._log_file = None
+        if path != None:
+            self._log_file = open(path, 'a', encoding='utf-8')
+            self._log_file.write(f'\n===== {datetime.datetime.now().isoformat(timespec="seconds")} =====\n')
+
+    # Append printed text. Called by print() on any thread.
+    def write(self, text):
+        with self._lock:
+            if self._log_file != None and text:
+                self._log_file.write(text)
+                self._open_line = not text.endswith('\n')
+            lines = (self._partial + text).split('\n')
+            self._partial = lines.pop()
+            if len(self._partial) >= MAX_LINE_LENGTH:
+                lines.append(self._partial)
+                self._partial = ''
+            # the oldest lines fall off the deque if the GUI does not keep up
+            self._lines.extend(lines)
+        return len(text)
+
+    # Write the log file to disk. The GUI calls it on its timer, print() calls it with flush=True.
+    def flush(self):
+        with self._lock:
+            if self._log_file != None:
+                self._log_file.flush()
+
+    # Take the lines printed since the last call
+    # Return:
+    #   list of the new complete lines, at most max_lines
+    def take(self):
+        with self._lock:
+            lines = list(self._lines)
+            self._lines.clear()
+        return lines
+
+    def close(self):
+        with self._lock:
+            if self._log_file != None:
+                if self._open_line:
+                    self._log_file.write('\n')
+                self._log_file.close()
+                self._log_file = None
+
+    # sys.stdout is expected to have these
+    def isatty(self):
+        return False
+
+    @property
+    def encoding(self):
+        return 'utf-8'
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2023, Margaret Broeren, Yuzhe Gu, Mark Pitt
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+"""
+# Timing of the stages of a transcription run
+#
+# Every stage of every audio file (decode, upload, queue at Rev AI, download,
+# render) is timed and written to a json lines file, with the bytes it moved.
+# At the end of the run a summary record is added with the count, total and
+# p50/p95/p99 seconds of every stage and the number of API calls of every kind.
+# The summary can also be written as a Prometheus text file, e.g. for the
+# textfile collector of the node exporter.
+#
+# Show the summary of the metrics file of an earlier run:
+#   python str_metrics.py output/metrics_10182026_101500.jsonl
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import threading
+import time
+
+
+# Read the metrics settings from the [metrics] section of the config file
+# Parameters:
+#   config - the config file reader
+# Return:
+#   dict of keyword arguments for RunMetrics, except the path
+def metrics_settings(config):
+    return {'prometheus_file': config.get('metrics', 'prometheus_file', fallback='') or None}
+
+
+# Start the metrics of a run if they are enabled in the config file
+# Parameters:
+#   config - the config file reader
+#   output_folder - folder the metrics file is written to
+#   name - file name of the metrics file, without extension
+# Return:
+#   the RunMetrics, or None when the metrics are disabled
+def open_metrics(config, output_folder, name):
+    if not config.getboolean('metrics', 'enabled', fallback=False):
+        return None
+    return RunMetrics(os.path.join(output_folder, name + '.jsonl'), **metrics_settings(config))
+
+
+# The value below which a fraction of the values are, by the nearest rank
+# Parameters:
+#   values - sorted list of numbers
+#   fraction - e.g. 0.95 for the 95th percentile
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+# Summarize the stage records of a run
+# Parameters:
+#   records - iterable of stage records, dicts with 'stage', 'seconds', 'bytes' and 'failed'
+# Return:
+#   dict of stage name: dict of count, failed, total, p50, p95, p99 and max seconds, bytes moved
+def summarize(records):
+    stages = {}
+    for record in records:
+        stage = stages.setdefault(record['stage'], {'seconds': [], 'failed': 0, 'bytes': 0})
+        stage['seconds'].append(record['seconds'])
+        stage['failed'] += 1 if record.get('failed') else 0
+        stage['bytes'] += record.get('bytes', 0)
+    summary = {}
+    for stage_name, stage in stages.items():
+        seconds = sorted(stage['seconds'])
+        summary[stage_name] = {'count': len(seconds),
+                               'failed': stage['failed'],
+                               'total_seconds': round(sum(seconds), 6),
+                               'p50': round(percentile(seconds, 0.50), 6),
+                               'p95': round(percentile(seconds, 0.95), 6),
+                               'p99': round(percentile(seconds, 0.99), 6),
+                               'max': round(seconds[-1], 6),
+                               'bytes': stage['bytes']}
+    return summary
+
+
+# Format a summary as a table to print
+def summary_table(summary):
+    lines = [f'{"stage":<10}{"count":>7}{"failed":>7}{"total s":>10}{"p50 s":>9}{"p95 s":>9}{"p99 s":>9}{"MB":>9}']
+    for stage_name, stage in summary.items():
+        lines.append(f'{stage_name:<10}{stage["count"]:>7}{stage["failed"]:>7}{stage["total_seconds"]:>10.1f}'
+                     f'{stage["p50"]:>9.2f}{stage["p95"]:>9.2f}{stage["p99"]:>9.2f}{stage["bytes"] / (1024 * 1024):>9.1f}')
+    return '\n'.join(lines)
+
+
+# Format a summary in the Prometheus text format
+# Parameters:
+#   summary - the summary of summarize()
+#   api_calls - dict of API call kind: count
+#   run_seconds - wall time of the run
+def prometheus_text(summary, api_calls, run_seconds):
+    lines = ['# HELP str_stage_seconds Seconds one audio file spent in a stage of the transcription.',
+             '# TYPE str_stage_seconds summary']
+    for stage_name, stage in summary.items():
+        for quantile in ('p50', 'p95', 'p99'):
+            lines.append(f'str_stage_seconds{{stage="{stage_name}",quantile="0.{quantile[1:]}"}} {stage[quantile]}')
+        lines.append(f'str_stage_seconds_sum{{stage="{stage_name}"}} {stage["total_seconds"]}')
+        lines.append(f'str_stage_seconds_count{{stage="{stage_name}"}} {stage["count"]}')
+    lines += ['# HELP str_stage_failures_total Audio files that failed in a stage.',
+              '# TYPE str_stage_failures_total counter']
+    lines += [f'str_stage_failures_total{{stage="{stage_name}"}} {stage["failed"]}' for stage_name, stage in summary.items()]
+    lines += ['# HELP str_stage_bytes_total Bytes read, uploaded or downloaded in a stage.',
+              '# TYPE str_stage_bytes_total counter']
+    lines += [f'str_stage_bytes_total{{stage="{stage_name}"}} {stage["bytes"]}' for stage_name, stage in summary.items()]
+    lines += ['# HELP str_api_calls_total Calls to the Rev AI API.',
+              '# TYPE str_api_calls_total counter']
+    lines += [f'str_api_calls_total{{call="{call}"}} {count}' for call, count in sorted(api_calls.items())]
+    lines += ['# HELP str_run_seconds Wall time of the transcription run.',
+              '# TYPE str_run_seconds gauge',
+              f'str_run_seconds {round(run_seconds, 3)}']
+    return '\n'.join(lines) + '\n'
+
+
+class RunMetrics:
+
+    # Parameters:
+    #   path - the json lines file the records are written to
+    #   prometheus_file - file the summary is written to in the Prometheus text format, or None
+    def __init__(self, path, prometheus_file=None):
+        self.path = path
+        self.prometheus_file = prometheus_file
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._records = []
+        self._metrics_file = open(path, 'w', encoding='utf-8')
+
+    # Time a stage of an audio file
+    #   with metrics.measure(audiofile, 'upload') as record:
+    #       ...
+    #       record['bytes'] = bytes uploaded
+    # A stage that raises an exception is recorded as failed.
+    @contextlib.contextmanager
+    def measure(self, source, stage_name):
+        record = {'file': source, 'stage': stage_name, 'started': round(time.time(), 3), 'bytes': 0}
+        start = time.perf_counter()
+        try:
+            yield record
+        except BaseException:
+            record['failed'] = True
+            raise
+        finally:
+            record['seconds'] = round(time.perf_counter() - start, 6)
+            self.add(record)
+
+    # Add a stage record
+    def add(self, record):
+        with self._lock:
+            self._records.append({'stage': record['stage'], 'seconds': record['seconds'],
+                                  'bytes': record.get('bytes', 0), 'failed': record.get('failed', False)})
+            self._metrics_file.write(json.dumps(record) + '\n')
+            # flushed, so the records of an interrupted run can still be summarized
+            self._metrics_file.flush()
+
+    # Write the summary of the run and close the metrics file
+    # Parameters:
+    #   api_calls - dict of API call kind: count, e.g. RevAiClient.api_calls
+    # Return:
+    #   the summary, see summarize()
+    def close(self, api_calls=None):
+        run_seconds = time.monotonic() - self.started
+        api_calls = dict(api_calls or {})
+        with self._lock:
+            summary = summarize(self._records)
+            self._metrics_file.write(json.dumps({'summary': summary, 'api_calls': api_calls, 'run_seconds': round(run_seconds, 3)}) + '\n')
+            self._metrics_file.close()
+        if self.prometheus_file != None:
+            # replaced in one go, so a collector never reads half a file
+            temp_path = self.prometheus_file + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(prometheus_text(summary, api_calls, run_seconds))
+            os.replace(temp_path, self.prometheus_file)
+        return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Show the time spent in each stage of a transcription run')
+    parser.add_argument('metrics_file', help='metrics json lines file written by a run')
+    args = parser.parse_args()
+
+    stage_records = []
+    run_summary = None
+    with open(args.metrics_file, encoding='utf-8') as metrics_file:
+        for line in metrics_file:
+            record = json.loads(line)
+            if 'summary' in record:
+                run_summary = record
+            else:
+                stage_records.append(record)
+
+    # the summary is made again from the records, the run may have been interrupted before it was written
+    print(summary_table(summarize(stage_records)))
+    if run_summary != None:
+        print(f'\nRun time {run_summary["run_seconds"]:.1f}s, API calls: '
+              + ', '.join(f'{call} {count}' for call, count in sorted(run_summary['api_calls'].items())))
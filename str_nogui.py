@@ -26,16 +26,32 @@ SOFTWARE.
 # import required packages
 
 import os
-import csv
+import contextlib
 import datetime
 import time
 import shutil
-import re
 import sys
-from pydub import AudioSegment, utils
-from rev_ai import apiclient
+from str_upload import RevAiClient, open_scratch
+from str_pipeline import run_pipeline, pipeline_workers
+from str_poller import JobPoller, CallbackReceiver, poller_settings, callback_settings
+from str_cache import open_cache
+from str_audio import concatenate_streaming, offset_index, split_transcript, pack_groups, prepare_audiofile
+from str_decode import DecodePool, open_decoder
+from str_probe import open_probe
+from str_discover import discover_audiofiles, audio_extension, audio_stem, concatenated_extension, relative_folder, SUPPORTED_EXTENSIONS
+from str_profile import submission_profile, profile_codecs
+from str_vad import trim_settings, restore_events, trim_available
+from str_stream import transcript_events, write_transcript, file_chunks
+from str_transcript import Transcript
+from str_render import render_pieces, output_writers
+from str_bulk import open_bulk_output, bulk_available, BulkWriter, BULK_FORMATS
+from str_index import open_index, IndexWriter
+from str_metrics import open_metrics, summary_table
+from str_rerender import open_raw_transcripts
+from str_watch import FolderWatcher, watch_settings, stop_on_signals
+from str_journal import RunJournal, file_identity, PREPARED, SUBMITTED, TRANSCRIBED, RENDERED, FAILED
 import configparser
-import string
+import argparse
 
 # create config file reader
 config = configparser.ConfigParser()
@@ -49,6 +65,16 @@ config_entries = {'API.token':['token', 'save_check'],
                   'transcribe.config':['diarization', 'punctuation', 'remove_disfluencies', 'speaker_channels_count', 'language']
                  }
 
+# Create the Rev AI API client
+# api_url in the [API.token] section can point the client to another deployment
+# of the Rev AI API, e.g. a local stand-in server used for testing.
+#Parameters:
+#config - the reader config file
+#return:
+#the Rev AI API client
+def make_client(config):
+    return RevAiClient(config['API.token']['token'], config.get('API.token', 'api_url', fallback='') or None)
+
 # Check if all config.ini values are available and valid
 #Parameters:
 #config - the reader config file
@@ -73,7 +99,7 @@ def config_check(config):
 
     # Simple way to check if the API token is valid
     # Error is generated if it fails to retrieve the last job.
-    client = apiclient.RevAiAPIClient(config['API.token']['token'])
+    client = make_client(config)
     try:
         jobs = client.get_list_of_jobs(limit=1)
     except Exception:
@@ -101,6 +127,10 @@ def config_check(config):
     if not os.path.exists(config['folders']['output_folder']):
         console_message += 'Error: Output folder does not exist, so we made it. It is named "output"\n'
         os.mkdir(config['folders']['output_folder'])
+
+    if config.has_option('folders', 'recursive') and config['folders']['recursive'] != "True" and config['folders']['recursive'] != "False":
+        console_message += 'Error: Folders recursive should be True or False.\n'
+        valid = False
     
     if config['output_format']['format'] != 'CHAT' and config['output_format']['format'] != 'unformatted':
         console_message += 'Error: output format should be CHAT or unformatted.\n'
@@ -113,6 +143,9 @@ def config_check(config):
     if config['concatenation']['csv_file'] != "True" and config['concatenation']['csv_file'] != "False":
         console_message += 'Error: Csv only should be True or False.\n'
         valid = False
+    if config.has_option('concatenation', 'split_by_file') and config['concatenation']['split_by_file'] != "True" and config['concatenation']['split_by_file'] != "False":
+        console_message += 'Error: Split by file should be True or False.\n'
+        valid = False
     if config['transcribe.config']['diarization'] != "True" and config['transcribe.config']['diarization'] != "False":
         console_message += 'Error: Diarization should be True or False.\n'
         valid = False
@@ -135,6 +168,148 @@ def config_check(config):
         console_message += 'Error: Speaker channels count should be either None or a positive number.\n'
         valid = False
 
+    # the worker counts of the transcription pipeline are optional, but must be positive integers when given
+    if config.has_section('pipeline'):
+        for item in config['pipeline']:
+            if item.endswith('_workers'):
+                workers_check = config['pipeline'][item]
+                if not workers_check.isnumeric() or int(workers_check) <= 0:
+                    console_message += f'Error: Pipeline {item} should be a positive integer.\n'
+                    valid = False
+
+    # the polling settings are optional, but must be positive numbers when given
+    if config.has_section('polling'):
+        for item in config['polling']:
+            try:
+                if float(config['polling'][item]) <= 0:
+                    raise ValueError
+            except ValueError:
+                console_message += f'Error: Polling {item} should be a positive number.\n'
+                valid = False
+
+    # the size limits of concatenated groups are optional, but must be positive numbers or 0 (no limit) when given
+    for item in ['max_group_seconds', 'max_group_mb']:
+        if config.has_option('concatenation', item):
+            try:
+                if float(config['concatenation'][item]) < 0:
+                    raise ValueError
+            except ValueError:
+                console_message += f'Error: Concatenation {item} should be a positive number or 0.\n'
+                valid = False
+
+    # the audio probe settings are optional
+    if config.has_option('probe', 'cache') and config['probe']['cache'] != "True" and config['probe']['cache'] != "False":
+        console_message += 'Error: Probe cache should be True or False.\n'
+        valid = False
+    if config.has_option('probe', 'workers') and (not config['probe']['workers'].isnumeric() or int(config['probe']['workers']) <= 0):
+        console_message += 'Error: Probe workers should be a positive integer.\n'
+        valid = False
+
+    # the bulk output is optional
+    if config.has_option('bulk_output', 'format'):
+        bulk_format = config['bulk_output']['format'].lower()
+        if bulk_format != 'none' and bulk_format not in BULK_FORMATS:
+            console_message += f"Error: Bulk output format should be none or one of {', '.join(BULK_FORMATS)}.\n"
+            valid = False
+        elif bulk_format != 'none' and not bulk_available(bulk_format):
+            console_message += f'Error: Bulk output in {bulk_format} format requires pyarrow (pip3 install pyarrow).\n'
+            valid = False
+
+    # the index of the transcriptions is optional
+    if config.has_option('index', 'enabled') and config['index']['enabled'] != "True" and config['index']['enabled'] != "False":
+        console_message += 'Error: Index enabled should be True or False.\n'
+        valid = False
+
+    # keeping the raw transcripts is optional
+    if config.has_option('raw_transcripts', 'keep') and config['raw_transcripts']['keep'] != "True" and config['raw_transcripts']['keep'] != "False":
+        console_message += 'Error: Raw transcripts keep should be True or False.\n'
+        valid = False
+
+    # the watch mode settings are optional
+    for item in ['poll_seconds', 'settle_seconds', 'rescan_seconds']:
+        if config.has_option('watch', item):
+            try:
+                if float(config['watch'][item]) <= 0:
+                    raise ValueError
+            except ValueError:
+                console_message += f'Error: Watch {item} should be a positive number.\n'
+                valid = False
+    if config.has_option('watch', 'method') and config['watch']['method'] not in ('auto', 'poll'):
+        console_message += 'Error: Watch method should be auto or poll.\n'
+        valid = False
+
+    # the number of decoding processes is optional, 0 is one per core
+    if config.has_option('decode', 'workers') and not config['decode']['workers'].isnumeric():
+        console_message += 'Error: Decode workers should be a positive integer or 0.\n'
+        valid = False
+
+    # the submission profile is optional
+    if config.has_option('profile', 'enabled') and config['profile']['enabled'] != "True" and config['profile']['enabled'] != "False":
+        console_message += 'Error: Profile enabled should be True or False.\n'
+        valid = False
+    if config.has_option('profile', 'codec') and config['profile']['codec'] not in profile_codecs():
+        console_message += f'Error: Profile codec should be one of {profile_codecs()}.\n'
+        valid = False
+    for item in ['sample_rate', 'channels']:
+        if config.has_option('profile', item) and (not config['profile'][item].isnumeric() or int(config['profile'][item]) <= 0):
+            console_message += f'Error: Profile {item} should be a positive integer.\n'
+            valid = False
+
+    # silence trimming is optional and needs numpy
+    if config.has_option('trim', 'enabled'):
+        if config['trim']['enabled'] != "True" and config['trim']['enabled'] != "False":
+            console_message += 'Error: Trim enabled should be True or False.\n'
+            valid = False
+        elif config['trim']['enabled'] == "True" and not trim_available():
+            console_message += 'Error: Trimming silence needs numpy. Install it with: pip3 install numpy\n'
+            valid = False
+    for item in ['threshold_db', 'frame_ms', 'padding_ms', 'max_pause_ms']:
+        if config.has_option('trim', item):
+            try:
+                value = float(config['trim'][item])
+                if (item == 'frame_ms' and value <= 0) or (item != 'threshold_db' and value < 0):
+                    raise ValueError
+            except ValueError:
+                console_message += f'Error: Trim {item} should be a positive number (threshold_db: a number of dBFS).\n'
+                valid = False
+
+    # the scratch area is optional
+    if config.has_option('scratch', 'enabled') and config['scratch']['enabled'] != "True" and config['scratch']['enabled'] != "False":
+        console_message += 'Error: Scratch enabled should be True or False.\n'
+        valid = False
+    if config.has_option('scratch', 'max_memory_mb'):
+        try:
+            if float(config['scratch']['max_memory_mb']) < 0:
+                raise ValueError
+        except ValueError:
+            console_message += 'Error: Scratch max_memory_mb should be a positive number or 0.\n'
+            valid = False
+
+    # the transcript cache is optional
+    if config.has_option('cache', 'enabled') and config['cache']['enabled'] != "True" and config['cache']['enabled'] != "False":
+        console_message += 'Error: Cache enabled should be True or False.\n'
+        valid = False
+
+    # the GUI log settings are optional
+    if config.has_option('log', 'max_lines') and (not config['log']['max_lines'].isnumeric() or int(config['log']['max_lines']) == 0):
+        console_message += 'Error: Log max_lines should be a positive integer.\n'
+        valid = False
+
+    # the run metrics are optional
+    if config.has_option('metrics', 'enabled') and config['metrics']['enabled'] != "True" and config['metrics']['enabled'] != "False":
+        console_message += 'Error: Metrics enabled should be True or False.\n'
+        valid = False
+
+    # the run journal is optional
+    if config.has_option('journal', 'enabled') and config['journal']['enabled'] != "True" and config['journal']['enabled'] != "False":
+        console_message += 'Error: Journal enabled should be True or False.\n'
+        valid = False
+
+    # the callback mode is optional
+    if config.has_option('callback', 'enabled') and config['callback']['enabled'] != "True" and config['callback']['enabled'] != "False":
+        console_message += 'Error: Callback enabled should be True or False.\n'
+        valid = False
+
     # try:
     #     # check the delete after seconds - it needs to be a positive integer or None
     #     delete_check = config['transcribe.config']['delete_after_seconds']
@@ -160,80 +335,130 @@ def config_check(config):
 #concatenate the audio files.
 #Parameters:
 #file_list - the file list that contains the audio files to be concatenated.
+#name - the name of the long temp audio file, without extension.
+#probe - the AudioProbe that reads the formats of the audio files.
+#profile - the submission profile the long temp audio file is converted to, or None to keep the format.
+#decoder - the DecodePool the audio files are decoded in when they cannot be copied.
 #return: [temp_audiofile] - the file name of the long temp audio file.
-def concatenate_audiofiles(temp_folder_name, afile_list, file_extension):
+#        [index] - the start and end time of every audio file in the long temp audio file.
+def concatenate_audiofiles(temp_folder_name, afile_list, file_extension, name='combinedaudiofiles', probe=None, profile=None, decoder=None):
 
     # temporary audio file used to hold concatenated files
-    temp_audiofile = "".join((temp_folder_name, 'combinedaudiofiles.', file_extension))
-    # initialize an audiosegment for concatenating audio files
-    concatenated_audio = AudioSegment.empty()
-
-    for audiofile in afile_list:
-        # Read the audiofile in the folder
-        if file_extension == 'ogg':
-            filecodec = utils.mediainfo(audiofile)['codec_name']
-            if filecodec == 'vorbis':
-                filecodec = ''.join(('lib',filecodec))
-            concatenated_audio += AudioSegment.from_file(audiofile, codec=filecodec)
-        else:
-            concatenated_audio += AudioSegment.from_file(audiofile)
+    temp_extension = profile['codec'] if profile != None else file_extension
+    temp_audiofile = "".join((temp_folder_name, name, '.', temp_extension))
 
-        # Add silence between audio files to minimize confusing segmentation
-        # This might not be a problem but it is a cheap safeguard
-        concatenated_audio += AudioSegment.silent(duration=100)
-
-    # Save concatenated sound files to a temporary file for use by rev.ai
-    if file_extension == 'ogg':
-        file_handle = concatenated_audio.export(temp_audiofile, format=file_extension, codec=filecodec)
-    else:
-        file_handle = concatenated_audio.export(temp_audiofile, format=file_extension)
-    file_handle.close()
-    return temp_audiofile
+    # The files are written to the temporary file one after the other, so memory
+    # use does not grow with the number of files. Silence is added after every file
+    # to minimize confusing segmentation. This might not be a problem but it is a cheap safeguard
+    # The transcript is split at the offsets of the files when split_by_file is True, so they must be exact.
+    exact_offsets = config.getboolean('concatenation', 'split_by_file', fallback=False)
+    durations = concatenate_streaming(temp_audiofile, afile_list, file_extension, separator_ms=100, probe=probe, profile=profile, decoder=decoder, exact_offsets=exact_offsets)
+    return temp_audiofile, offset_index(afile_list, durations, separator_ms=100)
 
 
-# Append silence to the end of audio files that are shorter than 2 seconds.
+# The name of the elongated version of an audio file
 #Parameters:
+#   t_folder - the temp folder the elongated file is saved in
 #   original_file_name - the original short audio file.
 #Return:
-#   elongated_file_name - the new long audio file.
-def elongate_audiofile(t_folder, original_file_name, added_duration, file_extension):
+#   the file name of the elongated audio file
+def elongated_name(t_folder, original_file_name, file_extension):
+    return temp_name(t_folder, original_file_name, '_long', file_extension)
 
-    #elongate if less than 2s long
-    stim = AudioSegment.empty()
-    if file_extension == 'ogg':
-        filecodec = utils.mediainfo(original_file_name)['codec_name']
-        if filecodec == 'vorbis':
-            filecodec = ''.join(('lib',filecodec))
-        stim += AudioSegment.from_file(original_file_name, codec=filecodec)
-    else:
-        stim += AudioSegment.from_file(original_file_name)
 
-    stim += AudioSegment.silent(duration = 1000 * added_duration)
+# The name of a file made from an audio file in the temp folder. It is in the
+# same sub folder of the temp folder as the audio file is in the input folder.
+#Parameters:
+#   original_file_name - the audio file in the input folder
+#   suffix - added to the name of the audio file
+#   file_extension - the format of the new file
+def temp_name(t_folder, original_file_name, suffix, file_extension):
+    base_file_name = audio_stem(original_file_name)
+    folder = os.path.join(t_folder, relative_folder(original_file_name, config['folders']['input_folder']))
+    return ''.join((os.path.join(folder, base_file_name), suffix, '.', file_extension))
 
-    # Assumes the input folder is only one level down. Otherwise rsplit will fail
-    base_file_name = original_file_name.rsplit('.')[0].split('/')[1]
-    elongated_file_name = ''.join((t_folder, base_file_name, '_long', '.', file_extension))
 
-    if file_extension == 'ogg':
-        file_handle = stim.export(elongated_file_name, format=file_extension, codec=filecodec)
-    else:
-        file_handle = stim.export(elongated_file_name, format=file_extension)
+# The output file name of the transcription of an audio file. It is in the
+# same sub folder of the output folder as the audio file is in the input folder.
+#Parameters:
+#   source - the audio file in the input folder
+#   audiofile - the transcribed audio file, e.g. the elongated file. The output file is named after it.
+#Return:
+#   the output file name, with the .cha extension
+def output_file_name(output_folder, input_folder, source, audiofile, date_today):
+    folder = os.path.join(output_folder, relative_folder(source, input_folder))
+    os.makedirs(folder, exist_ok=True)
+    # files made in the temp folder are already named with audio_stem
+    base_file_name = audio_stem(source) if audiofile == source else os.path.splitext(os.path.basename(audiofile))[0]
+    return ''.join((os.path.join(folder, base_file_name), '_transcription_', date_today, '.cha'))
 
-    file_handle.close()
-    return elongated_file_name
 
+# Append silence to the end of audio files that are shorter than 2 seconds.
+#Parameters:
+#   original_file_name - the original short audio file.
+#   probe - the AudioProbe that reads the codec of ogg files.
+#   scratch - the ScratchArea that keeps the new long audio in memory, or None to save it in t_folder.
+#             Audio larger than the memory limit of the scratch area is saved in t_folder too.
+#   profile - the submission profile the audio is converted to, or None to keep the format.
+#             With a profile, audio files that are long enough are converted too (added_duration <= 0).
+#   trim - the settings of trim_silence, or None to keep the silence. The audio
+#          is elongated when it is shorter than 2 seconds after trimming.
+#   decoder - the DecodePool the audio is decoded and encoded in, or None to do it in this thread.
+#Return:
+#   elongated_file_name - the new long audio file.
+#   offset_map - the offset map of the trimmed audio, or None if it was not trimmed.
+def elongate_audiofile(t_folder, original_file_name, added_duration, file_extension, probe, scratch=None, profile=None, trim=None, decoder=None):
 
-# Transcribe speech file located in a folder
+    #elongate if less than 2s long
+    out_extension = profile['codec'] if profile != None else file_extension
+    out_files = (elongated_name(t_folder, original_file_name, out_extension),
+                 temp_name(t_folder, original_file_name, '', out_extension))
+    os.makedirs(os.path.dirname(out_files[0]), exist_ok=True)
+
+    # the audio is uploaded from the scratch area under the file name, without saving it
+    arguments = (original_file_name, added_duration, file_extension, probe.probe(original_file_name), out_files,
+                 scratch.max_memory if scratch != None else None, profile, trim)
+    decoder = decoder or DecodePool()
+    elongated_file_name, data, offset_map = decoder.run(prepare_audiofile, *arguments)
+    if data != None:
+        scratch.create(elongated_file_name).write(data)
+    elif scratch != None:
+        scratch.spill()
+    return elongated_file_name, offset_map
+
+
+# The submission settings that change the transcript. Used in the key of the transcript cache.
+# Return:
+#   dict of setting name: value actually sent to Rev AI
+def submission_parameters():
+    CHAT_mode = True if config['output_format']['format'] == 'CHAT' else False
+    english = config['transcribe.config']['language'] == 'en'
+    speaker_channels_count = None if config['transcribe.config']['speaker_channels_count'] == 'None' else int(config['transcribe.config']['speaker_channels_count'])
+    parameters = {'language': config['transcribe.config']['language'],
+                  'CHAT_mode': CHAT_mode,
+                  'skip_diarization': False if CHAT_mode else not config.getboolean('transcribe.config', 'diarization'),
+                  'skip_punctuation': (False if CHAT_mode else not config.getboolean('transcribe.config', 'punctuation')) if english else None,
+                  'remove_disfluencies': (False if CHAT_mode else config.getboolean('transcribe.config', 'remove_disfluencies')) if english else None,
+                  'speaker_channels_count': (None if CHAT_mode else speaker_channels_count) if english else None}
+    # audio converted to the submission profile may be transcribed differently
+    profile = submission_profile(config)
+    if profile != None:
+        parameters['profile'] = profile
+    trim = trim_settings(config)
+    if trim != None:
+        parameters['trim'] = trim
+    return parameters
+
+
+# Submit a speech file to Rev AI for transcription
 # Parameters:
-# audiofile - the file to be transcribed
-#
-def transcribe_speech(audiofile, client_api, message_label):
-    # Submit job for transcription
-    print(f'transcribing:{audiofile}')
-
-    # update the GUI if in GUI mode
-    if message_label != None:
-        message_label.update()
+#   audiofile - the file to be transcribed
+#   client_api - the Rev AI API client
+#   callback_url - url of the CallbackReceiver, or None
+#   media - buffer of the prepared audio in the ScratchArea, or None to read audiofile
+# Return:
+#   job - the submitted Rev AI job
+def submit_speech(audiofile, client_api, callback_url=None, media=None):
     CHAT_mode = True if config['output_format']['format'] == 'CHAT' else False
     # speaker channels count is a positive integer or None
     speaker_channels_count = None if config['transcribe.config']['speaker_channels_count'] == 'None' else int(config['transcribe.config']['speaker_channels_count'])
@@ -242,6 +467,8 @@ def transcribe_speech(audiofile, client_api, message_label):
     if config['transcribe.config']['language'] == 'en':
         job = client_api.submit_job_local_file(
             filename = audiofile,  # file name
+            media = media,  # prepared audio to upload instead of the file, or None
+            callback_url = callback_url,  # Rev AI notifies this url when the job is finished. None to only poll the job.
             skip_diarization = False if CHAT_mode else not config.getboolean('transcribe.config', 'diarization'),  # needed for conversations. Tries to match audio with speakers
             skip_punctuation = False if CHAT_mode else not config.getboolean('transcribe.config', 'punctuation'),  # removes punctuations
             remove_disfluencies = False if CHAT_mode else config.getboolean('transcribe.config', 'remove_disfluencies'),  # removes speech disfluencies ("uh", "um"). Only avalable for English, Spanish, French languages
@@ -257,6 +484,8 @@ def transcribe_speech(audiofile, client_api, message_label):
     else:
         job = client_api.submit_job_local_file(
             filename = audiofile,  # file name
+            media = media,  # prepared audio to upload instead of the file, or None
+            callback_url = callback_url,  # Rev AI notifies this url when the job is finished. None to only poll the job.
             skip_diarization = False if CHAT_mode else not config.getboolean('transcribe.config', 'diarization'),  # needed for conversations. Tries to match audio with speakers
             language = config['transcribe.config']['language'],  # language of the audio file(s)
             #delete_after_seconds = delete_after_seconds,  # Amount of time after job completion when job is auto-deleted. Default (after 30 days) is None.
@@ -266,186 +495,197 @@ def transcribe_speech(audiofile, client_api, message_label):
             #custom_vocabularies = []  # additional vocabulary
             )
 
+    return job
 
 
-    # Retrieve transcription job info
-    job_details = client_api.get_job_details(job.id)
-
+# Poll a submitted job until Rev AI has finished it and get its transcript
+# Parameters:
+#   job - the submitted Rev AI job
+#   client_api - the Rev AI API client
+#   poller - the JobPoller that tracks all outstanding jobs. If None, a poller is started for this job only.
+#   audio_duration - duration of the submitted audio in seconds, used to schedule the polls
+#   first_poll - seconds before the job is polled the first time, e.g. while waiting for a callback
+# Return:
+#   transcript_json - the transcript of the job
+def wait_for_transcript(job, client_api, poller=None, audio_duration=None, first_poll=None):
+    wait_for_job(job, client_api, poller, audio_duration, first_poll)
+    return client_api.get_transcript_json(job.id)
+
+
+# Poll a submitted job until Rev AI has finished it, or raise an exception if it failed
+# Parameters: see wait_for_transcript
+def wait_for_job(job, client_api, poller=None, audio_duration=None, first_poll=None):
     # Poll job progress until finished
     # To see all details: var(job_details) in console
-    while (job_details.status.name == 'IN_PROGRESS'):
-        time.sleep(20)
-        job_details = client_api.get_job_details(job.id)
+    if poller != None:
+        job_details = poller.wait(job, audio_duration, first_poll)
+    else:
+        job_poller = JobPoller(client_api, **poller_settings(config))
+        try:
+            job_details = job_poller.wait(job, audio_duration)
+        finally:
+            job_poller.close()
 
 
-    # Grab the transcript or raise an exception on failure
+    # Raise an exception on failure
     # See transcription history in your account at rev.ai for explanation
-    if job_details.status.name == 'TRANSCRIBED':
-        transcript_json = client_api.get_transcript_json(job.id)
-    elif job_details.status.name == 'FAILED':
+    if job_details.status.name == 'FAILED':
         failure_message = f'Transcription failed: {job_details.failure}\n{job_details.failure_detail}\n\n'
-        if message_label != None:
-            # update the GUI if in GUI mode
-            message_label.update()
         raise Exception(failure_message)
 
-    transcript = []
 
+# Save the transcript of a finished job to a file a block at a time, without loading it in memory
+# Parameters:
+#   job - the finished Rev AI job
+#   transcript_file - the json file the transcript is saved in
+#   offset_map - the offset map of trimmed audio, to move the timestamps back to the original audio. None if it was not trimmed.
+def download_transcript(job, client_api, transcript_file, offset_map=None):
+    response = client_api.get_transcript_json_as_stream(job.id)
+    try:
+        if offset_map == None:
+            # the json is saved as it is received, and parsed when it is rendered
+            with open(transcript_file, 'wb') as f:
+                for chunk in response.iter_content(64 * 1024):
+                    f.write(chunk)
+        else:
+            # the elements are parsed one at a time and written back with their timestamps moved
+            with open(transcript_file, 'w', encoding='utf-8') as f:
+                write_transcript(restore_events(transcript_events(response.iter_content(64 * 1024)), offset_map), f)
+    finally:
+        response.close()
 
-    # Assumes a single speaker, else multiple speakers when set to "None"
-    if speaker_channels_count != None:
-        for transcript_num in range(len(transcript_json["monologues"])):
-            for j, a in enumerate(transcript_json["monologues"][transcript_num]["elements"], start=0):
-                # remove white space
-                if a['type'] == 'punct' and a['value'] == ' ':
-                    continue
-                # output file name, transcribed word, and confidence level
-                transcript.append({'filename':audiofile,
-                            'transcription':a['value'].lower(),
-                            'confidence': a['confidence'] if a['type'] != 'punct' else '/' })
-    else:
-        for j in transcript_json["monologues"]:
-            # a = ''.join(("Speaker ", str(j['speaker']),":"))
-            # remove white space
-            for a in j['elements']:
-                if a['type'] == 'punct' and a['value'] == ' ':
-                    continue
-                # a = ' '.join((a,str(i['value'])))
-                # output file name, transcribed word, confidence level, and speaker information
-                transcript.append({'filename':audiofile,
-                               'transcription':a['value'].lower(),
-                               'confidence': a['confidence'] if a['type'] != 'punct' else '/',
-                               'speaker': str(j['speaker'])})
 
+# Convert a Rev AI transcript into the compact Transcript used by save_transcription
+# Parameters:
+#   transcript_json - the transcript returned by Rev AI
+#   audiofile - the transcribed file, stored with every word
+# Return:
+#   transcript - the Transcript of the words
+def parse_transcript(transcript_json, audiofile):
+    # Assumes a single speaker when the speaker channels count is set, else multiple speakers when set to "None"
+    has_speakers = config['transcribe.config']['speaker_channels_count'] == 'None'
+    return Transcript.from_json(transcript_json, audiofile, has_speakers)
+
+
+# Read a transcript json file a block at a time
+# Parameters:
+#   transcript_file - the json file of the transcript returned by Rev AI
+#   audiofile - the transcribed file, stored with every word
+# Return:
+#   generator of the Transcripts of the pieces of the transcript, for save_transcription
+def read_transcript(transcript_file, audiofile):
+    has_speakers = config['transcribe.config']['speaker_channels_count'] == 'None'
+    with open(transcript_file, 'rb') as f:
+        yield from Transcript.pieces_from_events(transcript_events(file_chunks(f)), audiofile, has_speakers)
+
+
+# Transcribe speech file located in a folder
+# Parameters:
+# audiofile - the file to be transcribed
+# transcript_cache - the TranscriptCache, or None to always submit the file
+# source_files - the files audiofile was made from, used for the cache key. Default: [audiofile]
+# Return:
+# transcript_json - the transcript returned by Rev AI
+def request_transcript(audiofile, client_api, message_label, transcript_cache=None, source_files=None):
+    # Return the earlier transcript if this audio was already transcribed with the same settings
+    if transcript_cache != None:
+        cache_key = transcript_cache.key(source_files or [audiofile], submission_parameters())
+        transcript_json = transcript_cache.get(cache_key)
+        if transcript_json != None:
+            print(f'transcribed earlier (cached):{audiofile}')
+            return transcript_json
 
+    # Submit job for transcription
+    print(f'transcribing:{audiofile}')
+
+    # update the GUI if in GUI mode
+    if message_label != None:
+        message_label.update()
+    job = submit_speech(audiofile, client_api)
+
+    try:
+        transcript_json = wait_for_transcript(job, client_api)
+    except Exception:
+        if message_label != None:
+            # update the GUI if in GUI mode
+            message_label.update()
+        raise
 
-    return transcript
+    if transcript_cache != None:
+        transcript_cache.put(cache_key, transcript_json)
+    return transcript_json
 
 
 #Save transcriptions to CSV file
 #Parameters:
-#   output_data - transcription data dict.
+#   output_data - the Transcript to save, or an iterable of the Transcripts of its pieces, as from read_transcript.
 #   output_file_name_def - the output file name.
 #   csv_file - to output a csv version or not.
-def save_transcription(output_data, output_file_name_def, csv_file, CHAT_output):
-    replace_dict = {
-        "dr.": "Doctor",
-        "dr": "Doctor",
-        "mr.": "Mister",
-        "mrs.": "Missus",
-        "mrs": "Missus",
-        "mss": "Missus",
-        "ms.": "Miss",
-        "ms": "Miss",
-        "<laugh>": "&=laughs",
-        "um": "&-um",
-        "uh": "&-uh",
-        "er": "&-er",
-        "eh": "&-eh"
-    }
-
-    header_text = (
-        "@Begin\n"
-        "@Languages:\n"
-        "@Participants:\n"
-        "@ID:\n"
-        "@ID:\n"
-        "@ID:\n"
-        "@Media:\n"
-        "@Location:\n"
-        "@Recording Quality:\n"
-        "@Transcriber:\n"
-        "@Date:\n"
-        "@Situation:"
-    )
-
-    # Ending text - same as CHAT file
-    footer_text = "\n@End"
-    
-    if csv_file:
-        if CHAT_output:
-            if 'speaker' in output_data[0]:
-                for m in range(len(output_data)):
-                    output_data[m]['speaker'] = str(int(output_data[m]['speaker']) + 1)
-        keys_list = output_data[0].keys()
-        csv_filename = output_file_name_def.rsplit('.')[0] + '.csv'
-        with open(csv_filename,'w', newline='', encoding = 'utf-8-sig') as outfile:
-            csv_writer = csv.DictWriter(outfile, keys_list)
-            csv_writer.writeheader()
-            csv_writer.writerows(output_data)        
-        
-    if CHAT_output:
-        text_filename = output_file_name_def
-        if 'speaker' not in output_data[0]: # not a conversation
-            with open(text_filename,'w', newline='') as outtextfile:
-                outtextfile.write(header_text)
-                for result_word in output_data:
-                    # no white space before a punctuation
-                    if result_word['transcription'] in string.punctuation:
-                        outtextfile.write(result_word['transcription'])
-                    else:
-                        if result_word['transcription'] in replace_dict:
-                            outtextfile.write(''.join((' ', replace_dict[result_word['transcription']])))
-                        else:
-                            outtextfile.write(''.join((' ', result_word['transcription'])))
-                outtextfile.write(footer_text)
-        else: # example use: conversation
-            current_speaker = -1
-            with open(text_filename,'w', newline='') as outtextfile:
-                outtextfile.write(header_text)
-                for result_word in output_data:
-                    # switch speaker
-                    if result_word['speaker'] != current_speaker:
-                        if csv_file:
-                            if result_word['transcription'] in replace_dict:
-                                outtextfile.write(''.join(('\nSP', str(int(result_word['speaker'])), ':\t', replace_dict[result_word['transcription']])))
-                            else:
-                                outtextfile.write(''.join(('\nSP', str(int(result_word['speaker'])), ':\t', result_word['transcription'])))
-                        else:
-                            if result_word['transcription'] in replace_dict:
-                                outtextfile.write(''.join(('\nSP', str(int(result_word['speaker']) + 1), ':\t', replace_dict[result_word['transcription']])))
-                            else:
-                                outtextfile.write(''.join(('\nSP', str(int(result_word['speaker']) + 1), ':\t', result_word['transcription'])))
-                        current_speaker = result_word['speaker']
-                    else:
-                        # no white space before a punctuation
-                        if result_word['transcription'] in string.punctuation:
-                            outtextfile.write(result_word['transcription'])
-                        else:
-                            if result_word['transcription'] in replace_dict:
-                                outtextfile.write(''.join((' ', replace_dict[result_word['transcription']])))
-                            else:
-                                outtextfile.write(''.join((' ', result_word['transcription'])))
-                outtextfile.write(footer_text)
+#   bulk_output - the bulk output dataset of the run the words are also appended to, or None.
+#   transcript_index - the TranscriptIndex the words are also added to, or None.
+def save_transcription(output_data, output_file_name_def, csv_file, CHAT_output, bulk_output=None, transcript_index=None):
+    # every requested format is written in one pass over the words
+    writers = output_writers(output_file_name_def, csv_file, CHAT_output)
+    if bulk_output != None:
+        writers.append(BulkWriter(bulk_output, first_speaker = 1 if CHAT_output else 0))
+    if transcript_index != None:
+        writers.append(IndexWriter(transcript_index, os.path.splitext(output_file_name_def)[0], first_speaker = 1 if CHAT_output else 0))
+    render_pieces([output_data] if isinstance(output_data, Transcript) else output_data, writers)
+
+
+# Report the upload size saved by the submission profile
+# Parameters:
+#   original_bytes - total size of the original audio files
+#   submitted_bytes - total size of the converted audio that was uploaded
+def report_upload_savings(original_bytes, submitted_bytes):
+    if original_bytes > 0:
+        saved = original_bytes - submitted_bytes
+        print(f'\nSubmission profile: uploaded {submitted_bytes / 1048576:.1f} MB instead of {original_bytes / 1048576:.1f} MB ({saved / 1048576:.1f} MB, {100 * saved / original_bytes:.0f}% saved)')
+
+
+# Start waiting on Rev AI jobs
+# One poller refreshes the status of all submitted jobs together. Optionally
+# Rev AI calls back when a job is finished, and only the jobs whose callback
+# did not arrive in time are polled.
+# Return:
+#   poller - the JobPoller
+#   callback_receiver - the CallbackReceiver, or None if the callback mode is disabled
+def start_job_watch(client_api):
+    poller = JobPoller(client_api, **poller_settings(config))
+    callback_receiver = None
+    if config.getboolean('callback', 'enabled', fallback=False):
+        callback_receiver = CallbackReceiver(poller, **callback_settings(config))
+    return poller, callback_receiver
+
+
+# Stop waiting on Rev AI jobs
+def stop_job_watch(poller, callback_receiver):
+    if callback_receiver != None:
+        callback_receiver.close()
+    poller.close()
+
+
+# Report the progress of the transcription pipeline
+# Parameters:
+#   event - a pipeline event, see run_pipeline in str_pipeline.py
+#   message_label: the GUI text element needed to be updated
+def report_progress(event, message_label):
+    if event['status'] == 'started' and event['stage'] == 'upload':
+        if event['task'].get('cached'):
+            print(f"transcribed earlier (cached):{event['task']['audiofile']}")
+        else:
+            print(f"transcribing:{event['task']['audiofile']}")
+    elif event['status'] == 'done' and event['stage'] == 'upload' and 'submitted_bytes' in event['task']:
+        task = event['task']
+        print(f"uploaded:{task['audiofile']} ({task['submitted_bytes'] / 1024:.0f} KB, {(task['original_bytes'] - task['submitted_bytes']) / 1024:.0f} KB saved)")
+    elif event['status'] == 'failed':
+        print(f"Error: {event['task']['source']} failed while in the {event['stage']} stage: {event['error']}")
+    else:
         return
 
-    text_filename = output_file_name_def.rsplit('.')[0] + '.txt'
-    if 'speaker' not in output_data[0]: # not a conversation
-        with open(text_filename,'w', newline='') as outtextfile:
-            for result_word in output_data:
-                # no white space before a punctuation
-                if result_word['transcription'] in string.punctuation:
-                    outtextfile.write(result_word['transcription'])
-                else:
-                    outtextfile.write(''.join((' ', result_word['transcription'])))
-    else: # example use: conversation
-        current_speaker = -1
-        with open(text_filename,'w', newline='') as outtextfile:
-            for result_word in output_data:
-                # switch speaker
-                if result_word['speaker'] != current_speaker:
-                    outtextfile.write(''.join(('\nspeaker ', result_word['speaker'], ': ', result_word['transcription'])))
-                    current_speaker = result_word['speaker']
-                else:
-                    # no white space before a punctuation
-                    if result_word['transcription'] in string.punctuation:
-                        outtextfile.write(result_word['transcription'])
-                    else:
-                        outtextfile.write(''.join((' ', result_word['transcription'])))
-
-
-
-
+    # update the GUI if in GUI mode
+    if message_label != None:
+        message_label.update()
 
 
 # Delete temp/ and its contents
@@ -460,13 +700,34 @@ def delete_temp_folder(folder):
 # Main
 # Parameter:
 # message_label: the GUI text element needed to be updated
-def main(message_label):
+# watch: keep running and transcribe every audio file added to the input folder, until Ctrl+C
+# on_progress: optional function given every pipeline event, e.g. to follow the run from another thread
+# cancel: optional threading.Event. Once it is set no more files are submitted, the jobs already submitted are finished.
+def main(message_label, watch=False, on_progress=None, cancel=None):
     global config
 
     config = configparser.ConfigParser()
     config.read('transcription_config.ini')
 
-    client_api = apiclient.RevAiAPIClient(config['API.token']['token'])
+    def cancel_requested():
+        return cancel != None and cancel.is_set()
+
+    # Once the run is cancelled, the files that are not submitted yet are skipped.
+    # They are transcribed by the next run.
+    def cancelled(task):
+        if cancel_requested() and 'job' not in task:
+            task['cancelled'] = True
+        return task.get('cancelled', False)
+
+    # Pipeline events are printed, and given to on_progress.
+    # Once the run is cancelled, the files that are skipped are not reported as being transcribed.
+    def report(event):
+        if not (cancel_requested() and event['status'] == 'started'):
+            report_progress(event, message_label)
+        if on_progress != None:
+            on_progress(event)
+
+    client_api = make_client(config)
     input_folder = ''.join((config['folders']['input_folder'], '/'))
     output_folder = ''.join((config['folders']['output_folder'], '/'))
     CHAT_mode = True if config['output_format']['format'] == 'CHAT' else False
@@ -476,62 +737,384 @@ def main(message_label):
     concatenate_input = config.getboolean('concatenation', 'concatenate_input')
     csv_file = config.getboolean('concatenation', 'csv_file')
 
+    # Transcripts of audio that was already transcribed with the same settings are taken from the cache
+    transcript_cache = open_cache(config)
+
     # Used as part of the transcription output filename
     date_time = datetime.datetime.now()
     date_today = date_time.strftime('%m%d%Y')
 
-    supported_extensions = ['mp3', 'wav', 'ogg', 'opus', 'flac', 'webm']
-
     # Make a temporary folder for storing elongated and concatenated audio files
     temp_folder = 'temp/'
     delete_temp_folder(temp_folder)
     os.mkdir(temp_folder)
 
-    # make list of all audio files in input folder that have a supported extension
-    audiofile_list = [os.path.join(input_folder, f) for f in os.listdir(input_folder) if f.rsplit('.')[1] in supported_extensions]
-
-    # check if all audio files have the same extension
-    dummy, first_extension = audiofile_list[0].rsplit(".")
-    if not all(f.endswith(first_extension) for f in audiofile_list):
-        print('Error: All audio files in the input folder must have the same file extension (be the same format).')
-        sys.exit()
-
-    # Ensure extension is supported
-    if first_extension not in supported_extensions:
-        print(f'Error: You are using an unsupported audio format. Spported formats: {supported_extensions} ')
-        sys.exit()
-
+    # Find the audio files in the supported formats in the input folder and, if recursive
+    # is True in the [folders] section, in its sub folders. The formats can be mixed.
+    # The output and temporary folders are never searched, even when they are in the input folder.
+    # The files are given to the pipeline as they are found.
+    recursive = config.getboolean('folders', 'recursive', fallback=False)
+    skipped_folders = (output_folder, temp_folder)
+    audiofile_list = discover_audiofiles(input_folder, recursive, skipped_folders=skipped_folders)
+
+    # In watch mode the files of the input folder, then every file added to it, are transcribed until Ctrl+C
+    watcher = None
+    if watch:
+        watcher = FolderWatcher(input_folder, recursive, skipped_folders=skipped_folders, **watch_settings(config))
+        stop_on_signals(watcher)
+        audiofile_list = watcher.files()
+        if concatenate_input == True:
+            print('Watch mode transcribes the audio files individually, concatenate_input is ignored.')
+            concatenate_input = False
+        how = 'inotify' if watcher.use_inotify else f'a scan every {watcher.poll_seconds:g}s'
+        print(f'Watching {input_folder} for new audio files with {how}. Press Ctrl+C to stop.')
+
+    # The duration and format of every audio file is read from its header.
+    # They are kept in a cache file, so files that did not change are not read again by the next run.
+    audio_probe = open_probe(config)
+
+    # Optionally convert the audio to a smaller format before it is uploaded
+    profile = submission_profile(config)
+    # Optionally cut silence before the audio is uploaded
+    trim = trim_settings(config)
+    # Audio that has to be decoded is decoded by several processes at a time
+    # The number of processes can be set in the [decode] section of the config file
+    decoder = open_decoder(config)
+    # Optionally the words of all transcriptions of the run are also saved in one dataset
+    bulk_output = open_bulk_output(config, output_folder, 'all_transcriptions_' + date_time.strftime('%m%d%Y_%H%M%S'))
+    # Optionally every word is added to the index of the transcriptions of the output folder
+    transcript_index = open_index(config)
+    # Optionally the transcript json is kept next to the outputs, to save them again without calling the API
+    raw_transcripts = open_raw_transcripts(config, output_folder)
+    # Optionally every stage of every audio file is timed, see the [metrics] section of the config file
+    metrics = open_metrics(config, output_folder, 'metrics_' + date_time.strftime('%m%d%Y_%H%M%S'))
+
+    # Time a stage of an audio file for the metrics. The bytes it moved can be set in the record it returns.
+    def measure(source, stage_name):
+        return metrics.measure(source, stage_name) if metrics != None else contextlib.nullcontext({})
 
     # concatenate the audio files in the list if in input concatenated mode
     if concatenate_input == True:
-
-        audiofile = concatenate_audiofiles(temp_folder, audiofile_list, first_extension)
-
-
-        transcript = transcribe_speech(audiofile, client_api, message_label)
-
-        # Save all trascriptions in output folder
-        output_filename = ''.join((output_folder + 'concatenated_transcription_' + date_today + '.cha'))
-        save_transcription(transcript, output_filename, csv_file, CHAT_mode)
+        audiofile_list = list(audiofile_list)
+        if not audiofile_list:
+            print(f'Error: No audio files were found in the input folder. Supported formats: {SUPPORTED_EXTENSIONS}')
+            sys.exit()
+        # the headers of several files are read at a time
+        audio_probe.probe_all(audiofile_list)
+
+        # Large folders can be split into groups that are concatenated and transcribed as
+        # separate jobs at the same time. By default all files are concatenated into one job.
+        groups = pack_groups(audiofile_list,
+                             max_seconds=config.getfloat('concatenation', 'max_group_seconds', fallback=0),
+                             max_bytes=config.getfloat('concatenation', 'max_group_mb', fallback=0) * 1024 * 1024,
+                             probe=audio_probe)
+
+        if len(groups) == 1:
+            with measure(''.join((temp_folder, 'combinedaudiofiles.', concatenated_extension(audiofile_list))), 'decode'):
+                audiofile, index = concatenate_audiofiles(temp_folder, audiofile_list, concatenated_extension(audiofile_list), probe=audio_probe, profile=profile, decoder=decoder)
+
+
+            single_task = {'source': audiofile, 'audiofile': audiofile}
+            if on_progress != None:
+                on_progress({'stage': 'wait', 'status': 'started', 'task': single_task, 'error': None})
+            with measure(audiofile, 'transcribe') as timing:
+                transcript_json = request_transcript(audiofile, client_api, message_label, transcript_cache, audiofile_list)
+                timing['bytes'] = os.path.getsize(audiofile)
+            if on_progress != None:
+                on_progress({'stage': 'wait', 'status': 'finished', 'task': single_task, 'error': None})
+            transcribed_groups = [(audiofile, index, transcript_json)]
+        else:
+            print(f'The {len(audiofile_list)} audio files are transcribed in {len(groups)} concatenated groups.')
+            workers = pipeline_workers(config, {'prepare': 2, 'upload': 4, 'wait': 16})
+            poller, callback_receiver = start_job_watch(client_api)
+            callback_url = callback_receiver.url if callback_receiver != None else None
+            first_poll = callback_receiver.timeout if callback_receiver != None else None
+
+            def prepare_group(task):
+                if cancelled(task):
+                    return
+                with measure(task['source'], 'decode'):
+                    task['audiofile'], task['index'] = concatenate_audiofiles(temp_folder, task['sources'], concatenated_extension(task['sources']), task['name'], audio_probe, profile, decoder)
+                task['duration'] = task['index'][-1]['end']
+                if transcript_cache != None:
+                    task['cache_key'] = transcript_cache.key(task['sources'], submission_parameters())
+                    task['transcript_json'] = transcript_cache.get(task['cache_key'])
+                    task['cached'] = task['transcript_json'] != None
+
+            def upload_group(task):
+                if not task.get('cached') and not cancelled(task):
+                    with measure(task['source'], 'upload') as timing:
+                        task['job'] = submit_speech(task['audiofile'], client_api, callback_url)
+                        timing['bytes'] = os.path.getsize(task['audiofile'])
+
+            def wait_group(task):
+                if task.get('cached') or task.get('cancelled'):
+                    return
+                with measure(task['source'], 'queue'):
+                    wait_for_job(task['job'], client_api, poller, task['duration'], first_poll)
+                with measure(task['source'], 'download'):
+                    task['transcript_json'] = client_api.get_transcript_json(task['job'].id)
+                if transcript_cache != None:
+                    transcript_cache.put(task['cache_key'], task['transcript_json'])
+
+            group_tasks = ({'group': i, 'name': f'combinedaudiofiles{i + 1}', 'sources': group,
+                            'source': ''.join((temp_folder, f'combinedaudiofiles{i + 1}.', concatenated_extension(group)))}
+                           for i, group in enumerate(groups))
+            stages = [('prepare', prepare_group, workers['prepare']),
+                      ('upload', upload_group, workers['upload']),
+                      ('wait', wait_group, workers['wait'])]
+            try:
+                finished, failed = run_pipeline(group_tasks, stages, on_event=report, cancel=cancel)
+            finally:
+                stop_job_watch(poller, callback_receiver)
+            if failed:
+                print(f'\n{len(failed)} of {len(groups)} concatenated groups could not be transcribed, their audio files are missing from the output.')
+            transcribed_groups = [(task['audiofile'], task['index'], task['transcript_json'])
+                                  for task in sorted(finished, key=lambda task: task['group']) if not task.get('cancelled')]
+            if cancel_requested() and len(transcribed_groups) + len(failed) < len(groups):
+                print(f'\nThe run was cancelled, the audio files of {len(groups) - len(failed) - len(transcribed_groups)} concatenated groups are missing from the output.')
+
+        if profile != None:
+            report_upload_savings(sum(os.path.getsize(entry['file']) for _, index, _ in transcribed_groups for entry in index),
+                                  sum(os.path.getsize(audiofile) for audiofile, _, _ in transcribed_groups))
+
+        if config.getboolean('concatenation', 'split_by_file', fallback=False):
+            # Save one transcription per audio file, as when the files are transcribed individually
+            for audiofile, index, transcript_json in transcribed_groups:
+                for source, source_json in split_transcript(transcript_json, index):
+                    transcript = parse_transcript(source_json, source)
+                    if len(transcript) == 0:
+                        print(f'No speech was found in {source}')
+                        continue
+                    output_filename = output_file_name(output_folder, input_folder, source, source, date_today)
+                    with measure(source, 'render'):
+                        save_transcription(transcript, output_filename, csv_file, CHAT_mode, bulk_output, transcript_index)
+                    if raw_transcripts != None:
+                        raw_transcripts.keep_json(output_filename, [(source, source_json)])
+        elif transcribed_groups:
+            # the groups are merged in the order of the audio files
+            first_audiofile, _, first_json = transcribed_groups[0]
+            transcript = parse_transcript(first_json, first_audiofile)
+            for audiofile, index, transcript_json in transcribed_groups[1:]:
+                transcript += parse_transcript(transcript_json, audiofile)
+
+            # Save all trascriptions in output folder
+            output_filename = ''.join((output_folder + 'concatenated_transcription_' + date_today + '.cha'))
+            with measure(output_filename, 'render'):
+                save_transcription(transcript, output_filename, csv_file, CHAT_mode, bulk_output, transcript_index)
+            if raw_transcripts != None:
+                raw_transcripts.keep_json(output_filename, [(audiofile, transcript_json) for audiofile, _, transcript_json in transcribed_groups])
 
     # concatenate_input = False
     else:
-        # Transcribe speech files
-        for audiofile in audiofile_list:
-
-                # Check file length relative to 2sec minimum
-                audio_duration_shortfall = 2.01 - AudioSegment.from_file(audiofile).duration_seconds
-
-                # Elongate if less than 2s long
-                if audio_duration_shortfall > 0:
-                    audiofile = elongate_audiofile(temp_folder, audiofile, audio_duration_shortfall, first_extension)
-
-                transcript = transcribe_speech(audiofile, client_api, message_label)
-                # Save all trascriptions in output folder
-                audio_file_name =  re.split('[/.]', audiofile)[-2]
-                output_filename = ''.join((output_folder + audio_file_name + '_transcription_' + date_today + '.cha'))
-                save_transcription(transcript, output_filename, csv_file, CHAT_mode)
+        # Transcribe speech files in a pipeline: while some files are elongated,
+        # others are uploaded, transcribed by Rev AI or saved to the output folder.
+        # The number of workers of each stage can be set in the [pipeline] section of the config file.
+        workers = pipeline_workers(config, {'prepare': 2, 'upload': 4, 'wait': 16, 'render': 2})
+        # every decoding process is kept busy by a prepare worker
+        workers['prepare'] = max(workers['prepare'], decoder.workers)
+
+        # one poller refreshes the status of all submitted jobs together, or
+        # Rev AI calls back when a job is finished if the callback mode is enabled
+        poller, callback_receiver = start_job_watch(client_api)
+        callback_url = callback_receiver.url if callback_receiver != None else None
+        first_poll = callback_receiver.timeout if callback_receiver != None else None
+
+        # Record the progress of every file, so an interrupted run can be resumed
+        # without submitting the files whose jobs were already started
+        journal = None
+        if config.getboolean('journal', 'enabled', fallback=True):
+            run_settings = dict(submission_parameters(), input_folder=input_folder, csv_file=csv_file)
+            journal = RunJournal(os.path.join(output_folder, '.str_journal.jsonl'), run_settings)
+            if journal.resumed:
+                print('Resuming the interrupted transcription run.')
+
+        # Elongated audio is kept in memory until it is uploaded, instead of being saved in the temp folder
+        scratch = open_scratch(config)
+
+        def record(task, state, **details):
+            if journal != None:
+                journal.record(task['source'], state, identity=task.get('identity'), **details)
+
+        def prepare(task):
+            if cancelled(task):
+                return
+            # the job of this file was submitted by the interrupted run
+            if 'job_id' in task:
+                return
+
+            audiofile = task['source']
+
+            # Check file length relative to 2sec minimum
+            with measure(audiofile, 'probe'):
+                audio_duration = audio_probe.probe(audiofile)['duration']
+            audio_duration_shortfall = 2.01 - audio_duration
+            task['duration'] = max(audio_duration, 2.01)
+
+            # Skip the upload if this audio was already transcribed with the same settings
+            if transcript_cache != None:
+                task['cache_key'] = transcript_cache.key([audiofile], submission_parameters())
+                transcript_file = transcript_cache.get_file(task['cache_key'])
+                if transcript_file != None:
+                    task['transcript_file'] = transcript_file
+                    task['cached'] = True
+                    task['audiofile'] = elongated_name(temp_folder, audiofile, audio_extension(audiofile)) if audio_duration_shortfall > 0 else audiofile
+                    return
+
+            # Trim the silence, elongate if less than 2s long, and convert to the submission profile
+            if audio_duration_shortfall > 0 or profile != None or trim != None:
+                # decoding, trimming and exporting are done in one pass by a decoding process
+                with measure(task['source'], 'decode') as timing:
+                    audiofile, task['offset_map'] = elongate_audiofile(temp_folder, audiofile, audio_duration_shortfall, audio_extension(audiofile), audio_probe, scratch, profile, trim, decoder)
+                    timing['bytes'] = os.path.getsize(task['source'])
+            task['audiofile'] = audiofile
+            record(task, PREPARED, audiofile=audiofile, duration=task['duration'], offset_map=task.get('offset_map'))
+
+        def upload(task):
+            if cancelled(task):
+                return
+            if 'job_id' in task:
+                try:
+                    task['job'] = client_api.get_job_details(task.pop('job_id'))
+                    return
+                except Exception:
+                    # the job is gone (e.g. deleted at Rev AI), submit the file again
+                    prepare(task)
+            if 'transcript_file' in task:
+                return
+            size = scratch.size(task['audiofile']) if scratch != None else None
+            if profile != None:
+                task['original_bytes'] = os.path.getsize(task['source'])
+                task['submitted_bytes'] = size if size != None else os.path.getsize(task['audiofile'])
+            media = scratch.get(task['audiofile']) if scratch != None else None
+            with measure(task['source'], 'upload') as timing:
+                task['job'] = submit_speech(task['audiofile'], client_api, callback_url, media)
+                timing['bytes'] = size if size != None else os.path.getsize(task['audiofile'])
+            if scratch != None:
+                scratch.release(task['audiofile'])
+            record(task, SUBMITTED, job_id=task['job'].id)
+
+        def wait(task):
+            if 'job' not in task:
+                return
+            try:
+                # the time the job waits at Rev AI, from its submission or from the resumed run
+                with measure(task['source'], 'queue'):
+                    wait_for_job(task['job'], client_api, poller, task['duration'], first_poll)
+            except Exception:
+                # the file is submitted again by the next run
+                record(task, FAILED)
+                raise
+            # The transcript is saved in the temp folder a block at a time, so long
+            # transcripts are never loaded in memory. The timestamps of trimmed
+            # audio are moved back to the original audio on the way.
+            task['transcript_file'] = temp_name(temp_folder, task['source'], '', 'json')
+            os.makedirs(os.path.dirname(task['transcript_file']), exist_ok=True)
+            with measure(task['source'], 'download') as timing:
+                download_transcript(task['job'], client_api, task['transcript_file'], task.get('offset_map'))
+                timing['bytes'] = os.path.getsize(task['transcript_file'])
+            record(task, TRANSCRIBED)
+
+        def render(task):
+            if task.get('cancelled'):
+                return
+            # the transcript is read and saved a piece at a time
+            # The words are recorded with the audio file of the input folder. The prepared
+            # audio in the temp folder was only uploaded, and is removed below.
+            transcript = read_transcript(task['transcript_file'], task['source'])
+            # Save all trascriptions in output folder
+            task['output_filename'] = output_file_name(output_folder, input_folder, task['source'], task['audiofile'], date_today)
+            with measure(task['source'], 'render') as timing:
+                save_transcription(transcript, task['output_filename'], csv_file, CHAT_mode, bulk_output, transcript_index)
+                timing['bytes'] = os.path.getsize(task['transcript_file'])
+            if raw_transcripts != None:
+                raw_transcripts.keep_file(task['output_filename'], task['source'], task['transcript_file'])
+            # the transcript file is moved into the cache once it is saved
+            if transcript_cache != None and 'cache_key' in task and not task.get('cached'):
+                transcript_cache.put_file(task['cache_key'], task['transcript_file'])
+            record(task, RENDERED, output_filename=task['output_filename'])
+            # the temp files of the audio file are removed once it is saved, so a long run does not fill the disk
+            for temp_file in (task['audiofile'], task['transcript_file']):
+                if temp_file.startswith(temp_folder) and os.path.exists(temp_file):
+                    os.remove(temp_file)
+
+        # Files rendered by the interrupted run are skipped, files whose job was
+        # submitted are waited on again, all others start from the beginning
+        resumed_files = {'rendered': 0, 'submitted': 0}
+        def make_tasks():
+            for audiofile in audiofile_list:
+                # a file removed and added again with the same name is a new file
+                identity = file_identity(audiofile)
+                earlier = journal.state(audiofile, identity) if journal != None else None
+                if earlier != None and earlier['state'] == RENDERED:
+                    resumed_files['rendered'] += 1
+                    continue
+                if earlier != None and earlier['state'] in (SUBMITTED, TRANSCRIBED):
+                    resumed_files['submitted'] += 1
+                    yield {'source': audiofile, 'identity': identity, 'audiofile': earlier['audiofile'], 'duration': earlier['duration'],
+                           'job_id': earlier['job_id'], 'offset_map': earlier.get('offset_map')}
+                    continue
+                yield {'source': audiofile, 'identity': identity}
+
+        stages = [('prepare', prepare, workers['prepare']),
+                  ('upload', upload, workers['upload']),
+                  ('wait', wait, workers['wait']),
+                  ('render', render, workers['render'])]
+        # in watch mode the tasks are only counted, the run can go on for days
+        task_counts = {'finished': 0, 'failed': 0, 'cancelled': 0}
+        def on_event(event):
+            if event['status'] == 'finished' and event['task'].get('cancelled'):
+                task_counts['cancelled'] += 1
+            elif event['status'] in task_counts:
+                task_counts[event['status']] += 1
+            report(event)
 
+        try:
+            finished, failed = run_pipeline(make_tasks(), stages, on_event=on_event, keep_tasks=watcher == None, cancel=cancel)
+        finally:
+            stop_job_watch(poller, callback_receiver)
+            if scratch != None:
+                scratch.close()
+            if journal != None:
+                # keep the journal if the run did not go through, so the next run can resume it
+                # in watch mode it is kept, so the files that were transcribed are not transcribed again by the next run
+                journal.close(complete=sys.exc_info()[0] is None and not failed and watcher == None and not cancel_requested())
+
+        if profile != None:
+            report_upload_savings(sum(task.get('original_bytes', 0) for task in finished + failed),
+                                  sum(task.get('submitted_bytes', 0) for task in finished + failed))
+        if journal != None and journal.resumed:
+            print(f"\n{resumed_files['rendered']} audio files were already transcribed and {resumed_files['submitted']} were already submitted by the interrupted run.")
+        if failed:
+            print(f'\n{len(failed)} of {len(finished) + len(failed)} audio files could not be transcribed.')
+        if cancel_requested():
+            print(f"\nThe run was cancelled after {task_counts['finished']} audio files were transcribed.")
+        if watcher != None:
+            print(f"\nStopped watching {input_folder}: {task_counts['finished']} audio files transcribed, {task_counts['failed']} failed.")
+        elif not finished and not failed and resumed_files['rendered'] == 0 and not cancel_requested():
+            print(f'\nNo audio files were found in the input folder. Supported formats: {SUPPORTED_EXTENSIONS}')
+
+    audio_probe.save()
+    decoder.close()
+    if bulk_output != None:
+        bulk_output.close()
+        print(f'\nThe words of all transcriptions are saved in {bulk_output.path}')
+    if transcript_index != None:
+        # csv files of earlier runs that are not indexed yet are added too
+        transcript_index.add_csv_folder(output_folder)
+        index_stats = transcript_index.stats()
+        transcript_index.close()
+        print(f"\nIndex of the transcriptions: {index_stats['transcriptions']} transcriptions, {index_stats['words']} words in {transcript_index.path}")
+
+    if metrics != None:
+        metrics_summary = metrics.close(client_api.api_calls)
+        print(f'\nTime spent in each stage, saved in {metrics.path}:')
+        print(summary_table(metrics_summary))
+        print('API calls: ' + ', '.join(f'{call} {count}' for call, count in sorted(client_api.api_calls.items())))
+
+    if transcript_cache != None:
+        cache_stats = transcript_cache.stats()
+        print(f"\nTranscript cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
 
     print('\nAll transcription is finished')
     # update the GUI if in GUI mode
@@ -542,6 +1125,10 @@ def main(message_label):
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Transcribe the audio files of the input folder with Rev AI')
+    parser.add_argument('--watch', action='store_true', help='keep running and transcribe every audio file added to the input folder, until Ctrl+C')
+    args = parser.parse_args()
+
     # Check that entries in config.ini are valid
     # Program will abort if errors are found
     config_message, config_valid = config_check(config)
@@ -550,4 +1137,4 @@ if __name__ == '__main__':
     #run the transcription only when every entry is valid
     if not config_valid:
         sys.exit()
-    main(None) # pass None to suggest that the program is running in script mode (not using GUI).
+    main(None, watch=args.watch) # pass None to suggest that the program is running in script mode (not using GUI).
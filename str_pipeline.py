@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2023, Margaret Broeren, Yuzhe Gu, Mark Pitt
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+"""
+# Staged transcription pipeline shared by str.py and str_nogui.py
+#
+# Every audio file is a task (a dict) that goes through a list of stages,
+# e.g. prepare -> upload -> wait -> render. Each stage has its own worker
+# threads and a bounded queue in front of it, so many files are in flight at
+# once while only a limited number of them wait between two stages.
+# Workers never print or touch the GUI. They post events back to the thread
+# that called run_pipeline(), which reports them through on_event.
+
+import queue
+import threading
+
+# put on a stage queue to tell one of its workers to stop
+_STOP = object()
+
+
+# Read the worker count of every stage from the [pipeline] section of the config file
+# Parameters:
+#   config - the config file reader
+#   defaults - dict of stage name: default worker count
+# Return:
+#   workers - dict of stage name: worker count
+def pipeline_workers(config, defaults):
+    workers = {}
+    for stage_name, default_count in defaults.items():
+        workers[stage_name] = max(1, config.getint('pipeline', f'{stage_name}_workers', fallback=default_count))
+    return workers
+
+
+# Post an event to the reporting thread
+def _post(events, stage_name, status, task, error=None):
+    events.put({'stage': stage_name, 'status': status, 'task': task, 'error': error})
+
+
+# Worker loop of one stage: take a task, run the stage on it, pass it on
+def _stage_worker(stage_name, stage_function, in_queue, out_queue, events):
+    while True:
+        task = in_queue.get()
+        if task is _STOP:
+            return
+        _post(events, stage_name, 'started', task)
+        try:
+            stage_function(task)
+        except Exception as error:
+            _post(events, stage_name, 'failed', task, error)
+            continue
+        _post(events, stage_name, 'done', task)
+        if out_queue is None:
+            _post(events, stage_name, 'finished', task)
+        else:
+            # blocks while the next stage is busy, which keeps memory bounded
+            out_queue.put(task)
+
+
+# Feed the tasks to the first stage and tell the reporting thread how many there were
+def _feeder(tasks, first_queue, events, cancel):
+    task_count = 0
+    try:
+        for task in tasks:
+            # no more tasks are read once the run is cancelled, the tasks fed so far go through
+            if cancel != None and cancel.is_set():
+                break
+            _post(events, 'feed', 'queued', task)
+            first_queue.put(task)
+            task_count += 1
+    except Exception as error:
+        _post(events, 'feed', 'failed', None, error)
+    events.put({'stage': 'feed', 'status': 'fed', 'task': None, 'error': task_count})
+
+
+# Run tasks through the stages and wait until every task is finished or failed
+# Parameters:
+#   tasks - iterable of task dicts. It is read lazily, so it can be a generator.
+#   stages - list of (stage name, stage function, worker count). A stage function
+#            takes a task dict and fills in what the next stages need.
+#   on_event - optional function called on the calling thread for every event.
+#              An event is a dict with 'stage', 'status' ('queued', 'started',
+#              'done', 'failed' or 'finished'), 'task' and 'error'.
+#   queue_size - number of tasks allowed to wait in front of each stage.
+#                Default: twice the worker count of the stage.
+#   keep_tasks - False for an endless stream of tasks: the tasks are only
+#                reported through on_event, and not kept for the lists returned.
+#   cancel - optional threading.Event. Once it is set no more tasks are read,
+#            the tasks already read still go through the stages.
+# Return:
+#   finished - tasks that went through every stage
+#   failed - tasks that raised an exception in one of the stages
+def run_pipeline(tasks, stages, on_event=None, queue_size=None, keep_tasks=True, cancel=None):
+    events = queue.Queue()
+
+    stage_queues = [queue.Queue(maxsize=queue_size or 2 * worker_count) for _, _, worker_count in stages]
+
+    threads = []
+    for i, (stage_name, stage_function, worker_count) in enumerate(stages):
+        out_queue = stage_queues[i + 1] if i + 1 < len(stages) else None
+        for _ in range(worker_count):
+            thread = threading.Thread(target=_stage_worker,
+                                      args=(stage_name, stage_function, stage_queues[i], out_queue, events),
+                                      name=f'str-{stage_name}', daemon=True)
+            thread.start()
+            threads.append(thread)
+
+    feeder = threading.Thread(target=_feeder, args=(tasks, stage_queues[0], events, cancel), name='str-feed', daemon=True)
+    feeder.start()
+
+    finished = []
+    failed = []
+    done_count = 0
+    feed_error = None
+    task_count = None
+    while task_count is None or done_count < task_count:
+        event = events.get()
+        if event['stage'] == 'feed':
+            if event['status'] == 'fed':
+                task_count = event['error']
+            elif event['status'] == 'queued':
+                if on_event != None:
+                    on_event(event)
+            else:
+                feed_error = event['error']
+            continue
+        if event['status'] in ('finished', 'failed'):
+            done_count += 1
+            if keep_tasks:
+                (finished if event['status'] == 'finished' else failed).append(event['task'])
+        if on_event != None:
+            on_event(event)
+
+    # every task is through, stop the workers
+    for i, (_, _, worker_count) in enumerate(stages):
+        for _ in range(worker_count):
+            stage_queues[i].put(_STOP)
+    for thread in threads:
+        thread.join()
+
+    if feed_error != None:
+        raise feed_error
+
+    return finished, failed
@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2023, Margaret Broeren, Yuzhe Gu, Mark Pitt
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+"""
+# Central poller for Rev AI job status
+#
+# Instead of every job sleeping 20 seconds between two get_job_details calls,
+# all outstanding jobs are registered with one JobPoller. A single thread
+# polls each job when it is due. The due time comes from the audio duration
+# and the turnaround observed for earlier jobs, and backs off while the job
+# is still in progress. When several jobs are due at once, they are
+# refreshed together with pages of get_list_of_jobs instead of one
+# get_job_details call per job.
+
+import json
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from rev_ai.models import Job
+
+# the list endpoint returns at most 1000 jobs per page
+_LIST_PAGE_LIMIT = 1000
+
+# jobs submitted by someone else while we poll push our jobs further down the list
+_LIST_SLACK = 20
+
+# give up on a job after this many status requests failed in a row
+_MAX_POLL_ERRORS = 5
+
+# a callback for a job that is not registered is kept this many seconds, for at most
+# this many jobs. Callbacks for jobs that were already finished, or that this run did
+# not submit, would otherwise be kept for good.
+_EARLY_SECONDS = 600
+_MAX_EARLY = 1000
+
+
+# Read the polling settings from the [polling] section of the config file
+# Parameters:
+#   config - the config file reader
+# Return:
+#   dict of keyword arguments for JobPoller
+def poller_settings(config):
+    return {'min_interval': config.getfloat('polling', 'min_interval', fallback=1.0),
+            'max_interval': config.getfloat('polling', 'max_interval', fallback=30.0),
+            'backoff': config.getfloat('polling', 'backoff', fallback=1.5),
+            'bulk_threshold': config.getint('polling', 'bulk_threshold', fallback=3)}
+
+
+# Read the callback receiver settings from the [callback] section of the config file
+# Parameters:
+#   config - the config file reader
+# Return:
+#   dict of keyword arguments for CallbackReceiver
+def callback_settings(config):
+    return {'host': config.get('callback', 'host', fallback='127.0.0.1'),
+            'port': config.getint('callback', 'port', fallback=0),
+            'public_url': config.get('callback', 'public_url', fallback='') or None,
+            'timeout': config.getfloat('callback', 'timeout', fallback=120.0)}
+
+
+class JobPoller:
+
+    # Parameters:
+    #   client_api - the Rev AI API client
+    #   min_interval - shortest time between two polls of a job, in seconds
+    #   max_interval - longest time between two polls of a job, in seconds
+    #   backoff - factor the poll interval grows by each time a job is still in progress
+    #   bulk_threshold - refresh with get_list_of_jobs when at least this many jobs are due
+    def __init__(self, client_api, min_interval=1.0, max_interval=30.0, backoff=1.5, bulk_threshold=3):
+        self.client_api = client_api
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.bulk_threshold = bulk_threshold
+
+        # number of requests sent to Rev AI, by endpoint
+        self.api_calls = {'get_job_details': 0, 'get_list_of_jobs': 0}
+
+        # seconds of turnaround per second of audio, learned from finished jobs
+        self.turnaround_ratio = 0.5
+        self._turnaround_samples = 0
+
+        self._jobs = {}
+        # job id: (time, details) of the jobs completed (by a callback) before they were registered, oldest first
+        self._completed_early = {}
+        self._registered = 0
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='str-poller', daemon=True)
+        self._thread.start()
+
+    # Wait until Rev AI has finished a job
+    # Parameters:
+    #   job - the submitted Rev AI job
+    #   audio_duration - duration of the submitted audio in seconds, if known
+    #   first_poll - seconds before the first poll. Default: scheduled from the audio duration.
+    # Return:
+    #   job_details - the final job details (TRANSCRIBED or FAILED)
+    def wait(self, job, audio_duration=None, first_poll=None):
+        entry = self.register(job, audio_duration, first_poll)
+        entry['done'].wait()
+        if entry['error'] != None:
+            raise entry['error']
+        return entry['details']
+
+    # Start tracking a job without blocking. Use wait() or the 'done' event of the returned entry.
+    def register(self, job, audio_duration=None, first_poll=None):
+        now = time.monotonic()
+        duration = audio_duration if audio_duration else 2.0
+        with self._condition:
+            self._registered += 1
+            entry = {'id': job.id,
+                     'submitted': now,
+                     'duration': duration,
+                     'polls': 0,
+                     'errors': 0,
+                     'sequence': self._registered,
+                     'next_poll': now + (first_poll if first_poll != None else self._first_delay(duration)),
+                     'details': None,
+                     'error': None,
+                     'done': threading.Event()}
+            if job.id in self._completed_early:
+                entry['details'] = self._completed_early.pop(job.id)[1]
+                entry['done'].set()
+                return entry
+            self._jobs[job.id] = entry
+            self._condition.notify()
+        return entry
+
+    # Stop the polling thread. Jobs that are still waiting are not finished.
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._completed_early.clear()
+            self._condition.notify()
+        self._thread.join()
+
+    # Mark a job as finished from outside the poller (e.g. from a callback).
+    # A job that is registered within _EARLY_SECONDS is finished as soon as it is registered.
+    # Return:
+    #   True if the job was being waited on
+    def complete(self, job_id, details):
+        with self._condition:
+            entry = self._jobs.pop(job_id, None)
+            if entry is None:
+                now = time.monotonic()
+                early = self._completed_early
+                early.pop(job_id, None)
+                early[job_id] = (now, details)
+                # drop the oldest callbacks, which no job was registered for
+                while len(early) > _MAX_EARLY or (len(early) > 1 and early[next(iter(early))][0] < now - _EARLY_SECONDS):
+                    del early[next(iter(early))]
+                return False
+            self._learn(entry)
+        entry['details'] = details
+        entry['done'].set()
+        return True
+
+    # Expected seconds from submission to the end of transcription
+    def _expected_turnaround(self, duration):
+        return self.turnaround_ratio * duration
+
+    def _clamp(self, delay):
+        return min(self.max_interval, max(self.min_interval, delay))
+
+    def _first_delay(self, duration):
+        return self._clamp(self._expected_turnaround(duration))
+
+    # Delay before the next poll of a job that is still in progress
+    def _next_delay(self, entry, now):
+        remaining = entry['submitted'] + self._expected_turnaround(entry['duration']) - now
+        backoff_delay = self.min_interval * self.backoff ** entry['polls']
+        return self._clamp(max(remaining, backoff_delay))
+
+    # Update the turnaround estimate with a finished job (caller holds the lock)
+    def _learn(self, entry):
+        turnaround = time.monotonic() - entry['submitted']
+        ratio = turnaround / max(entry['duration'], 1.0)
+        if self._turnaround_samples == 0:
+            self.turnaround_ratio = ratio
+        else:
+            self.turnaround_ratio = 0.7 * self.turnaround_ratio + 0.3 * ratio
+        self._turnaround_samples += 1
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed:
+                    now = time.monotonic()
+                    due = [entry for entry in self._jobs.values() if entry['next_poll'] <= now]
+                    if due:
+                        break
+                    next_poll = min((entry['next_poll'] for entry in self._jobs.values()), default=None)
+                    self._condition.wait(None if next_poll is None else next_poll - now)
+                if self._closed:
+                    return
+                oldest_sequence = min(entry['sequence'] for entry in self._jobs.values())
+                newer_jobs = self._registered - oldest_sequence + 1
+
+            if len(due) >= self.bulk_threshold:
+                details = self._list_jobs(set(entry['id'] for entry in due), newer_jobs)
+            else:
+                details = {}
+
+            for entry in due:
+                if entry['id'] not in details:
+                    try:
+                        self.api_calls['get_job_details'] += 1
+                        details[entry['id']] = self.client_api.get_job_details(entry['id'])
+                    except Exception as error:
+                        self._poll_failed(entry, error)
+
+            self._update(details)
+
+    # Refresh jobs with pages of the job list
+    # Parameters:
+    #   wanted - ids of the jobs that are due
+    #   newer_jobs - number of jobs we submitted since the oldest one still waiting
+    # Return:
+    #   dict of job id: job details for every job found in the pages
+    def _list_jobs(self, wanted, newer_jobs):
+        details = {}
+        limit = min(_LIST_PAGE_LIMIT, newer_jobs + _LIST_SLACK)
+        starting_after = None
+        pages = 0
+        try:
+            while not wanted.issubset(details) and pages < 1 + newer_jobs // _LIST_PAGE_LIMIT:
+                self.api_calls['get_list_of_jobs'] += 1
+                page = self.client_api.get_list_of_jobs(limit=limit, starting_after=starting_after)
+                pages += 1
+                for job in page:
+                    details[job.id] = job
+                if len(page) < limit:
+                    break
+                starting_after = page[-1].id
+        except Exception:
+            # jobs missing from the list are polled one by one
+            pass
+        return details
+
+    # A status request failed: try again later, give up after too many errors
+    def _poll_failed(self, entry, error):
+        with self._condition:
+            entry['errors'] += 1
+            if entry['errors'] < _MAX_POLL_ERRORS:
+                entry['next_poll'] = time.monotonic() + self._clamp(self.min_interval * self.backoff ** entry['errors'])
+                return
+            self._jobs.pop(entry['id'], None)
+        entry['error'] = error
+        entry['done'].set()
+
+    # Finish the jobs that are done and schedule the next poll of the others
+    def _update(self, details):
+        finished = []
+        with self._condition:
+            now = time.monotonic()
+            for job_id, job_details in details.items():
+                entry = self._jobs.get(job_id)
+                if entry is None:
+                    continue
+                entry['errors'] = 0
+                if job_details.status.name == 'IN_PROGRESS':
+                    if entry['next_poll'] <= now:
+                        entry['polls'] += 1
+                        entry['next_poll'] = now + self._next_delay(entry, now)
+                    continue
+                self._jobs.pop(job_id)
+                self._learn(entry)
+                entry['details'] = job_details
+                finished.append(entry)
+        for entry in finished:
+            entry['done'].set()
+
+
+class CallbackReceiver:
+
+    # Local HTTP server that Rev AI calls when a job is finished.
+    # Its url is passed as callback_url when a job is submitted; jobs are then
+    # finished on the poller as soon as the notification arrives. A job that
+    # gets no callback within the timeout is polled as usual.
+    # Parameters:
+    #   poller - the JobPoller whose jobs are finished by the callbacks
+    #   host, port - address to listen on. Port 0 picks a free port.
+    #   public_url - address at which Rev AI reaches this receiver (e.g. through
+    #                port forwarding or a tunnel). Default: http://host:port
+    #   timeout - seconds to wait for a callback before polling the job
+    def __init__(self, poller, host='127.0.0.1', port=0, public_url=None, timeout=120.0):
+        self.poller = poller
+        self.timeout = timeout
+
+        # number of notifications received
+        self.callbacks = 0
+
+        # a random path, so only Rev AI (who got the url from us) can finish our jobs
+        self._path = '/' + secrets.token_urlsafe(16)
+
+        receiver = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                receiver._handle(self)
+
+            # keep the console quiet
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        if public_url:
+            self.url = public_url.rstrip('/') + self._path
+        else:
+            self.url = f'http://{host}:{self._server.server_address[1]}{self._path}'
+
+        self._thread = threading.Thread(target=self._server.serve_forever, name='str-callback', daemon=True)
+        self._thread.start()
+
+    # Stop the HTTP server
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    # Handle one notification: {"job": {...job details...}}
+    def _handle(self, request):
+        if request.path != self._path:
+            request.send_response(404)
+            request.end_headers()
+            return
+
+        try:
+            body = request.rfile.read(int(request.headers.get('Content-Length', 0)))
+            job_details = Job.from_json(json.loads(body)['job'])
+        except (ValueError, KeyError, TypeError):
+            request.send_response(400)
+            request.end_headers()
+            return
+
+        request.send_response(200)
+        request.end_headers()
+
+        self.callbacks += 1
+        if job_details.status.name != 'IN_PROGRESS':
+            self.poller.complete(job_details.id, job_details)
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2023, Margaret Broeren, Yuzhe Gu, Mark Pitt
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+"""
+# Duration and format of audio files, read from their headers
+#
+# WAV, FLAC, Ogg (Vorbis and Opus) and MP3 headers are read directly, without
+# decoding the audio or starting ffprobe. Other files (e.g. webm) are probed
+# with ffprobe. Results are kept in a cache file keyed by path, size and
+# modification time, so files that did not change are not probed again on the
+# next run.
+
+import json
+import os
+import struct
+import threading
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from pydub import utils
+
+# bytes read from the end of an Ogg file to find its last page
+_OGG_TAIL = 64 * 1024
+
+# MP3 bitrates in kbit/s by [MPEG-1][layer III] and [MPEG-2/2.5][layer III]
+_MP3_BITRATES = {1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+                 2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]}
+_MP3_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 2.5: [11025, 12000, 8000]}
+
+
+# Read the probe settings from the [probe] section of the config file
+# Parameters:
+#   config - the config file reader
+# Return:
+#   dict of keyword arguments for AudioProbe
+def probe_settings(config):
+    return {'cache_file': config.get('probe', 'cache_file', fallback='probe_cache.json'),
+            'workers': config.getint('probe', 'workers', fallback=8)}
+
+
+# Open the audio probe, with its cache file if the cache is enabled in the config file
+def open_probe(config):
+    settings = probe_settings(config)
+    if not config.getboolean('probe', 'cache', fallback=True):
+        settings['cache_file'] = None
+    return AudioProbe(**settings)
+
+
+# Read the format of an audio file from its header
+# Return:
+#   dict with duration (seconds), codec (as named by ffprobe), sample_rate,
+#   channels and sample_width (bytes, PCM only), or None if the header is not understood
+def read_header(audiofile):
+    with open(audiofile, 'rb') as f:
+        start = f.read(12)
+    try:
+        if start[:4] == b'RIFF' and start[8:12] == b'WAVE':
+            return _read_wav(audiofile)
+        if start[:4] == b'fLaC':
+            return _read_flac(audiofile)
+        if start[:4] == b'OggS':
+            return _read_ogg(audiofile)
+        if start[:3] == b'ID3' or (len(start) > 1 and start[0] == 0xFF and start[1] & 0xE0 == 0xE0):
+            return _read_mp3(audiofile)
+    except (IndexError, struct.error, ValueError, ZeroDivisionError):
+        # a truncated or damaged file is left to ffprobe, like a format that is not understood
+        return None
+    return None
+
+
+def _read_wav(audiofile):
+    try:
+        with wave.open(audiofile, 'rb') as wav:
+            sample_width = wav.getsampwidth()
+            return {'duration': wav.getnframes() / wav.getframerate(),
+                    'codec': 'pcm_u8' if sample_width == 1 else f'pcm_s{8 * sample_width}le',
+                    'sample_rate': wav.getframerate(),
+                    'channels': wav.getnchannels(),
+                    'sample_width': sample_width}
+    except (wave.Error, EOFError):
+        # e.g. floating point samples, which the wave module does not read
+        return None
+
+
+def _read_flac(audiofile):
+    with open(audiofile, 'rb') as f:
+        header = f.read(4 + 4 + 34)
+    # the STREAMINFO block always comes first
+    if len(header) < 42 or header[4] & 0x7F != 0:
+        return None
+    info = int.from_bytes(header[18:26], 'big')
+    sample_rate = info >> 44
+    channels = ((info >> 41) & 0x7) + 1
+    bits_per_sample = ((info >> 36) & 0x1F) + 1
+    total_samples = info & 0xFFFFFFFFF
+    if sample_rate == 0 or total_samples == 0:
+        return None
+    return {'duration': total_samples / sample_rate, 'codec': 'flac', 'sample_rate': sample_rate,
+            'channels': channels, 'sample_width': None, 'bits_per_sample': bits_per_sample}
+
+
+def _read_ogg(audiofile):
+    with open(audiofile, 'rb') as f:
+        page = f.read(27 + 255 + 64)
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - _OGG_TAIL))
+        tail = f.read()
+    # the first packet of the first page identifies the codec
+    segments = page[26]
+    packet = page[27 + segments:]
+    if packet[:7] == b'\x01vorbis':
+        channels = packet[11]
+        sample_rate = struct.unpack('<I', packet[12:16])[0]
+        codec, pre_skip = 'vorbis', 0
+    elif packet[:8] == b'OpusHead':
+        channels = packet[9]
+        pre_skip = struct.unpack('<H', packet[10:12])[0]
+        # Opus is always decoded at 48 kHz
+        codec, sample_rate = 'opus', 48000
+    else:
+        return None
+
+    # the granule position of the last page is the number of samples of the stream
+    last_page = tail.rfind(b'OggS')
+    if last_page < 0 or last_page + 14 > len(tail) or sample_rate == 0:
+        return None
+    granule = struct.unpack('<q', tail[last_page + 6:last_page + 14])[0]
+    return {'duration': max(0, granule - pre_skip) / sample_rate, 'codec': codec, 'sample_rate': sample_rate,
+            'channels': channels, 'sample_width': None}
+
+
+def _read_mp3(audiofile):
+    size = os.path.getsize(audiofile)
+    with open(audiofile, 'rb') as f:
+        audio_start = 0
+        tag = f.read(10)
+        if tag[:3] == b'ID3':
+            # the size of an ID3v2 tag is stored in 4 bytes of 7 bits
+            audio_start = 10 + ((tag[6] << 21) | (tag[7] << 14) | (tag[8] << 7) | tag[9])
+        f.seek(audio_start)
+        data = f.read(4096)
+        f.seek(max(0, size - 128))
+        if f.read(3) == b'TAG':
+            size -= 128
+
+    # find the first frame header
+    for i in range(len(data) - 4):
+        if data[i] == 0xFF and data[i + 1] & 0xE0 == 0xE0:
+            header = int.from_bytes(data[i:i + 4], 'big')
+            version = {3: 1, 2: 2, 0: 2.5}.get((header >> 19) & 0x3)
+            layer = (header >> 17) & 0x3
+            bitrate_index = (header >> 12) & 0xF
+            rate_index = (header >> 10) & 0x3
+            if version != None and layer == 1 and 0 < bitrate_index < 15 and rate_index < 3:
+                break
+    else:
+        return None
+
+    sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+    bitrate = _MP3_BITRATES[1 if version == 1 else 2][bitrate_index] * 1000
+    channels = 1 if (header >> 6) & 0x3 == 3 else 2
+    samples_per_frame = 1152 if version == 1 else 576
+    frame = data[i:]
+
+    # a Xing/Info or VBRI header holds the number of frames of the file
+    side_info = (17 if channels == 1 else 32) if version == 1 else (9 if channels == 1 else 17)
+    xing = frame[4 + side_info:4 + side_info + 12]
+    frames = None
+    if xing[:4] in (b'Xing', b'Info') and struct.unpack('>I', xing[4:8])[0] & 0x1:
+        frames = struct.unpack('>I', xing[8:12])[0]
+    elif frame[36:40] == b'VBRI':
+        frames = struct.unpack('>I', frame[50:54])[0]
+    if frames:
+        duration = frames * samples_per_frame / sample_rate
+    else:
+        # constant bitrate
+        duration = (size - audio_start - i) * 8 / bitrate
+    return {'duration': duration, 'codec': 'mp3', 'sample_rate': sample_rate,
+            'channels': channels, 'sample_width': None}
+
+
+# Probe an audio file with ffprobe
+def _read_ffprobe(audiofile):
+    info = utils.mediainfo(audiofile)
+    return {'duration': float(info.get('duration', 0)),
+            'codec': info.get('codec_name'),
+            'sample_rate': int(info.get('sample_rate', 0)),
+            'channels': int(info.get('channels', 0)),
+            'sample_width': None}
+
+
+class AudioProbe:
+
+    # Parameters:
+    #   cache_file - json file that keeps the probed formats between runs, or None to keep them in memory only
+    #   workers - number of files probed at the same time by probe_all
+    def __init__(self, cache_file=None, workers=8):
+        self.cache_file = cache_file
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._changed = False
+
+        # path: {'size', 'mtime', 'info'}
+        self._entries = {}
+        if cache_file != None and os.path.exists(cache_file):
+            try:
+                with open(cache_file, encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+
+    # Return the format of an audio file, see read_header
+    def probe(self, audiofile):
+        path = os.path.abspath(audiofile)
+        stat = os.stat(path)
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry != None and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            return entry['info']
+
+        info = read_header(path) or _read_ffprobe(path)
+        with self._lock:
+            self._entries[path] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'info': info}
+            self._changed = True
+        return info
+
+    # Probe several audio files at the same time
+    # Return:
+    #   dict of the format of every audio file
+    def probe_all(self, audiofiles):
+        with ThreadPoolExecutor(self.workers) as executor:
+            return dict(zip(audiofiles, executor.map(self.probe, audiofiles)))
+
+    # Write the probed formats to the cache file
+    def save(self):
+        with self._lock:
+            if self.cache_file == None or not self._changed:
+                return
+            temp_path = f'{self.cache_file}.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f)
+            os.replace(temp_path, self.cache_file)
+            self._changed = False
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2023, Margaret Broeren, Yuzhe Gu, Mark Pitt
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+"""
+# Submission profile: the format audio is converted to before it is uploaded
+#
+# Rev AI does not need 48 kHz stereo audio to transcribe speech. When the
+# profile is enabled, audio is downmixed, resampled to at most sample_rate and
+# encoded as flac, opus or wav before it is uploaded, which makes the upload
+# several times smaller. The channels are kept when the speaker channels count
+# is set, as every channel is then transcribed on its own.
+
+# codec: (ffmpeg format, ffmpeg encoder)
+_FORMATS = {'flac': ('flac', 'flac'), 'opus': ('opus', 'libopus'), 'wav': ('wav', None)}
+
+
+# Read the submission profile from the [profile] section of the config file
+# Parameters:
+#   config - the config file reader
+# Return:
+#   dict with codec, sample_rate, channels (None to keep them) and bitrate, or None when the profile is disabled
+def submission_profile(config):
+    if not config.getboolean('profile', 'enabled', fallback=False):
+        return None
+    # same condition as the speaker_channels_count sent with the job
+    multichannel = (config['transcribe.config']['speaker_channels_count'] != 'None'
+                    and config['output_format']['format'] != 'CHAT'
+                    and config['transcribe.config']['language'] == 'en')
+    return {'codec': config.get('profile', 'codec', fallback='flac'),
+            'sample_rate': config.getint('profile', 'sample_rate', fallback=16000),
+            'channels': None if multichannel else config.getint('profile', 'channels', fallback=1),
+            'bitrate': config.get('profile', 'bitrate', fallback='32k')}
+
+
+# The codecs a profile can use
+def profile_codecs():
+    return list(_FORMATS)
+
+
+# Convert an AudioSegment to the channels, sample rate and sample width of the profile
+# Audio is never upmixed or upsampled.
+def apply_profile(segment, profile):
+    if profile['channels'] != None and segment.channels > profile['channels']:
+        segment = segment.set_channels(profile['channels'])
+    if segment.frame_rate > profile['sample_rate']:
+        segment = segment.set_frame_rate(profile['sample_rate'])
+    if segment.sample_width > 2:
+        segment = segment.set_sample_width(2)
+    return segment
+
+
+# Export an AudioSegment in the codec of the profile
+# Parameters:
+#   out_file - file name or writable file
+# Return:
+#   the file handle returned by AudioSegment.export
+def export_profile(segment, out_file, profile):
+    ffmpeg_format, encoder = _FORMATS[profile['codec']]
+    if encoder == 'libopus':
+        return segment.export(out_file, format=ffmpeg_format, codec=encoder, bitrate=profile['bitrate'])
+    return segment.export(out_file, format=ffmpeg_format)
+
+
+# ffmpeg output options to encode raw audio in the codec of the profile
+def encoder_options(profile):
+    ffmpeg_format, encoder = _FORMATS[profile['codec']]
+    options = ['-f', ffmpeg_format, '-acodec', encoder]
+    if encoder == 'libopus':
+        options += ['-b:a', profile['bitrate']]
+    return options
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2023, Margaret Broeren, Yuzhe Gu, Mark Pitt
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+"""
+# Progress of a transcription run, as shown by the GUI
+#
+# The run posts its pipeline events to a queue from its worker thread. The GUI
+# drains the queue on its own thread and gives the events to a ProgressTracker,
+# which keeps the status of every audio file, the number of files done and an
+# estimate of the time left from the recent throughput. It does not touch the
+# GUI, so it can be used by any front end.
+
+import collections
+import time
+
+# status shown for a file while it is in a stage of the pipeline
+STAGE_STATUS = {'prepare': 'preparing',
+                'upload': 'uploading',
+                'wait': 'transcribing',
+                'render': 'saving'}
+
+
+class ProgressTracker:
+
+    # Parameters:
+    #   window - number of recently completed files the throughput is measured on
+    def __init__(self, window=50):
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.started = time.monotonic()
+        # file: status of every file of the run, in the order they were found
+        self.statuses = {}
+        # time when each of the recently completed files was completed
+        self._completed = collections.deque(maxlen=window)
+
+    # Update the progress with a pipeline event, see run_pipeline in str_pipeline.py
+    # Return:
+    #   (file, status) of the file whose status changed, or None
+    def update(self, event):
+        task = event['task']
+        if task == None:
+            return None
+        source = task['source']
+        status = event['status']
+        if status == 'queued':
+            self.total += 1
+            text = 'queued'
+        elif status == 'started':
+            text = 'cached' if task.get('cached') and event['stage'] == 'upload' else STAGE_STATUS.get(event['stage'], event['stage'])
+        elif status == 'failed':
+            self.failed += 1
+            self._completed.append(time.monotonic())
+            text = f"failed in {event['stage']}: {event['error']}"
+        elif status == 'finished':
+            if task.get('cancelled'):
+                # cancelled files are not counted in the throughput, they take no time
+                self.cancelled += 1
+                text = 'cancelled'
+            else:
+                self.done += 1
+                self._completed.append(time.monotonic())
+                text = 'done'
+        else:
+            return None
+        if source not in self.statuses and status != 'queued':
+            # a file that was not reported as queued, e.g. a single concatenated job
+            self.total += 1
+        self.statuses[source] = text
+        return source, text
+
+    # Number of files that are done, failed or cancelled
+    def completed(self):
+        return self.done + self.failed + self.cancelled
+
+    # Fraction of the files found so far that are completed, from 0 to 1
+    def fraction(self):
+        return self.completed() / self.total if self.total else 0.0
+
+    # Files completed per minute, measured on the recently completed files
+    def throughput(self):
+        if not self._completed:
+            return 0.0
+        # from the start of the run until enough files are completed to measure between them
+        first = self._completed[0] if len(self._completed) > 1 else self.started
+        seconds = time.monotonic() - first
+        count = len(self._completed) - 1 if len(self._completed) > 1 else 1
+        return 60.0 * count / seconds if seconds > 0 else 0.0
+
+    # Estimated seconds until the files found so far are completed, or None before the first file is completed
+    def eta(self):
+        rate = self.throughput()
+        if rate <= 0:
+            return None
+        return 60.0 * (self.total - self.completed()) / rate
+
+    # One line summary of the progress, e.g. "12 of 40 files, 3 failed, 5.2 files/min, about 0:05:22 left"
+    def summary(self):
+        text = f'{self.completed()} of {self.total} files'
+        if self.failed:
+            text += f', {self.failed} failed'
+        if self.cancelled:
+            text += f', {self.cancelled} cancelled'
+        if self._completed:
+            text += f', {self.throughput():.1f} files/min'
+        eta = self.eta()
+        if eta != None and self.completed() < self.total:
+            text += f', about {int(eta) // 3600}:{int(eta) % 3600 // 60:02d}:{int(eta) % 60:02d} left'
+        return text
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2023, Margaret Broeren, Yuzhe Gu, Mark Pitt
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+"""
+# Rendering of a Transcript to the output files
+#
+# The words of the transcript are read once, a chunk at a time. A long
+# transcript can also be given in pieces, as it is parsed. For every
+# chunk the engine works out once what all formats need (which words are
+# punctuation, where the speaker changes) and hands it to every writer. A
+# writer turns a chunk into text and writes it with a single write() to a
+# buffered file. Adding an output format means adding a writer class with
+# the same three methods: begin, write_chunk and close.
+
+import csv
+import io
+import os
+import string
+
+# words rendered at a time
+_CHUNK_WORDS = 64 * 1024
+
+# bytes buffered before a file is written to disk
+_BUFFER_SIZE = 1024 * 1024
+
+# words that are written differently in CHAT files
+CHAT_REPLACEMENTS = {
+    "dr.": "Doctor",
+    "dr": "Doctor",
+    "mr.": "Mister",
+    "mrs.": "Missus",
+    "mrs": "Missus",
+    "mss": "Missus",
+    "ms.": "Miss",
+    "ms": "Miss",
+    "<laugh>": "&=laughs",
+    "um": "&-um",
+    "uh": "&-uh",
+    "er": "&-er",
+    "eh": "&-eh"
+}
+
+CHAT_HEADER = (
+    "@Begin\n"
+    "@Languages:\n"
+    "@Participants:\n"
+    "@ID:\n"
+    "@ID:\n"
+    "@ID:\n"
+    "@Media:\n"
+    "@Location:\n"
+    "@Recording Quality:\n"
+    "@Transcriber:\n"
+    "@Date:\n"
+    "@Situation:"
+)
+
+# Ending text - same as CHAT file
+CHAT_FOOTER = "\n@End"
+
+
+# A chunk of words, with what the writers need to know about them
+class Chunk:
+    __slots__ = ('transcript', 'start', 'end', 'words', 'speakers', 'punctuation', 'turns')
+
+    # Parameters:
+    #   transcript - the Transcript, or the piece of it, the chunk is from
+    #   start, end - the chunk is the words start to end - 1 of the transcript
+    #   words - the words of the chunk
+    #   speakers - the Rev AI speaker number of every word, or None
+    #   punctuation - True for every word that is written without a space before it
+    #   turns - True for every word a new speaker starts with
+    def __init__(self, transcript, start, end, words, speakers, punctuation, turns):
+        self.transcript = transcript
+        self.start = start
+        self.end = end
+        self.words = words
+        self.speakers = speakers
+        self.punctuation = punctuation
+        self.turns = turns
+
+
+# Word by word csv file: file name, word, confidence and speaker
+# The lines are written as csv.writer writes them. Every distinct file name
+# and word is quoted by the csv module once, instead of once per line.
+class CsvWriter:
+
+    # Parameters:
+    #   first_speaker - number of the first speaker. Rev AI numbers them from 0, CHAT from 1.
+    def __init__(self, path, first_speaker=0):
+        self.path = path
+        self.first_speaker = first_speaker
+        self._file = open(path, 'w', newline='', encoding='utf-8-sig', buffering=_BUFFER_SIZE)
+        # every distinct value, as a csv field
+        self._fields = {}
+
+    def _field(self, value):
+        text = self._fields.get(value)
+        if text is None:
+            line = io.StringIO()
+            csv.writer(line).writerow([value, ''])
+            text = self._fields[value] = line.getvalue()[:-len(',\r\n')]
+        return text
+
+    def begin(self, transcript):
+        self._file.write(','.join(self._field(column) for column in transcript.columns()) + '\r\n')
+
+    def write_chunk(self, chunk):
+        fields = self._fields
+        field = self._field
+        filenames = [field(filename) for filename in chunk.transcript.filenames]
+        file_ids = chunk.transcript.file_ids[chunk.start:chunk.end]
+        # punctuation has no confidence (NaN)
+        confidences = ['/' if confidence != confidence else repr(confidence)
+                       for confidence in chunk.transcript.confidences[chunk.start:chunk.end]]
+        if chunk.speakers is None:
+            lines = [f'{filenames[file_id]},{fields.get(word) or field(word)},{confidence}\r\n'
+                     for file_id, word, confidence in zip(file_ids, chunk.words, confidences)]
+        else:
+            first_speaker = self.first_speaker
+            lines = [f'{filenames[file_id]},{fields.get(word) or field(word)},{confidence},{speaker + first_speaker}\r\n'
+                     for file_id, word, confidence, speaker in zip(file_ids, chunk.words, confidences, chunk.speakers)]
+        self._file.write(''.join(lines))
+
+    def close(self):
+        self._file.close()
+
+
+# CHAT file: one line per speaker turn, CHAT spelling of some words
+class ChatWriter:
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'w', newline='', buffering=_BUFFER_SIZE)
+        # every distinct word, as it is written in the middle of a line
+        self._spelling = {}
+
+    def begin(self, transcript):
+        self._file.write(CHAT_HEADER)
+
+    def write_chunk(self, chunk):
+        spelling = self._spelling
+        pieces = []
+        append = pieces.append
+        speakers = chunk.speakers or [None] * len(chunk.words)
+        for word, speaker, is_punctuation, is_turn in zip(chunk.words, speakers, chunk.punctuation, chunk.turns):
+            if is_turn:
+                append(''.join(('\nSP', str(speaker + 1), ':\t', CHAT_REPLACEMENTS.get(word, word))))
+            elif is_punctuation:
+                append(word)
+            else:
+                text = spelling.get(word)
+                if text is None:
+                    text = spelling[word] = ' ' + CHAT_REPLACEMENTS.get(word, word)
+                append(text)
+        self._file.write(''.join(pieces))
+
+    def close(self):
+        self._file.write(CHAT_FOOTER)
+        self._file.close()
+
+
+# Unformatted text file: one line per speaker turn
+class TextWriter:
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'w', newline='', buffering=_BUFFER_SIZE)
+
+    def begin(self, transcript):
+        pass
+
+    def write_chunk(self, chunk):
+        pieces = []
+        append = pieces.append
+        speakers = chunk.speakers or [None] * len(chunk.words)
+        for word, speaker, is_punctuation, is_turn in zip(chunk.words, speakers, chunk.punctuation, chunk.turns):
+            if is_turn:
+                append(''.join(('\nspeaker ', str(speaker), ': ', word)))
+            elif is_punctuation:
+                append(word)
+            else:
+                append(' ')
+                append(word)
+        self._file.write(''.join(pieces))
+
+    def close(self):
+        self._file.close()
+
+
+# Write a transcript with every writer in one pass over its words
+# Parameters:
+#   transcript - the Transcript to write
+#   writers - the writers of the output formats. They are closed when the transcript is written.
+def render_transcript(transcript, writers):
+    render_pieces([transcript], writers)
+
+
+# Write a transcript given in pieces with every writer, e.g. as it is parsed
+# Parameters:
+#   pieces - iterable of the Transcripts of the pieces, in order. There must be at least one.
+#   writers - the writers of the output formats. They are closed when the transcript is written.
+def render_pieces(pieces, writers):
+    # no white space before a punctuation. Worked out once for every distinct word.
+    punctuation = {}
+    current_speaker = -1
+    started = False
+    try:
+        for transcript in pieces:
+            if not started:
+                for writer in writers:
+                    writer.begin(transcript)
+                started = True
+            for start in range(0, len(transcript), _CHUNK_WORDS):
+                end = min(start + _CHUNK_WORDS, len(transcript))
+                words = transcript.words[start:end]
+                is_punctuation = []
+                for word in words:
+                    flag = punctuation.get(word)
+                    if flag is None:
+                        flag = punctuation[word] = word in string.punctuation
+                    is_punctuation.append(flag)
+
+                # a new speaker starts where the speaker changes
+                if transcript.has_speakers:
+                    speakers = transcript.speakers[start:end].tolist()
+                    turns = [speaker != previous for speaker, previous in zip(speakers, [current_speaker] + speakers)]
+                    current_speaker = speakers[-1]
+                else:
+                    speakers = None
+                    turns = [False] * len(words)
+
+                chunk = Chunk(transcript, start, end, words, speakers, is_punctuation, turns)
+                for writer in writers:
+                    writer.write_chunk(chunk)
+    finally:
+        for writer in writers:
+            writer.close()
+
+
+# The writers of the output files of a transcription
+# Parameters:
+#   output_file_name - the output file name. The csv and text files are named after it.
+#   csv_file - to also write the word by word csv file
+#   CHAT_output - CHAT file, or text file if False
+# Return:
+#   list of the writers, for render_pieces
+def output_writers(output_file_name, csv_file, CHAT_output):
+    writers = []
+    if csv_file:
+        # CHAT speakers are numbered from 1
+        writers.append(CsvWriter(os.path.splitext(output_file_name)[0] + '.csv', first_speaker = 1 if CHAT_output else 0))
+    if CHAT_output:
+        writers.append(ChatWriter(output_file_name))
+    else:
+        writers.append(TextWriter(os.path.splitext(output_file_name)[0] + '.txt'))
+    return writers
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2023, Margaret Broeren, Yuzhe Gu, Mark Pitt
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+"""
+# Raw transcripts kept next to the outputs, and the outputs saved again from them
+#
+# When keep is enabled in the [raw_transcripts] section of the config file,
+# the Rev AI transcript json of every saved transcription is kept in the
+# output folder, named after its output files (<output>.json), with the
+# timestamps moved back to the original audio when silence was trimmed.
+# raw_transcripts.jsonl in the output folder records the json files and the
+# audio file name of every output. The outputs of a whole folder can then be
+# saved again, e.g. in the other format or with csv files, without calling
+# the API. The transcripts are rendered by several processes at a time:
+#   python str_rerender.py
+#   python str_rerender.py --format unformatted --csv-file True --folder output
+
+import argparse
+import configparser
+import json
+import os
+import shutil
+import threading
+import time
+
+from str_decode import DecodePool
+from str_render import render_pieces, output_writers
+from str_stream import file_chunks, transcript_events
+from str_transcript import Transcript
+
+# the record of the kept transcripts in the output folder
+MANIFEST = 'raw_transcripts.jsonl'
+
+# transcript files up to this size are parsed at once, larger ones a block at a time
+_LOAD_BYTES = 16 * 1024 * 1024
+
+
+# Open the raw transcripts of the output folder if they are kept
+# Parameters:
+#   config - the config file reader
+#   output_folder - the output folder
+# Return:
+#   the RawTranscripts, or None if the transcripts are not kept
+def open_raw_transcripts(config, output_folder):
+    if not config.getboolean('raw_transcripts', 'keep', fallback=False):
+        return None
+    # Assumes a single speaker when the speaker channels count is set, else multiple speakers when set to "None"
+    return RawTranscripts(output_folder, config['transcribe.config']['speaker_channels_count'] == 'None')
+
+
+# Read the record of the kept transcripts of an output folder
+# Return:
+#   dict of output name: record with the parts (json file and audio file) of the transcription.
+#   A transcription saved again is the latest one.
+def read_manifest(output_folder):
+    records = {}
+    try:
+        with open(os.path.join(output_folder, MANIFEST), encoding='utf-8') as manifest:
+            for line in manifest:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # cut off by an interrupted run
+                    continue
+                records[record['output']] = record
+    except FileNotFoundError:
+        pass
+    return records
+
+
+class RawTranscripts:
+
+    # Parameters:
+    #   output_folder - the folder the transcripts are kept in, next to the outputs
+    #   has_speakers - if the transcripts have speakers, recorded for re-rendering them
+    def __init__(self, output_folder, has_speakers=True):
+        self.output_folder = output_folder
+        self.has_speakers = has_speakers
+        self._lock = threading.Lock()
+
+    # Keep a transcript json file saved by Rev AI
+    # Parameters:
+    #   output_file_name - the output file name of the transcription
+    #   audiofile - the audio file name saved with every word
+    #   transcript_file - the transcript json file. It is copied.
+    def keep_file(self, output_file_name, audiofile, transcript_file):
+        output = os.path.splitext(output_file_name)[0]
+        shutil.copyfile(transcript_file, output + '.json')
+        self._record(output, [(output + '.json', audiofile)])
+
+    # Keep transcripts that are in memory
+    # Parameters:
+    #   output_file_name - the output file name of the transcription
+    #   parts - list of (audio file name, transcript json) of the parts of the transcription, in order
+    def keep_json(self, output_file_name, parts):
+        output = os.path.splitext(output_file_name)[0]
+        kept = []
+        for i, (audiofile, transcript_json) in enumerate(parts):
+            json_file = output + ('.json' if i == 0 else f'.{i + 1}.json')
+            with open(json_file, 'w', encoding='utf-8') as f:
+                json.dump(transcript_json, f)
+            kept.append((json_file, audiofile))
+        self._record(output, kept)
+
+    def _record(self, output, parts):
+        # the names are relative to the output folder, so it can be moved
+        record = {'output': os.path.relpath(output, self.output_folder),
+                  'parts': [{'json': os.path.relpath(json_file, self.output_folder), 'audiofile': audiofile} for json_file, audiofile in parts],
+                  'has_speakers': self.has_speakers}
+        with self._lock:
+            with open(os.path.join(self.output_folder, MANIFEST), 'a', encoding='utf-8') as manifest:
+                manifest.write(json.dumps(record) + '\n')
+
+
+# Save the outputs of a kept transcription again. Run in a worker process.
+# Parameters:
+#   output_folder - the output folder
+#   record - the record of the transcription, from read_manifest
+#   csv_file - to also save the csv file
+#   CHAT_output - CHAT file, or text file if False
+# Return:
+#   number of words saved
+def rerender(output_folder, record, csv_file, CHAT_output):
+    words = 0
+
+    def pieces():
+        nonlocal words
+        for part in record['parts']:
+            json_file = os.path.join(output_folder, part['json'])
+            with open(json_file, 'rb') as f:
+                if os.path.getsize(json_file) <= _LOAD_BYTES:
+                    transcript_pieces = [Transcript.from_json(json.load(f), part['audiofile'], record['has_speakers'])]
+                else:
+                    transcript_pieces = Transcript.pieces_from_events(transcript_events(file_chunks(f)), part['audiofile'], record['has_speakers'])
+                for piece in transcript_pieces:
+                    words += len(piece)
+                    yield piece
+
+    render_pieces(pieces(), output_writers(os.path.join(output_folder, record['output'] + '.cha'), csv_file, CHAT_output))
+    return words
+
+
+# Save the outputs of every kept transcription of an output folder again
+# Parameters:
+#   output_folder - the output folder
+#   csv_file - to also save the csv files
+#   CHAT_output - CHAT files, or text files if False
+#   workers - number of processes rendering at a time
+# Return:
+#   number of transcriptions and of words saved
+def rerender_folder(output_folder, csv_file, CHAT_output, workers=1):
+    records = read_manifest(output_folder).values()
+    pool = DecodePool(workers)
+    try:
+        words = sum(pool.map(rerender, ((output_folder, record, csv_file, CHAT_output) for record in records)))
+    finally:
+        pool.close()
+    return len(records), words
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Save the outputs of an output folder again from the kept Rev AI transcripts, without calling the API')
+    parser.add_argument('--folder', help='output folder. Default: output_folder of the config file')
+    parser.add_argument('--format', choices=['CHAT', 'unformatted'], help='output format. Default: format of the config file')
+    parser.add_argument('--csv-file', choices=['True', 'False'], help='to also save csv files. Default: csv_file of the config file')
+    parser.add_argument('--workers', type=int, default=0, help='processes rendering at a time. Default: one per core')
+    args = parser.parse_args()
+
+    config = configparser.ConfigParser()
+    config.read('transcription_config.ini')
+    folder = args.folder or config['folders']['output_folder']
+    output_format = args.format or config['output_format']['format']
+    csv_file = (args.csv_file or config['concatenation']['csv_file']) == 'True'
+
+    start = time.perf_counter()
+    transcriptions, words = rerender_folder(folder, csv_file, output_format == 'CHAT', args.workers if args.workers > 0 else os.cpu_count() or 1)
+    print(f'{transcriptions} transcriptions ({words} words) saved again in {folder} in {time.perf_counter() - start:.1f}s')
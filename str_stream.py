@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2023, Margaret Broeren, Yuzhe Gu, Mark Pitt
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+"""
+# Incremental parsing of Rev AI transcript json
+#
+# The transcript of a day-long recording is several hundred MB of json.
+# Loading it with json.load() holds the text and a dict per word in memory
+# at the same time. Here the json is read a block at a time and only one
+# element (word or punctuation) is decoded at a time, so memory use does not
+# depend on the length of the transcript. The transcript is given as events:
+#   ('monologue', fields) - a monologue starts. fields are the keys before
+#                           "elements", e.g. {'speaker': 0, 'speaker_info': None}
+#   ('element', element)  - a word or punctuation of the monologue
+#   ('monologue_end', fields) - the monologue ends. fields are the keys after "elements".
+#   ('field', key, value) - a top-level key other than "monologues"
+# The events can be written back to a json file with write_transcript.
+
+import codecs
+import json
+
+# bytes read at a time
+_READ_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+
+# characters that can go on after the beginning of a json number
+_NUMBER_PARTS = frozenset('.eE+-')
+
+
+# The blocks of a binary file, to be parsed by transcript_events
+def file_chunks(binary_file, size=_READ_SIZE):
+    return iter(lambda: binary_file.read(size), b'')
+
+
+# Buffer of the json text, filled a block at a time
+class _Reader:
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._text_decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self._text = ''
+        self._position = 0
+        self._end_of_input = False
+
+    # Read the next block. Return False at the end of the input.
+    def _read_more(self):
+        if self._end_of_input:
+            return False
+        for chunk in self._chunks:
+            text = self._text_decoder.decode(chunk)
+            if text:
+                self._text = self._text[self._position:] + text
+                self._position = 0
+                return True
+        self._end_of_input = True
+        self._text = self._text[self._position:] + self._text_decoder.decode(b'', final=True)
+        self._position = 0
+        return True
+
+    # The next character that is not white space, without consuming it. '' at the end of the input.
+    def peek(self):
+        position = self._position
+        if position < len(self._text) and self._text[position] not in ' \t\n\r':
+            return self._text[position]
+        while True:
+            text = self._text
+            position = self._position
+            while position < len(text) and text[position] in ' \t\n\r':
+                position += 1
+            self._position = position
+            if position < len(text):
+                return text[position]
+            if not self._read_more():
+                return ''
+
+    # Consume the next character if it is char
+    def accept(self, char):
+        if self.peek() == char:
+            self._position += 1
+            return True
+        return False
+
+    def expect(self, char):
+        if not self.accept(char):
+            found = self.peek()
+            raise ValueError(f'Invalid transcript json: expected {char!r}, found {found!r}' if found else
+                             f'Invalid transcript json: expected {char!r}, found the end of the transcript')
+
+    # Decode the values of an array, after its '['
+    def array_values(self):
+        if self.accept(']'):
+            return
+        while True:
+            yield self.value()
+            # most of the time the separator follows the value directly
+            text = self._text
+            position = self._position
+            if position < len(text) and text[position] == ',':
+                self._position = position + 1
+                continue
+            if self.accept(']'):
+                return
+            self.expect(',')
+
+    # Decode the next json value
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._text, self._position)
+                # a number at the end of the block may go on in the next block, also
+                # when the block ends with its '.' or exponent, e.g. '12.' of '12.5'
+                if self._end_of_input or (end < len(self._text) and self._text[end] not in _NUMBER_PARTS):
+                    self._position = end
+                    return value
+            except json.JSONDecodeError:
+                if self._end_of_input:
+                    raise
+            self._read_more()
+
+
+# Parse a transcript json a block at a time
+# Parameters:
+#   chunks - iterable of the blocks of the json as bytes, e.g. file_chunks(f) or response.iter_content(65536)
+# Return:
+#   generator of the events of the transcript, see the top of this file
+def transcript_events(chunks):
+    reader = _Reader(chunks)
+    reader.expect('{')
+    if reader.accept('}'):
+        return
+    while True:
+        key = reader.value()
+        reader.expect(':')
+        if key == 'monologues':
+            reader.expect('[')
+            if not reader.accept(']'):
+                while True:
+                    yield from _monologue_events(reader)
+                    if reader.accept(']'):
+                        break
+                    reader.expect(',')
+        else:
+            yield ('field', key, reader.value())
+        if reader.accept('}'):
+            return
+        reader.expect(',')
+
+
+def _monologue_events(reader):
+    reader.expect('{')
+    fields = {}
+    started = False
+    if not reader.accept('}'):
+        while True:
+            key = reader.value()
+            reader.expect(':')
+            if key == 'elements':
+                yield ('monologue', fields)
+                started = True
+                fields = {}
+                reader.expect('[')
+                for element in reader.array_values():
+                    yield ('element', element)
+            else:
+                fields[key] = reader.value()
+            if reader.accept('}'):
+                break
+            reader.expect(',')
+    if not started:
+        yield ('monologue', fields)
+        fields = {}
+    yield ('monologue_end', fields)
+
+
+# Write the events of a transcript as json
+# Parameters:
+#   events - the events, e.g. from transcript_events
+#   text_file - file opened for writing text
+def write_transcript(events, text_file):
+    # the pieces of text are written a few thousand at a time
+    pieces = []
+    write = pieces.append
+    dumps = json.dumps
+    write('{"monologues": [')
+    # the top-level keys are written after the monologues
+    fields = []
+    monologue_count = 0
+    element_count = 0
+    for event in events:
+        kind = event[0]
+        if kind == 'element':
+            write(', ' + dumps(event[1]) if element_count else dumps(event[1]))
+            element_count += 1
+            if len(pieces) >= 4096:
+                text_file.write(''.join(pieces))
+                pieces.clear()
+        elif kind == 'monologue':
+            write(', {' if monologue_count else '{')
+            for key, value in event[1].items():
+                write(f'{dumps(key)}: {dumps(value)}, ')
+            write('"elements": [')
+            element_count = 0
+        elif kind == 'monologue_end':
+            write(']')
+            for key, value in event[1].items():
+                write(f', {dumps(key)}: {dumps(value)}')
+            write('}')
+            monologue_count += 1
+        else:
+            fields.append(event[1:])
+    write(']')
+    for key, value in fields:
+        write(f', {dumps(key)}: {dumps(value)}')
+    write('}')
+    text_file.write(''.join(pieces))
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2023, Margaret Broeren, Yuzhe Gu, Mark Pitt
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+"""
+# Compact in-memory transcript
+#
+# A transcript of a long conversation has hundreds of thousands of words.
+# Instead of one dict per word, the words are kept in columns: the lower-cased
+# words (interned, so a word that is said often is stored once), the
+# confidences, start and end times in arrays of doubles (NaN for
+# punctuation), the speakers as
+# integers in an array and the file of every word as an index in the list of
+# file names. The writers in str.py and str_nogui.py read the columns directly.
+
+import array
+import math
+import sys
+
+# confidence of punctuation, which has none
+_NO_CONFIDENCE = math.nan
+# start and end time of punctuation, which has none
+_NO_TIME = math.nan
+
+
+class Transcript:
+    __slots__ = ('filenames', 'file_ids', 'words', 'confidences', 'starts', 'ends', 'speakers', '_file_index')
+
+    # Parameters:
+    #   has_speakers - False when the transcript has no speakers, e.g. when the speaker channels count is set
+    def __init__(self, has_speakers=True):
+        # the distinct file names, and the index in it of the file of every word
+        self.filenames = []
+        self.file_ids = array.array('I')
+        self.words = []
+        self.confidences = array.array('d')
+        # the start and end time of every word in seconds
+        self.starts = array.array('d')
+        self.ends = array.array('d')
+        # the Rev AI speaker number of every word, or None
+        self.speakers = array.array('i') if has_speakers else None
+        self._file_index = {}
+
+    # Make the transcript of a Rev AI transcript json
+    # Parameters:
+    #   transcript_json - the transcript returned by Rev AI
+    #   audiofile - the transcribed file, stored with every word
+    #   has_speakers - False to leave out the speakers of the monologues
+    @classmethod
+    def from_json(cls, transcript_json, audiofile, has_speakers=True):
+        transcript = cls(has_speakers)
+        file_id = transcript._file_id(audiofile)
+        words = transcript.words
+        confidences = transcript.confidences
+        starts = transcript.starts
+        ends = transcript.ends
+        intern = sys.intern
+        for monologue in transcript_json['monologues']:
+            first_word = len(words)
+            for element in monologue['elements']:
+                # remove white space
+                if element['type'] == 'punct':
+                    if element['value'] == ' ':
+                        continue
+                    confidences.append(_NO_CONFIDENCE)
+                else:
+                    confidences.append(element['confidence'])
+                starts.append(element.get('ts', _NO_TIME))
+                ends.append(element.get('end_ts', _NO_TIME))
+                words.append(intern(element['value'].lower()))
+            if has_speakers:
+                transcript.speakers.extend([monologue['speaker']] * (len(words) - first_word))
+        transcript.file_ids.extend([file_id] * len(words))
+        return transcript
+
+    # Make the transcript from the events of a transcript json (see str_stream.py), a piece at a time
+    # Parameters:
+    #   events - the events, e.g. from transcript_events
+    #   audiofile, has_speakers - see from_json
+    #   piece_words - number of words in a piece
+    # Return:
+    #   generator of Transcripts of about piece_words words each. There is at least one, maybe empty.
+    @classmethod
+    def pieces_from_events(cls, events, audiofile, has_speakers=True, piece_words=64 * 1024):
+        intern = sys.intern
+        transcript = cls(has_speakers)
+        file_id = transcript._file_id(audiofile)
+        words = transcript.words
+        confidences = transcript.confidences
+        starts = transcript.starts
+        ends = transcript.ends
+        speakers = transcript.speakers
+        speaker = None
+        # words of the monologue whose speaker comes after its elements
+        unassigned = 0
+        for event in events:
+            kind = event[0]
+            if kind == 'element':
+                element = event[1]
+                # remove white space
+                if element['type'] == 'punct':
+                    if element['value'] == ' ':
+                        continue
+                    confidences.append(_NO_CONFIDENCE)
+                else:
+                    confidences.append(element['confidence'])
+                starts.append(element.get('ts', _NO_TIME))
+                ends.append(element.get('end_ts', _NO_TIME))
+                words.append(intern(element['value'].lower()))
+                if has_speakers:
+                    if speaker is None:
+                        unassigned += 1
+                    else:
+                        speakers.append(speaker)
+                if len(words) >= piece_words and not unassigned:
+                    transcript.file_ids.extend([file_id] * len(words))
+                    yield transcript
+                    transcript = cls(has_speakers)
+                    file_id = transcript._file_id(audiofile)
+                    words = transcript.words
+                    confidences = transcript.confidences
+                    starts = transcript.starts
+                    ends = transcript.ends
+                    speakers = transcript.speakers
+            elif kind == 'monologue':
+                speaker = event[1].get('speaker')
+            elif kind == 'monologue_end':
+                if unassigned:
+                    speakers.extend([event[1]['speaker']] * unassigned)
+                    unassigned = 0
+                speaker = None
+        transcript.file_ids.extend([file_id] * len(words))
+        yield transcript
+
+    def _file_id(self, filename):
+        if filename not in self._file_index:
+            self._file_index[filename] = len(self.filenames)
+            self.filenames.append(filename)
+        return self._file_index[filename]
+
+    def __len__(self):
+        return len(self.words)
+
+    @property
+    def has_speakers(self):
+        return self.speakers is not None
+
+    # Add the words of another transcript at the end
+    def extend(self, other):
+        if self.has_speakers != other.has_speakers:
+            raise ValueError('cannot join a transcript with speakers and one without')
+        file_ids = [self._file_id(filename) for filename in other.filenames]
+        self.file_ids.extend(file_ids[file_id] for file_id in other.file_ids)
+        self.words.extend(other.words)
+        self.confidences.extend(other.confidences)
+        self.starts.extend(other.starts)
+        self.ends.extend(other.ends)
+        if self.has_speakers:
+            self.speakers.extend(other.speakers)
+        return self
+
+    def __iadd__(self, other):
+        return self.extend(other)
+
+    # The column names of the rows
+    def columns(self):
+        return ['filename', 'transcription', 'confidence', 'speaker'] if self.has_speakers else ['filename', 'transcription', 'confidence']
+
+    # The words as rows of the csv output
+    # Parameters:
+    #   first_speaker - number of the first speaker. Rev AI numbers them from 0, CHAT from 1.
+    #   start, end - the rows of the words start to end - 1. Default: every word.
+    # Return:
+    #   generator of (file name, word, confidence or '/' for punctuation[, speaker])
+    def rows(self, first_speaker=0, start=0, end=None):
+        end = len(self.words) if end is None else end
+        filenames = self.filenames
+        confidences = ('/' if math.isnan(confidence) else confidence for confidence in self.confidences[start:end])
+        files = (filenames[file_id] for file_id in self.file_ids[start:end])
+        if not self.has_speakers:
+            return zip(files, self.words[start:end], confidences)
+        speakers = (str(speaker + first_speaker) for speaker in self.speakers[start:end])
+        return zip(files, self.words[start:end], confidences, speakers)
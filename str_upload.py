@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2023, Margaret Broeren, Yuzhe Gu, Mark Pitt
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+"""
+# Audio prepared for upload without a round trip through the temp folder
+#
+# Elongated audio is written to a scratch area: each file is kept in memory
+# and only spilled to a temporary file when it grows over max_memory_mb. Audio
+# that is known to be larger is saved to the temp folder when it is prepared,
+# so it is never held in memory. The scratch folder can be a RAM disk, e.g.
+# /dev/shm. RevAiClient uploads the prepared audio straight from the scratch area.
+
+import collections
+import json
+import tempfile
+import threading
+from urllib.parse import urljoin, urlparse
+from rev_ai import apiclient
+from rev_ai.models import Job
+
+
+# Read the scratch area settings from the [scratch] section of the config file
+# Parameters:
+#   config - the config file reader
+# Return:
+#   dict of keyword arguments for ScratchArea
+def scratch_settings(config):
+    return {'max_memory_mb': config.getfloat('scratch', 'max_memory_mb', fallback=16),
+            'folder': config.get('scratch', 'folder', fallback='') or None}
+
+
+# Open the scratch area if it is enabled in the config file
+# Return:
+#   the ScratchArea, or None when prepared audio is saved in the temp folder
+def open_scratch(config):
+    if not config.getboolean('scratch', 'enabled', fallback=True):
+        return None
+    return ScratchArea(**scratch_settings(config))
+
+
+class ScratchArea:
+
+    # Parameters:
+    #   max_memory_mb - size of a prepared file above which it is spilled to disk
+    #   folder - folder of the spilled files. None for the system temp folder.
+    def __init__(self, max_memory_mb=16, folder=None):
+        self.max_memory = int(max_memory_mb * 1024 * 1024)
+        self.folder = folder
+        self.spilled = 0
+        self._lock = threading.Lock()
+
+        # file name: buffer
+        self._buffers = {}
+
+    # Make an empty buffer to write a prepared file into
+    # Parameters:
+    #   name - the file name the audio would have in the temp folder. It is also the name uploaded to Rev AI.
+    # Return:
+    #   the writable buffer
+    # A name still in the scratch area is not replaced, two files must never share a name.
+    def create(self, name):
+        buffer = tempfile.SpooledTemporaryFile(max_size=self.max_memory, dir=self.folder)
+        with self._lock:
+            if name in self._buffers:
+                buffer.close()
+                raise FileExistsError(f'{name} is already in the scratch area')
+            self._buffers[name] = buffer
+        return buffer
+
+    # Return the buffer of a prepared file, rewound for reading, or None if it is not in the scratch area
+    def get(self, name):
+        with self._lock:
+            buffer = self._buffers.get(name)
+        if buffer != None:
+            buffer.seek(0)
+        return buffer
+
+    # Size in bytes of a prepared file, or None if it is not in the scratch area
+    def size(self, name):
+        with self._lock:
+            buffer = self._buffers.get(name)
+            return buffer.seek(0, 2) if buffer != None else None
+
+    # Free the buffer of a file that is no longer needed
+    def release(self, name):
+        with self._lock:
+            buffer = self._buffers.pop(name, None)
+        if buffer != None:
+            if buffer.seek(0, 2) > self.max_memory:
+                with self._lock:
+                    self.spilled += 1
+            buffer.close()
+
+    # Count a prepared file that was too large for memory and was saved to disk instead
+    def spill(self):
+        with self._lock:
+            self.spilled += 1
+
+    # Free every buffer
+    def close(self):
+        with self._lock:
+            names = list(self._buffers)
+        for name in names:
+            self.release(name)
+
+
+# Kind of a Rev AI API call, used to count the calls
+def _call_kind(method, url):
+    path = urlparse(url).path.rstrip('/')
+    if path.endswith('/transcript'):
+        return 'transcript'
+    if path.endswith('/jobs'):
+        return 'submit' if method == 'POST' else 'list'
+    if method == 'GET':
+        return 'job_details'
+    return method.lower()
+
+
+class RevAiClient(apiclient.RevAiAPIClient):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # API call kind: number of calls, e.g. for the run metrics
+        self.api_calls = collections.Counter()
+        self._calls_lock = threading.Lock()
+
+    # Every request of the client goes through here
+    def _make_http_request(self, method, url, **kwargs):
+        with self._calls_lock:
+            self.api_calls[_call_kind(method, url)] += 1
+        return super()._make_http_request(method, url, **kwargs)
+
+    # Submit a local file for transcription, like RevAiAPIClient.submit_job_local_file
+    # Parameters:
+    #   filename - the file name of the audio
+    #   media - open file or buffer to read the audio from instead of opening filename
+    #   options - the job options of RevAiAPIClient.submit_job_local_file
+    def submit_job_local_file(self, filename, metadata=None, callback_url=None, media=None, **options):
+        if media == None:
+            return super().submit_job_local_file(filename, metadata=metadata, callback_url=callback_url, **options)
+
+        payload = self._create_job_options_payload(media_url=None, metadata=metadata, callback_url=callback_url,
+                                                   source_config=None, **options)
+        files = {
+            'media': (filename, media),
+            'options': (None, json.dumps(payload, sort_keys=True))
+        }
+        response = self._make_http_request("POST", urljoin(self.base_url, 'jobs'), files=files)
+        return Job.from_json(response.json())
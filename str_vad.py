@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2023, Margaret Broeren, Yuzhe Gu, Mark Pitt
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+"""
+# Trimming of silence before audio is uploaded
+#
+# The energy of the audio is measured in short frames with numpy. Silence
+# before the first and after the last speech is cut, and pauses inside the
+# audio can be shortened to max_pause_ms. Less audio is uploaded and billed.
+# The offset map of the trimmed audio gives, for every piece that was kept,
+# where it came from in the original audio, so the word timestamps of the
+# transcript can be moved back to the original audio.
+#
+# Needs numpy:
+#   pip3 install numpy
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# True when numpy is installed
+def trim_available():
+    return numpy != None
+
+
+# Read the trimming settings from the [trim] section of the config file
+# Parameters:
+#   config - the config file reader
+# Return:
+#   dict of keyword arguments for trim_silence, or None when trimming is disabled
+def trim_settings(config):
+    if not config.getboolean('trim', 'enabled', fallback=False):
+        return None
+    return {'threshold_db': config.getfloat('trim', 'threshold_db', fallback=-45),
+            'frame_ms': config.getfloat('trim', 'frame_ms', fallback=20),
+            'padding_ms': config.getfloat('trim', 'padding_ms', fallback=250),
+            'max_pause_ms': config.getfloat('trim', 'max_pause_ms', fallback=0)}
+
+
+# Find the parts of the audio that contain speech
+# Parameters:
+#   samples - numpy array of the samples, one row per frame and one column per channel
+#   frame_rate - frames per second
+#   threshold_db - level in dBFS above which a frame is speech
+#   frame_ms - length of the frames the level is measured in
+#   padding_ms - silence kept before and after speech
+#   max_pause_ms - longest pause kept inside the audio. 0 keeps every pause.
+#   full_scale - largest sample value
+# Return:
+#   list of (first frame, end frame) of the parts to keep, or [] if there is no speech
+def speech_ranges(samples, frame_rate, threshold_db=-45, frame_ms=20, padding_ms=250, max_pause_ms=0, full_scale=32768):
+    window = max(1, int(frame_rate * frame_ms / 1000))
+    window_count = len(samples) // window
+    if window_count == 0:
+        return []
+
+    # level of every window, in dBFS, of the loudest channel
+    windows = samples[:window_count * window].astype(numpy.float64).reshape(window_count, window, -1)
+    rms = numpy.sqrt(numpy.mean(windows ** 2, axis=1)).max(axis=1)
+    level = 20 * numpy.log10(numpy.maximum(rms, 1e-9) / full_scale)
+    speech = level > threshold_db
+    if not speech.any():
+        return []
+
+    # keep some silence around speech, so words are not cut
+    # A window is kept when a speech window is at most padding windows away. The count of speech
+    # windows in reach is taken from a cumulative sum, which stays aligned on clips shorter than the padding.
+    padding = int(padding_ms / frame_ms)
+    if padding > 0:
+        speech_count = numpy.concatenate(([0], numpy.cumsum(speech)))
+        window_numbers = numpy.arange(window_count)
+        speech = speech_count[numpy.minimum(window_numbers + padding + 1, window_count)] > speech_count[numpy.maximum(window_numbers - padding, 0)]
+
+    # runs of speech windows
+    edges = numpy.diff(numpy.concatenate(([0], speech.astype(numpy.int8), [0])))
+    starts = numpy.flatnonzero(edges == 1) * window
+    ends = numpy.minimum(numpy.flatnonzero(edges == -1) * window, len(samples))
+
+    if max_pause_ms <= 0:
+        return [(int(starts[0]), int(ends[-1]))]
+
+    # shorten the pauses between runs to max_pause_ms
+    max_pause = int(frame_rate * max_pause_ms / 1000)
+    ranges = [[int(starts[0]), int(ends[0])]]
+    for start, end in zip(starts[1:], ends[1:]):
+        if start - ranges[-1][1] <= max_pause:
+            ranges[-1][1] = int(end)
+        else:
+            ranges[-1][1] += max_pause
+            ranges.append([int(start), int(end)])
+    return [tuple(r) for r in ranges]
+
+
+# Cut the silence of an AudioSegment
+# Parameters:
+#   segment - the decoded audio
+#   settings - see speech_ranges
+# Return:
+#   trimmed - the trimmed AudioSegment. The segment itself when it has no speech.
+#   offset_map - list of [start in the trimmed audio, start in the original audio, duration] in seconds
+def trim_silence(segment, **settings):
+    dtype = {1: numpy.uint8, 2: numpy.int16, 4: numpy.int32}[segment.sample_width]
+    samples = numpy.frombuffer(segment.raw_data, dtype=dtype).reshape(-1, segment.channels)
+    if segment.sample_width == 1:
+        # 8 bit samples are unsigned
+        samples = samples.astype(numpy.int16) - 128
+    full_scale = float(2 ** (8 * segment.sample_width - 1))
+    ranges = speech_ranges(samples, segment.frame_rate, full_scale=full_scale, **settings)
+    if not ranges:
+        return segment, [[0.0, 0.0, segment.frame_count() / segment.frame_rate]]
+
+    frame_width = segment.frame_width
+    data = b''.join(segment.raw_data[start * frame_width:end * frame_width] for start, end in ranges)
+    offset_map = []
+    trimmed_start = 0
+    for start, end in ranges:
+        offset_map.append([trimmed_start / segment.frame_rate, start / segment.frame_rate, (end - start) / segment.frame_rate])
+        trimmed_start += end - start
+    return segment._spawn(data), offset_map
+
+
+# Move a time of the trimmed audio back to the original audio
+def original_time(offset_map, seconds):
+    for trimmed_start, original_start, duration in reversed(offset_map):
+        if seconds >= trimmed_start:
+            return original_start + seconds - trimmed_start
+    return seconds
+
+
+# Move the timestamps of an element (word or punctuation) of the transcript of trimmed audio back to the original audio
+def restore_element(element, offset_map):
+    if 'ts' not in element:
+        return element
+    return dict(element, ts=round(original_time(offset_map, element['ts']), 3),
+                end_ts=round(original_time(offset_map, element['end_ts']), 3))
+
+
+# Move the timestamps of the events of a transcript (see str_stream.py) of trimmed audio back to the original audio
+def restore_events(events, offset_map):
+    for event in events:
+        if event[0] == 'element':
+            yield ('element', restore_element(event[1], offset_map))
+        else:
+            yield event
+
+
+# Move the word timestamps of the transcript of trimmed audio back to the original audio
+# Parameters:
+#   transcript_json - the transcript returned by Rev AI
+#   offset_map - the offset map returned by trim_silence
+# Return:
+#   the transcript json with the timestamps of the original audio
+def restore_timestamps(transcript_json, offset_map):
+    monologues = []
+    for monologue in transcript_json['monologues']:
+        elements = [restore_element(element, offset_map) for element in monologue['elements']]
+        monologues.append(dict(monologue, elements=elements))
+    return dict(transcript_json, monologues=monologues)
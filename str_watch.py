@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+MIT License
+
+Copyright (c) 2023, Margaret Broeren, Yuzhe Gu, Mark Pitt
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+
+"""
+# Watching of the input folder for new audio files
+#
+# In watch mode STR keeps running and transcribes every audio file as soon
+# as it is added to the input folder (python str_nogui.py --watch). New files
+# are noticed with inotify on Linux, and by scanning the folder every
+# poll_seconds on other systems. A file is given to the pipeline once it has
+# not been modified for settle_seconds, so a file that is still being copied
+# or recorded is not read half written. The folder is also scanned every
+# rescan_seconds in case an event was missed.
+
+import ctypes
+import errno
+import os
+import select
+import signal
+import struct
+import sys
+import threading
+import time
+
+from str_discover import discover_audiofiles, audio_extension, skipped_folder_set, SUPPORTED_EXTENSIONS
+
+# inotify events, see inotify(7)
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct('iIII')
+
+try:
+    _libc = ctypes.CDLL(None, use_errno=True) if sys.platform.startswith('linux') else None
+except OSError:
+    _libc = None
+
+
+# Read the watch settings from the [watch] section of the config file
+# Parameters:
+#   config - the config file reader
+# Return:
+#   dict of keyword arguments for FolderWatcher
+def watch_settings(config):
+    return {'poll_seconds': config.getfloat('watch', 'poll_seconds', fallback=2),
+            'settle_seconds': config.getfloat('watch', 'settle_seconds', fallback=5),
+            'rescan_seconds': config.getfloat('watch', 'rescan_seconds', fallback=300),
+            'use_inotify': config.get('watch', 'method', fallback='auto') != 'poll'}
+
+
+# Check if new files can be noticed with inotify
+def inotify_available():
+    return _libc != None and hasattr(_libc, 'inotify_init1')
+
+
+# The inotify watches of a folder tree
+class _Inotify:
+
+    def __init__(self):
+        self._fd = _libc.inotify_init1(_IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        # watch descriptor: folder
+        self._folders = {}
+
+    # Watch a folder. Raises OSError when no more folders can be watched, see fs.inotify.max_user_watches.
+    def add(self, folder):
+        wd = _libc.inotify_add_watch(self._fd, os.fsencode(folder),
+                                     _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE | _IN_MOVED_FROM | _IN_DELETE)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, f'{folder} cannot be watched: {os.strerror(error)}')
+        self._folders[wd] = folder
+
+    # Wait for events
+    # Parameters:
+    #   timeout - seconds to wait at most
+    # Return:
+    #   list of (path, is a folder, was removed), and None in the list when events were lost
+    def read(self, timeout):
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return []
+        data = os.read(self._fd, 64 * 1024)
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length].rstrip(b'\0')
+            offset += _EVENT_HEADER.size + length
+            if mask & _IN_Q_OVERFLOW:
+                events.append(None)
+            elif mask & _IN_IGNORED:
+                # the folder was removed, its watch is gone
+                self._folders.pop(wd, None)
+            elif wd in self._folders and name:
+                events.append((os.path.join(self._folders[wd], os.fsdecode(name)), bool(mask & _IN_ISDIR),
+                               bool(mask & (_IN_MOVED_FROM | _IN_DELETE))))
+        return events
+
+    def close(self):
+        os.close(self._fd)
+
+
+class FolderWatcher:
+
+    # Parameters:
+    #   folder - the folder to watch
+    #   recursive - to also watch the sub folders, at any depth
+    #   poll_seconds - seconds between two scans of the folder when inotify cannot be used
+    #   settle_seconds - seconds a file must not be modified before it is transcribed
+    #   rescan_seconds - seconds between two scans of the folder when inotify is used, in case an event was missed
+    #   use_inotify - False to always scan the folder
+    #   skipped_folders - sub folders that are not watched, like the output folder
+    def __init__(self, folder, recursive=True, poll_seconds=2, settle_seconds=5, rescan_seconds=300, use_inotify=True,
+                 skipped_folders=()):
+        self.folder = folder
+        self.recursive = recursive
+        self.skipped_folders = tuple(skipped_folders)
+        self._skipped = skipped_folder_set(self.skipped_folders)
+        self.poll_seconds = poll_seconds
+        self.settle_seconds = settle_seconds
+        self.rescan_seconds = rescan_seconds
+        self.use_inotify = use_inotify and inotify_available()
+        self._stop = threading.Event()
+
+        # files that were given to the pipeline and are still in the folder.
+        # A file is forgotten when it is removed, so a new file with the same name is transcribed.
+        self._seen = set()
+        # files found that may still be written
+        self._pending = set()
+
+    # Stop watching. files() returns once the files that are ready are given back.
+    def stop(self):
+        self._stop.set()
+
+    def stopped(self):
+        return self._stop.is_set()
+
+    # The audio files of the folder, then every audio file added to it, until stop() is called
+    # Return:
+    #   generator of the audio files, each of them once
+    def files(self):
+        inotify = None
+        if self.use_inotify:
+            try:
+                inotify = _Inotify()
+            except OSError as error:
+                print(f'Warning: the input folder is scanned every {self.poll_seconds:g}s, inotify cannot be used: {error}')
+
+        # the folders are watched before they are scanned, so no file added in between is missed
+        self._watch_folders(inotify, self.folder)
+        self._scan_all()
+        next_scan = time.monotonic() + (self.rescan_seconds if inotify != None else self.poll_seconds)
+        try:
+            while True:
+                yield from self._ready_files()
+                if self._stop.is_set():
+                    return
+                now = time.monotonic()
+                if now >= next_scan:
+                    self._scan_all()
+                    next_scan = now + (self.rescan_seconds if inotify != None else self.poll_seconds)
+                    continue
+
+                # wait for the next scan or event, checking stop() and the pending files every second
+                timeout = min(next_scan - now, 1.0)
+                if inotify == None:
+                    self._stop.wait(timeout)
+                    continue
+                for event in inotify.read(timeout):
+                    if event == None:
+                        # events were lost, look at the whole folder
+                        next_scan = 0
+                    elif event[2]:
+                        self._forget(event[0], event[1])
+                    elif event[1]:
+                        if self.recursive and not os.path.basename(event[0]).startswith('.') \
+                                and os.path.realpath(event[0]) not in self._skipped:
+                            # files can be added to a new folder before it is watched
+                            self._watch_folders(inotify, event[0])
+                            self._scan(event[0])
+                    else:
+                        self._add(event[0])
+        finally:
+            if inotify != None:
+                inotify.close()
+
+    # Watch a folder and, if recursive, its sub folders. Without enough inotify watches, the folders are scanned.
+    def _watch_folders(self, inotify, folder):
+        if inotify == None:
+            return
+        folders = [folder]
+        while folders:
+            folder = folders.pop()
+            try:
+                inotify.add(folder)
+                if self.recursive:
+                    with os.scandir(folder) as entries:
+                        folders.extend(entry.path for entry in entries
+                                       if entry.is_dir(follow_symlinks=False) and not entry.name.startswith('.')
+                                       and os.path.realpath(entry.path) not in self._skipped)
+            except OSError as error:
+                if error.errno in (errno.ENOSPC, errno.ENOMEM):
+                    print(f'Warning: {error}. New files are found by scanning the input folder every {self.poll_seconds:g}s.')
+                    self.rescan_seconds = self.poll_seconds
+                    return
+
+    def _scan(self, folder):
+        found = set()
+        for audiofile in discover_audiofiles(folder, self.recursive, skipped_folders=self.skipped_folders):
+            found.add(audiofile)
+            self._add(audiofile)
+        return found
+
+    # Scan the whole folder and forget the files that are not in it anymore, also when their event was missed
+    def _scan_all(self):
+        self._seen &= self._scan(self.folder)
+
+    # Forget a removed file, or every file of a removed folder
+    def _forget(self, path, is_folder):
+        if is_folder:
+            prefix = os.path.join(path, '')
+            self._seen = {audiofile for audiofile in self._seen if not audiofile.startswith(prefix)}
+            self._pending = {audiofile for audiofile in self._pending if not audiofile.startswith(prefix)}
+        else:
+            self._seen.discard(path)
+            self._pending.discard(path)
+
+    def _add(self, audiofile):
+        if audiofile not in self._seen and audio_extension(audiofile) in SUPPORTED_EXTENSIONS \
+                and not os.path.basename(audiofile).startswith('.'):
+            self._pending.add(audiofile)
+
+    # The pending files that were not modified for settle_seconds, in the order of their names
+    def _ready_files(self):
+        now = time.time()
+        ready = []
+        for audiofile in list(self._pending):
+            try:
+                modified = os.stat(audiofile).st_mtime
+            except OSError:
+                # removed or renamed before it settled
+                self._pending.discard(audiofile)
+                continue
+            if now - modified >= self.settle_seconds:
+                self._pending.discard(audiofile)
+                self._seen.add(audiofile)
+                ready.append(audiofile)
+        return sorted(ready)
+
+
+# Stop a watcher on Ctrl+C or SIGTERM. The files that are being transcribed are
+# finished first. A second Ctrl+C stops at once.
+def stop_on_signals(watcher):
+    def handle(signal_number, frame):
+        if watcher.stopped():
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            raise KeyboardInterrupt
+        print('\nStopping: the audio files that were found are finished first. Press Ctrl+C again to stop now.')
+        watcher.stop()
+
+    signal.signal(signal.SIGINT, handle)
+    if hasattr(signal, 'SIGTERM'):
+        signal.signal(signal.SIGTERM, handle)
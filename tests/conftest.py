@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+# The modules of STR are flat files in the folder above the tests
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
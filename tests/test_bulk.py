@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# Tests of the bulk output datasets in str_bulk.py
+import json
+
+import pytest
+
+from str_bulk import COLUMNS, JsonlDataset, ParquetDataset, ArrowDataset
+
+
+def small_transcript(number, words=5):
+    return {'file': [f'input/{number}.wav'] * words,
+            'word': [f'word{i}' for i in range(words)],
+            'confidence': [0.5] * (words - 1) + [None],
+            'speaker': [number % 3] * words,
+            'start': [float(i) for i in range(words)],
+            'end': [i + 0.5 for i in range(words)]}
+
+
+def expected_rows(files, words=5):
+    rows = []
+    for number in range(files):
+        columns = small_transcript(number, words)
+        rows.extend(dict(zip(COLUMNS, row)) for row in zip(*(columns[name] for name in COLUMNS)))
+    return rows
+
+
+def test_jsonl(tmp_path):
+    path = str(tmp_path / 'all.jsonl')
+    dataset = JsonlDataset(path)
+    for number in range(10):
+        dataset.append(small_transcript(number))
+    dataset.close()
+    with open(path, encoding='utf-8') as f:
+        assert [json.loads(line) for line in f] == expected_rows(10)
+
+
+def test_parquet_row_groups_of_many_small_files(tmp_path):
+    pyarrow = pytest.importorskip('pyarrow')
+    import pyarrow.parquet
+
+    path = str(tmp_path / 'all.parquet')
+    dataset = ParquetDataset(path)
+    for number in range(2000):
+        dataset.append(small_transcript(number))
+    dataset.close()
+    assert pyarrow.parquet.ParquetFile(path).metadata.num_row_groups == 1
+    assert pyarrow.parquet.read_table(path).to_pylist() == expected_rows(2000)
+
+    path = str(tmp_path / 'groups.parquet')
+    dataset = ParquetDataset(path, rows_per_group=1000)
+    for number in range(2000):
+        dataset.append(small_transcript(number))
+    dataset.close()
+    assert pyarrow.parquet.ParquetFile(path).metadata.num_row_groups == 10
+    assert pyarrow.parquet.read_table(path).num_rows == 10000
+
+
+def test_arrow_record_batches_of_many_small_files(tmp_path):
+    pyarrow = pytest.importorskip('pyarrow')
+    import pyarrow.ipc
+
+    path = str(tmp_path / 'all.arrow')
+    dataset = ArrowDataset(path, rows_per_group=1000)
+    for number in range(2000):
+        dataset.append(small_transcript(number))
+    dataset.close()
+    with pyarrow.OSFile(path, 'rb') as f:
+        reader = pyarrow.ipc.open_file(f)
+        assert reader.num_record_batches == 10
+        assert reader.read_all().to_pylist() == expected_rows(2000)
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# Tests of the concatenation of audio files in str_audio.py
+import shutil
+import subprocess
+import wave
+
+import pytest
+
+pytest.importorskip('pydub')
+if shutil.which('ffmpeg') == None:
+    pytest.skip('ffmpeg is needed', allow_module_level=True)
+
+from str_audio import concatenate_streaming
+
+
+def write_wav(path, seconds, sample_width, frame_rate=16000, channels=1):
+    frames = int(seconds * frame_rate)
+    with wave.open(str(path), 'wb') as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(sample_width)
+        wav_file.setframerate(frame_rate)
+        # a quiet square wave, so the audio is not silence
+        period = b''.join((b'\x10' * sample_width if i < 20 else b'\xf0' * sample_width) * channels for i in range(40))
+        wav_file.writeframes(period * (frames // 40))
+    return str(path)
+
+
+@pytest.mark.parametrize('file_extension', ['flac', 'wav'])
+def test_24_bit_wav_files(tmp_path, file_extension):
+    audiofiles = [write_wav(tmp_path / 'a.wav', 1.0, 3), write_wav(tmp_path / 'b.wav', 2.0, 2, frame_rate=8000)]
+    output_file = str(tmp_path / ('all.' + file_extension))
+    durations = concatenate_streaming(output_file, audiofiles, file_extension, separator_ms=100, exact_offsets=True)
+    assert durations == pytest.approx([1.0, 2.0], abs=0.001)
+    if file_extension == 'wav':
+        with wave.open(output_file, 'rb') as output:
+            # 24 bit audio is decoded to 32 bit
+            assert output.getsampwidth() == 4
+            assert output.getframerate() == 16000
+            assert output.getnframes() / 16000 == pytest.approx(3.2, abs=0.01)
+    else:
+        # decoded by ffmpeg to 32 bit samples at 16 kHz
+        samples = subprocess.run(['ffmpeg', '-v', 'error', '-i', output_file, '-f', 's32le', '-ar', '16000', '-'],
+                                 check=True, stdout=subprocess.PIPE).stdout
+        assert len(samples) / 4 / 16000 == pytest.approx(3.2, abs=0.01)
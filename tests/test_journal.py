@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# Tests of resuming an interrupted run from its journal in str_journal.py
+from str_journal import RunJournal, PREPARED, SUBMITTED, RENDERED
+
+SETTINGS = {'diarization': True, 'split_by_file': False}
+
+
+def test_resume_with_the_same_settings(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = RunJournal(path, SETTINGS)
+    assert not journal.resumed
+    journal.record('a.wav', RENDERED)
+    journal.record('b.wav', PREPARED)
+    journal.record('b.wav', SUBMITTED, job_id='job1')
+    journal.close(complete=False)
+
+    journal = RunJournal(path, SETTINGS)
+    assert journal.resumed
+    assert journal.state('a.wav')['state'] == RENDERED
+    assert journal.state('b.wav') == {'file': 'b.wav', 'state': SUBMITTED, 'job_id': 'job1'}
+    assert journal.state('c.wav') == None
+    journal.close(complete=False)
+
+
+def test_other_settings_start_over(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = RunJournal(path, SETTINGS)
+    journal.record('a.wav', RENDERED)
+    journal.close(complete=False)
+
+    journal = RunJournal(path, dict(SETTINGS, diarization=False))
+    assert not journal.resumed
+    assert journal.state('a.wav') == None
+    journal.close(complete=False)
+
+
+def test_complete_run_removes_the_journal(tmp_path):
+    path = tmp_path / 'journal.jsonl'
+    journal = RunJournal(str(path), SETTINGS)
+    journal.record('a.wav', RENDERED)
+    journal.close(complete=True)
+    assert not path.exists()
+
+
+def test_record_cut_off_by_a_crash(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = RunJournal(path, SETTINGS)
+    journal.record('a.wav', RENDERED)
+    journal.close(complete=False)
+    with open(path, 'a', encoding='utf-8') as journal_file:
+        journal_file.write('{"file": "b.wav", "sta')
+
+    journal = RunJournal(path, SETTINGS)
+    assert journal.resumed
+    assert journal.state('b.wav') == None
+    journal.record('b.wav', SUBMITTED, job_id='job2')
+    journal.close(complete=False)
+
+    # the record written after the cut-off one is read back by the next run
+    journal = RunJournal(path, SETTINGS)
+    assert journal.state('a.wav')['state'] == RENDERED
+    assert journal.state('b.wav')['job_id'] == 'job2'
+    journal.close(complete=False)
+
+
+def test_a_new_file_with_the_same_name_starts_over(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = RunJournal(path, SETTINGS)
+    journal.record('a.wav', SUBMITTED, identity=[100, 1], job_id='job1')
+    journal.record('a.wav', RENDERED, identity=[100, 1])
+    assert journal.state('a.wav', [100, 1])['state'] == RENDERED
+    assert journal.state('a.wav', [200, 2]) == None
+
+    # the details of the earlier file are not kept for the new one
+    journal.record('a.wav', PREPARED, identity=[200, 2])
+    journal.close(complete=False)
+    journal = RunJournal(path, SETTINGS)
+    assert journal.state('a.wav', [200, 2]) == {'file': 'a.wav', 'state': PREPARED, 'identity': [200, 2]}
+    assert journal.state('a.wav', [100, 1]) == None
+    journal.close(complete=False)
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# Tests of the staged pipeline in str_pipeline.py
+import threading
+
+import pytest
+
+from str_pipeline import run_pipeline
+
+
+def stage(name):
+    def run(task):
+        task.setdefault('stages', []).append(name)
+    return run
+
+
+def fail_on(name, number):
+    def run(task):
+        if task['number'] == number:
+            raise ValueError(f'task {number}')
+        task.setdefault('stages', []).append(name)
+    return run
+
+
+STAGES = [('prepare', stage('prepare'), 3), ('upload', stage('upload'), 2), ('render', stage('render'), 1)]
+
+
+def test_every_task_goes_through_the_stages_in_order():
+    events = []
+    tasks = [{'number': i} for i in range(50)]
+    finished, failed = run_pipeline(iter(tasks), STAGES, on_event=events.append, queue_size=1)
+    assert failed == []
+    assert sorted(task['number'] for task in finished) == list(range(50))
+    for task in finished:
+        assert task['stages'] == ['prepare', 'upload', 'render']
+
+    # every task is queued first, then started and done by each stage in order, then finished
+    for task in tasks:
+        statuses = [(event['stage'], event['status']) for event in events if event['task'] is task]
+        assert statuses == [('feed', 'queued'),
+                            ('prepare', 'started'), ('prepare', 'done'),
+                            ('upload', 'started'), ('upload', 'done'),
+                            ('render', 'started'), ('render', 'done'), ('render', 'finished')]
+
+
+def test_a_failed_task_skips_the_next_stages():
+    stages = [('prepare', stage('prepare'), 2), ('upload', fail_on('upload', 3), 2), ('render', stage('render'), 1)]
+    events = []
+    finished, failed = run_pipeline([{'number': i} for i in range(6)], stages, on_event=events.append)
+    assert [task['number'] for task in failed] == [3]
+    assert failed[0]['stages'] == ['prepare']
+    assert sorted(task['number'] for task in finished) == [0, 1, 2, 4, 5]
+    error = [event['error'] for event in events if event['status'] == 'failed']
+    assert len(error) == 1 and isinstance(error[0], ValueError)
+
+
+def test_tasks_are_not_kept_for_an_endless_stream():
+    events = []
+    finished, failed = run_pipeline([{'number': i} for i in range(5)], STAGES, on_event=events.append, keep_tasks=False)
+    assert finished == [] and failed == []
+    assert sum(event['status'] == 'finished' for event in events) == 5
+
+
+def test_an_error_of_the_task_generator_is_raised_after_the_tasks_fed():
+    def tasks():
+        yield {'number': 0}
+        raise RuntimeError('folder gone')
+
+    events = []
+    with pytest.raises(RuntimeError):
+        run_pipeline(tasks(), STAGES, on_event=events.append)
+    assert sum(event['status'] == 'finished' for event in events) == 1
+
+
+def test_cancel_stops_reading_tasks():
+    cancel = threading.Event()
+    read = []
+
+    def tasks():
+        for i in range(1000):
+            if i == 5:
+                cancel.set()
+            read.append(i)
+            yield {'number': i}
+
+    finished, failed = run_pipeline(tasks(), STAGES, cancel=cancel)
+    # the task read when the run was cancelled is dropped, the ones fed before go through
+    assert read == list(range(6))
+    assert sorted(task['number'] for task in finished) == list(range(5))
+    assert failed == []
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Tests of the callbacks of jobs received by the JobPoller in str_poller.py
+import time
+import types
+
+import pytest
+
+pytest.importorskip('rev_ai')
+
+import str_poller
+from str_poller import JobPoller
+
+
+def job(job_id):
+    return types.SimpleNamespace(id=job_id)
+
+
+def test_a_callback_before_the_job_is_registered():
+    poller = JobPoller(client_api=None)
+    try:
+        assert poller.complete('job1', 'details of job1') == False
+        entry = poller.register(job('job1'), audio_duration=10)
+        assert entry['done'].is_set()
+        assert entry['details'] == 'details of job1'
+        assert poller._completed_early == {}
+    finally:
+        poller.close()
+
+
+def test_callbacks_of_unknown_jobs_are_not_kept_for_good(monkeypatch):
+    poller = JobPoller(client_api=None)
+    try:
+        for number in range(str_poller._MAX_EARLY + 500):
+            poller.complete(f'old{number}', None)
+        assert len(poller._completed_early) == str_poller._MAX_EARLY
+        assert 'old0' not in poller._completed_early
+
+        # callbacks older than _EARLY_SECONDS are dropped
+        time.sleep(0.01)
+        monkeypatch.setattr(str_poller, '_EARLY_SECONDS', 0.005)
+        poller.complete('late', None)
+        assert list(poller._completed_early) == ['late']
+    finally:
+        poller.close()
+    assert poller._completed_early == {}
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# Tests of preparing an audio file for upload in str_audio.py
+import os
+import wave
+
+import pytest
+
+pytest.importorskip('pydub')
+
+from str_audio import prepare_audiofile
+
+
+def write_wav(path, seconds):
+    with wave.open(path, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(16000)
+        wav_file.writeframes(b'\x10\x00' * int(16000 * seconds))
+    return path
+
+
+INFO = {'duration': 1.0, 'codec': 'pcm_s16le', 'sample_rate': 16000, 'channels': 1, 'sample_width': 2}
+
+
+def out_files(folder):
+    return (os.path.join(folder, 'a_elongated.wav'), os.path.join(folder, 'a.wav'))
+
+
+def test_small_audio_is_given_back(tmp_path):
+    audiofile = write_wav(str(tmp_path / 'in.wav'), 1.0)
+    out_file, data, offset_map = prepare_audiofile(audiofile, 1.0, 'wav', INFO, out_files(str(tmp_path)), max_memory=1024 * 1024)
+    assert out_file == out_files(str(tmp_path))[0]
+    assert not os.path.exists(out_file)
+    # about 2 seconds of 16 bit samples at 16 kHz
+    assert len(data) == pytest.approx(44 + 2 * 2 * 16000, abs=4)
+    assert offset_map == None
+
+
+def test_large_audio_is_saved(tmp_path):
+    audiofile = write_wav(str(tmp_path / 'in.wav'), 1.0)
+    out_file, data, offset_map = prepare_audiofile(audiofile, 1.0, 'wav', INFO, out_files(str(tmp_path)), max_memory=32000)
+    assert data == None
+    with wave.open(out_file, 'rb') as wav_file:
+        assert wav_file.getnframes() == pytest.approx(2 * 16000, abs=2)
+
+
+def test_without_memory_limit_the_audio_is_saved(tmp_path):
+    audiofile = write_wav(str(tmp_path / 'in.wav'), 3.0)
+    out_file, data, offset_map = prepare_audiofile(audiofile, 0, 'wav', INFO, out_files(str(tmp_path)))
+    assert out_file == out_files(str(tmp_path))[1]
+    assert data == None
+    assert os.path.exists(out_file)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# Tests of reading the format of audio files from their header in str_probe.py
+import struct
+import wave
+
+import pytest
+
+pytest.importorskip('pydub')
+
+import str_probe
+from str_probe import AudioProbe, read_header
+
+
+def vorbis_ogg():
+    packet = b'\x01vorbis' + struct.pack('<IBI', 0, 2, 44100) + b'\0' * 16
+    first_page = b'OggS\0\x02' + b'\0' * 20 + bytes([1, len(packet)]) + packet
+    last_page = b'OggS\0\x04' + struct.pack('<q', 88200) + b'\0' * 13
+    return first_page + last_page
+
+
+def opus_ogg():
+    packet = b'OpusHead\x01\x01' + struct.pack('<HI', 312, 48000) + b'\0\0\0'
+    first_page = b'OggS\0\x02' + b'\0' * 20 + bytes([1, len(packet)]) + packet
+    last_page = b'OggS\0\x04' + struct.pack('<q', 48312) + b'\0' * 13
+    return first_page + last_page
+
+
+def flac():
+    info = (16000 << 44) | (0 << 41) | (15 << 36) | 32000
+    return b'fLaC' + b'\0\0\0\x22' + b'\0' * 10 + info.to_bytes(8, 'big') + b'\0' * 16
+
+
+def mp3():
+    # MPEG 1 layer III, 128 kbit/s, 44.1 kHz, mono, constant bitrate
+    frame = bytes([0xFF, 0xFB, 0x90, 0xC0]) + b'\0' * 413
+    return b'ID3\x03\0\0\0\0\0\x00' + frame * 4
+
+
+HEADERS = {'ogg': (vorbis_ogg(), 'vorbis', 2.0), 'opus': (opus_ogg(), 'opus', 1.0),
+           'flac': (flac(), 'flac', 2.0), 'mp3': (mp3(), 'mp3', None)}
+
+
+@pytest.mark.parametrize('name', HEADERS)
+def test_headers(tmp_path, name):
+    data, codec, duration = HEADERS[name]
+    path = tmp_path / ('a.' + name)
+    path.write_bytes(data)
+    info = read_header(str(path))
+    assert info['codec'] == codec
+    if duration != None:
+        assert info['duration'] == pytest.approx(duration)
+
+
+@pytest.mark.parametrize('name', HEADERS)
+def test_truncated_files_are_not_understood(tmp_path, name):
+    data = HEADERS[name][0]
+    path = tmp_path / ('a.' + name)
+    for size in range(len(data)):
+        path.write_bytes(data[:size])
+        info = read_header(str(path))
+        assert info == None or info['codec'] == HEADERS[name][1]
+
+
+def test_wav_without_frame_rate(tmp_path):
+    path = str(tmp_path / 'a.wav')
+    with wave.open(path, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(16000)
+        wav_file.writeframes(b'\0\0' * 100)
+    with open(path, 'r+b') as f:
+        f.seek(24)
+        f.write(b'\0\0\0\0')
+    assert read_header(path) == None
+
+
+def test_probe_gives_a_damaged_file_to_ffprobe(tmp_path, monkeypatch):
+    path = tmp_path / 'a.ogg'
+    path.write_bytes(b'OggS\0')
+    monkeypatch.setattr(str_probe, '_read_ffprobe', lambda audiofile: {'duration': 0.0, 'codec': None})
+    assert AudioProbe().probe(str(path)) == {'duration': 0.0, 'codec': None}
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# Tests that the output files written by str_render.py are byte for byte those of the original save_transcription
+#
+# The files in data/baseline were written by the save_transcription of the first
+# release from data/transcript.json, for the audio file input/example.wav.
+import json
+import os
+
+import pytest
+
+from str_render import render_pieces, output_writers
+from str_stream import transcript_events
+from str_transcript import Transcript
+
+DATA = os.path.join(os.path.dirname(__file__), 'data')
+AUDIOFILE = 'input/example.wav'
+
+CASES = [(CHAT_output, csv_file, has_speakers)
+         for CHAT_output in (True, False) for csv_file in (True, False) for has_speakers in (True, False)]
+
+
+def case_name(CHAT_output, csv_file, has_speakers):
+    return '_'.join(('chat' if CHAT_output else 'text', 'csv' if csv_file else 'nocsv', 'speakers' if has_speakers else 'single'))
+
+
+def whole(has_speakers):
+    with open(os.path.join(DATA, 'transcript.json'), encoding='utf-8') as f:
+        return [Transcript.from_json(json.load(f), AUDIOFILE, has_speakers)]
+
+
+def in_pieces(has_speakers):
+    with open(os.path.join(DATA, 'transcript.json'), 'rb') as f:
+        chunks = iter(lambda: f.read(100), b'')
+        return list(Transcript.pieces_from_events(transcript_events(chunks), AUDIOFILE, has_speakers, piece_words=4))
+
+
+def assert_same_files(folder, name):
+    expected = sorted(file_name for file_name in os.listdir(os.path.join(DATA, 'baseline')) if file_name.startswith(name + '.'))
+    assert sorted(os.listdir(folder)) == expected
+    for file_name in expected:
+        with open(os.path.join(folder, file_name), 'rb') as f:
+            written = f.read()
+        with open(os.path.join(DATA, 'baseline', file_name), 'rb') as f:
+            assert written == f.read(), file_name
+
+
+@pytest.mark.parametrize('make_pieces', [whole, in_pieces], ids=['whole', 'pieces'])
+@pytest.mark.parametrize('CHAT_output, csv_file, has_speakers', CASES, ids=[case_name(*case) for case in CASES])
+def test_output_files_match_the_baseline(tmp_path, make_pieces, CHAT_output, csv_file, has_speakers):
+    name = case_name(CHAT_output, csv_file, has_speakers)
+    render_pieces(make_pieces(has_speakers), output_writers(str(tmp_path / (name + '.cha')), csv_file, CHAT_output))
+    assert_same_files(str(tmp_path), name)
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+# Tests of the offset index and the transcript split of concatenated audio in str_audio.py
+import pytest
+
+pytest.importorskip('pydub')
+
+from str_audio import offset_index, split_transcript
+
+
+def word(value, ts):
+    return {'type': 'text', 'value': value, 'ts': ts, 'end_ts': ts + 0.3, 'confidence': 0.9}
+
+
+def punct(value):
+    return {'type': 'punct', 'value': value}
+
+
+def values(transcript_json):
+    return [[element['value'] for element in monologue['elements']] for monologue in transcript_json['monologues']]
+
+
+def test_offset_index():
+    index = offset_index(['a.wav', 'b.wav', 'c.wav'], [2.0, 3.5, 1.0], separator_ms=100)
+    assert index == [{'file': 'a.wav', 'start': 0.0, 'end': 2.0},
+                     {'file': 'b.wav', 'start': 2.1, 'end': 5.6},
+                     {'file': 'c.wav', 'start': 5.7, 'end': 6.7}]
+
+
+def test_words_go_to_the_file_they_start_in():
+    index = offset_index(['a.wav', 'b.wav'], [2.0, 2.0])
+    transcript_json = {'monologues': [{'speaker': 0, 'elements': [
+        word('one', 0.5), punct(' '), word('two', 2.05), punct(' '), word('three', 2.5), punct('.')]}]}
+    (file_a, json_a), (file_b, json_b) = split_transcript(transcript_json, index)
+    assert (file_a, file_b) == ('a.wav', 'b.wav')
+    # the word in the silence after a.wav goes to a.wav, punctuation goes with the word before it
+    assert values(json_a) == [['one', ' ', 'two', ' ']]
+    assert values(json_b) == [['three', '.']]
+    # timestamps are relative to the start of the file
+    assert json_b['monologues'][0]['elements'][0]['ts'] == 0.4
+
+
+def test_leading_punctuation_goes_to_the_file_of_the_next_word():
+    index = offset_index(['a.wav', 'b.wav'], [2.0, 2.0])
+    transcript_json = {'monologues': [{'speaker': 1, 'elements': [punct('"'), word('four', 3.0), punct('.')]}]}
+    (_, json_a), (_, json_b) = split_transcript(transcript_json, index)
+    assert values(json_a) == []
+    assert values(json_b) == [['"', 'four', '.']]
+    assert json_b['monologues'][0]['speaker'] == 1
+
+
+def test_monologue_without_words_goes_with_the_word_before_it():
+    index = offset_index(['a.wav', 'b.wav'], [2.0, 2.0])
+    transcript_json = {'monologues': [{'speaker': 0, 'elements': [word('five', 2.5)]},
+                                      {'speaker': 1, 'elements': [punct('.')]}]}
+    (_, json_a), (_, json_b) = split_transcript(transcript_json, index)
+    assert values(json_a) == []
+    assert values(json_b) == [['five'], ['.']]
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# Tests of the incremental transcript json parser in str_stream.py
+import io
+import json
+import os
+
+import pytest
+
+from str_stream import transcript_events, write_transcript
+
+DATA = os.path.join(os.path.dirname(__file__), 'data')
+
+# speaker after the elements, an empty monologue, words that are not ascii, numbers of every kind and top-level keys
+ODD_TRANSCRIPT = {
+    'monologues': [
+        {'elements': [{'type': 'text', 'value': 'café', 'ts': 12345.678, 'end_ts': 12346, 'confidence': 1e-3},
+                      {'type': 'punct', 'value': '—'},
+                      {'type': 'text', 'value': '日本語', 'ts': 0, 'end_ts': -0.5, 'confidence': 1}],
+         'speaker': 7, 'speaker_info': None},
+        {'speaker': 1, 'elements': []},
+        {'speaker': 2, 'speaker_info': {'id': 'a "quoted" \\ name'},
+         'elements': [{'type': 'text', 'value': 'x', 'ts': 1.5, 'end_ts': 1.75, 'confidence': 0.12345678901234}]}],
+    'job_id': 'job1',
+    'duration': 3600.25,
+}
+
+
+# Put the events back together as the dict json.load returns
+def from_events(events):
+    transcript = {}
+    for event in events:
+        kind = event[0]
+        if kind == 'monologue':
+            monologue = dict(event[1], elements=[])
+            transcript.setdefault('monologues', []).append(monologue)
+        elif kind == 'element':
+            monologue['elements'].append(event[1])
+        elif kind == 'monologue_end':
+            monologue.update(event[1])
+        else:
+            transcript[event[1]] = event[2]
+    return transcript
+
+
+def chunks_of(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def transcripts():
+    with open(os.path.join(DATA, 'transcript.json'), 'rb') as f:
+        yield f.read()
+    yield json.dumps(ODD_TRANSCRIPT).encode('utf-8')
+    yield json.dumps(ODD_TRANSCRIPT, ensure_ascii=False, indent='\t').encode('utf-8')
+    yield b'\xef\xbb\xbf' + json.dumps(ODD_TRANSCRIPT, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64, 1000000])
+def test_every_chunk_size_gives_the_transcript(size):
+    for data in transcripts():
+        expected = json.loads(data.decode('utf-8-sig'))
+        assert from_events(transcript_events(chunks_of(data, size))) == expected
+
+
+def test_no_monologues():
+    assert list(transcript_events([b'{}'])) == []
+    assert list(transcript_events([b' {"monologues": [] , "a": 1} '])) == [('field', 'a', 1)]
+
+
+def test_written_back_the_same():
+    data = json.dumps(ODD_TRANSCRIPT).encode('utf-8')
+    text_file = io.StringIO()
+    write_transcript(transcript_events(chunks_of(data, 5)), text_file)
+    assert json.loads(text_file.getvalue()) == ODD_TRANSCRIPT
+
+
+@pytest.mark.parametrize('data', [b'', b'{"monologues": [', b'{"monologues": [{"elements": [1 2]}]}', b'[]'])
+def test_invalid_json(data):
+    with pytest.raises(ValueError):
+        list(transcript_events(chunks_of(data, 3)))
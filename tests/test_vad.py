@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+# Tests of the silence trimming of str_vad.py
+import pytest
+
+numpy = pytest.importorskip('numpy')
+
+from str_vad import speech_ranges, restore_timestamps
+
+FRAME_RATE = 16000
+
+
+# a mono clip of silence with a loud part from start to end seconds
+def clip(seconds, start, end):
+    samples = numpy.zeros((int(seconds * FRAME_RATE), 1), dtype=numpy.int16)
+    samples[int(start * FRAME_RATE):int(end * FRAME_RATE)] = 10000
+    return samples
+
+
+def seconds(ranges):
+    return [(round(start / FRAME_RATE, 3), round(end / FRAME_RATE, 3)) for start, end in ranges]
+
+
+def test_speech_is_padded():
+    # 250 ms of padding is 12 windows of 20 ms
+    assert seconds(speech_ranges(clip(3, 1, 1.5), FRAME_RATE)) == [(0.76, 1.74)]
+
+
+def test_silence_has_no_speech():
+    assert speech_ranges(clip(1, 0, 0), FRAME_RATE) == []
+
+
+def test_clip_shorter_than_the_padding_at_the_end():
+    # the padding before the speech is the same as in a long clip
+    assert seconds(speech_ranges(clip(0.4, 0.3, 0.4), FRAME_RATE)) == [(0.06, 0.4)]
+
+
+def test_clip_shorter_than_the_padding_at_the_start():
+    # the padding after the speech is the same as in a long clip
+    assert seconds(speech_ranges(clip(0.45, 0, 0.1), FRAME_RATE)) == [(0.0, 0.34)]
+
+
+def test_long_pauses_are_shortened():
+    samples = numpy.concatenate((clip(2, 0.5, 1), clip(4, 2, 2.5)))
+    ranges = speech_ranges(samples, FRAME_RATE, max_pause_ms=500)
+    assert len(ranges) == 2
+    # the pause kept after the first part is max_pause_ms long
+    assert seconds(ranges)[0] == (0.26, 1.24 + 0.5)
+
+
+def test_restore_timestamps():
+    # 1 s kept from 0.5 s, then 1 s kept from 3 s of the original audio
+    offset_map = [[0.0, 0.5, 1.0], [1.0, 3.0, 1.0]]
+    transcript_json = {'monologues': [{'speaker': 0, 'elements': [
+        {'type': 'text', 'value': 'one', 'ts': 0.2, 'end_ts': 0.6},
+        {'type': 'punct', 'value': ' '},
+        {'type': 'text', 'value': 'two', 'ts': 1.25, 'end_ts': 1.5}]}]}
+    restored = restore_timestamps(transcript_json, offset_map)
+    elements = restored['monologues'][0]['elements']
+    assert (elements[0]['ts'], elements[0]['end_ts']) == (0.7, 1.1)
+    assert elements[1] == {'type': 'punct', 'value': ' '}
+    assert (elements[2]['ts'], elements[2]['end_ts']) == (3.25, 3.5)
+    # the transcript given is not changed
+    assert transcript_json['monologues'][0]['elements'][0]['ts'] == 0.2
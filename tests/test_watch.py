@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# Tests of watch mode: str_nogui.main(watch=True) against the local stand-in for Rev AI
+import configparser
+import os
+import signal
+import sys
+import threading
+import time
+import wave
+
+import pytest
+
+pytest.importorskip('rev_ai')
+pytest.importorskip('pydub')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmark'))
+
+import str_nogui
+from fake_revai_server import FakeRevAiServer
+
+
+def write_wav(path, seconds, level):
+    with wave.open(path, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(16000)
+        wav_file.writeframes(level.to_bytes(2, 'little', signed=True) * int(16000 * seconds))
+
+
+def write_config(work_folder, api_url):
+    config = configparser.ConfigParser()
+    config['API.token'] = {'token': 'fake-token', 'save_check': '1', 'api_url': api_url}
+    config['folders'] = {'input_folder': 'input', 'output_folder': 'output'}
+    config['output_format'] = {'format': 'CHAT'}
+    config['concatenation'] = {'concatenate_input': 'False', 'csv_file': 'False'}
+    config['transcribe.config'] = {'diarization': 'True', 'punctuation': 'True', 'remove_disfluencies': 'False',
+                                   'speaker_channels_count': 'None', 'language': 'en', 'delete_after_seconds': 'None'}
+    config['watch'] = {'method': 'poll', 'poll_seconds': '0.1', 'settle_seconds': '0.2'}
+    config['polling'] = {'min_interval': '0.1', 'max_interval': '0.2'}
+    config['probe'] = {'cache': 'False'}
+    config['journal'] = {'enabled': 'True'}
+    with open(os.path.join(work_folder, 'transcription_config.ini'), 'w') as config_file:
+        config.write(config_file)
+
+
+def rendered(journal_path, audiofile):
+    try:
+        with open(journal_path, encoding='utf-8') as journal_file:
+            return sum('"state": "rendered"' in line and audiofile in line for line in journal_file)
+    except OSError:
+        return 0
+
+
+def wait_for(condition, seconds=20):
+    deadline = time.monotonic() + seconds
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def test_a_file_removed_and_added_again_is_transcribed_again(tmp_path, monkeypatch):
+    os.mkdir(tmp_path / 'input')
+    os.mkdir(tmp_path / 'output')
+    server = FakeRevAiServer(turnaround=0.1)
+    write_config(str(tmp_path), server.url)
+    monkeypatch.chdir(tmp_path)
+    audiofile = os.path.join('input', 'a.wav')
+    journal_path = os.path.join('output', '.str_journal.jsonl')
+    write_wav(audiofile, 1.0, 100)
+
+    results = {}
+
+    def change_the_folder():
+        try:
+            results['first'] = wait_for(lambda: rendered(journal_path, 'a.wav') == 1)
+            os.remove(audiofile)
+            time.sleep(0.5)
+            # a new recording with the same name
+            write_wav(audiofile, 1.5, -100)
+            results['second'] = wait_for(lambda: rendered(journal_path, 'a.wav') == 2)
+        finally:
+            # Ctrl+C stops watching
+            os.kill(os.getpid(), signal.SIGINT)
+
+    handlers = signal.getsignal(signal.SIGINT), signal.getsignal(signal.SIGTERM)
+    changer = threading.Thread(target=change_the_folder)
+    changer.start()
+    try:
+        str_nogui.main(None, watch=True)
+    finally:
+        changer.join()
+        signal.signal(signal.SIGINT, handlers[0])
+        signal.signal(signal.SIGTERM, handlers[1])
+        server.close()
+
+    assert results == {'first': True, 'second': True}
+    assert server.requests['submit'] == 2